@@ -0,0 +1,108 @@
+import asyncio
+import logging
+from collections import deque
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ActionTaskRegistry:
+    """
+    Tracks the in-flight action task of each player so it can be cancelled
+    when its result would be thrown away anyway: the player disconnected and
+    did not come back within the grace period, was punished, or their session
+    was reset. Cancelling the task also cancels the pending LLM request.
+
+    Also holds each player's mailbox: actions sent while a turn is in flight
+    wait here (duplicates coalesced, at most ACTION_MAILBOX_SIZE) and run as
+    soon as the turn ends. Cancelling drops them along with the turn.
+    """
+
+    def __init__(self):
+        # Key: player_id, Value: the running _process_player_action_async task
+        self.tasks: dict[str, asyncio.Task] = {}
+        # Key: player_id, Value: timer that cancels the task after a disconnect
+        self.grace_timers: dict[str, asyncio.TimerHandle] = {}
+        # Key: player_id, Value: the action the running task is processing
+        self.current_actions: dict[str, str] = {}
+        # Key: player_id, Value: actions waiting for the current turn to end
+        self.pending: dict[str, deque[str]] = {}
+
+    def register(self, player_id: str, task: asyncio.Task, action: str | None = None):
+        self.tasks[player_id] = task
+        if action is not None:
+            self.current_actions[player_id] = action
+
+        def _cleanup(t: asyncio.Task):
+            if self.tasks.get(player_id) is t:
+                del self.tasks[player_id]
+                self.current_actions.pop(player_id, None)
+
+        task.add_done_callback(_cleanup)
+
+    def is_running(self, player_id: str) -> bool:
+        task = self.tasks.get(player_id)
+        return task is not None and not task.done()
+
+    def cancel(self, player_id: str, reason: str) -> bool:
+        """Cancels the player's in-flight action. Returns True if one was cancelled."""
+        self.pending.pop(player_id, None)
+        task = self.tasks.get(player_id)
+        if task is None or task.done():
+            return False
+        try:
+            if task is asyncio.current_task():
+                # e.g. a punishment raised by a cheat check running inside the task itself
+                return False
+        except RuntimeError:
+            pass
+        logger.info(f"Cancelling in-flight action for '{player_id}': {reason}")
+        task.cancel(reason)
+        return True
+
+    def add_pending(self, player_id: str, action: str) -> str:
+        """
+        Queues an action behind the running turn. Returns "queued", "coalesced"
+        (same as the running or an already queued action) or "full".
+        """
+        mailbox = self.pending.setdefault(player_id, deque())
+        if action == self.current_actions.get(player_id) or action in mailbox:
+            return "coalesced"
+        if len(mailbox) >= settings.ACTION_MAILBOX_SIZE:
+            return "full"
+        mailbox.append(action)
+        return "queued"
+
+    def pop_pending(self, player_id: str) -> str | None:
+        mailbox = self.pending.get(player_id)
+        if not mailbox:
+            self.pending.pop(player_id, None)
+            return None
+        return mailbox.popleft()
+
+    def pending_count(self, player_id: str) -> int:
+        return len(self.pending.get(player_id) or ())
+
+    def cancel_after_grace(self, player_id: str, grace_seconds: float):
+        """Cancels the player's action unless they reconnect within the grace period."""
+        if not self.is_running(player_id):
+            return
+        self.clear_grace(player_id)
+        loop = asyncio.get_running_loop()
+        self.grace_timers[player_id] = loop.call_later(
+            grace_seconds, self._grace_expired, player_id
+        )
+
+    def clear_grace(self, player_id: str):
+        timer = self.grace_timers.pop(player_id, None)
+        if timer:
+            timer.cancel()
+
+    def _grace_expired(self, player_id: str):
+        self.grace_timers.pop(player_id, None)
+        self.cancel(player_id, "player disconnected")
+
+
+# Create a single instance of the registry
+action_tasks = ActionTaskRegistry()
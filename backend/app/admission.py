@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+
+from .config import settings
+from .websocket_manager import manager as websocket_manager
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest turn in the running average used for wait estimates
+_EWMA_ALPHA = 0.2
+_INITIAL_TURN_SECONDS = 10.0
+
+
+class TokenBucket:
+    """Allows `burst` actions at once, refilled at `rate` actions per second."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def idle_since(self) -> float:
+        """When the bucket was (or will be) full again; from then on it equals a new one."""
+        return self.updated + (self.capacity - self.tokens) / self.rate
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class AdmissionController:
+    """
+    Sits in front of the action tasks.
+
+    At most MAX_INFLIGHT_TURNS turns run at once; the rest wait in one FIFO.
+    A player has at most one action in flight (is_processing), so the FIFO is
+    also fair across players. Each player's action rate is limited by a token
+    bucket; buckets of players gone idle are evicted. Waiting players are told their position and an estimated wait
+    over the WebSocket ("queue_status").
+    """
+
+    def __init__(self):
+        self.active: set[str] = set()
+        # Key: player_id, Value: future resolved when the player is admitted
+        self.waiting: OrderedDict[str, asyncio.Future] = OrderedDict()
+        self.buckets: dict[str, TokenBucket] = {}
+        self._last_sweep = time.monotonic()
+        self._started: dict[str, float] = {}
+        self.avg_turn_seconds = _INITIAL_TURN_SECONDS
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_rate = 0
+        self.rejected_full = 0
+
+    def check(self, player_id: str) -> str | None:
+        """Called before an action is accepted. Returns why it is refused, or None."""
+        max_queue = settings.ADMISSION_MAX_QUEUE
+        if max_queue > 0 and len(self.waiting) >= max_queue:
+            self.rejected_full += 1
+            return "天机繁忙，求道者众，请稍后再试。"
+        if settings.ACTION_RATE_PER_MINUTE > 0:
+            self._evict_idle_buckets()
+            bucket = self.buckets.get(player_id)
+            if bucket is None:
+                bucket = self.buckets[player_id] = TokenBucket(
+                    settings.ACTION_RATE_PER_MINUTE / 60, settings.ACTION_BURST
+                )
+            if not bucket.take():
+                self.rejected_rate += 1
+                return "汝之行动过于急促，请稍后再试。"
+        return None
+
+    def _evict_idle_buckets(self):
+        """Drops buckets full and idle for ACTION_BUCKET_IDLE_SECONDS; sweeps at most that often."""
+        ttl = settings.ACTION_BUCKET_IDLE_SECONDS
+        now = time.monotonic()
+        if now - self._last_sweep < ttl:
+            return
+        self._last_sweep = now
+        idle = [p for p, bucket in self.buckets.items() if now - bucket.idle_since() >= ttl]
+        for player_id in idle:
+            del self.buckets[player_id]
+        if idle:
+            logger.info(f"Evicted {len(idle)} idle rate limit buckets.")
+
+    def _has_slot(self) -> bool:
+        cap = settings.MAX_INFLIGHT_TURNS
+        return cap <= 0 or len(self.active) < cap
+
+    def _admit(self, player_id: str):
+        self.active.add(player_id)
+        self._started[player_id] = time.monotonic()
+        self.admitted += 1
+
+    async def acquire(self, player_id: str):
+        """Waits for a turn slot. Cancelling the caller leaves the queue cleanly."""
+        if self._has_slot() and not self.waiting:
+            self._admit(player_id)
+            return
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[player_id] = future
+        self.queued += 1
+        logger.info(f"Queued action for {player_id} at position {len(self.waiting)}.")
+        self._notify_positions()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if self.waiting.get(player_id) is future:
+                del self.waiting[player_id]
+                self._notify_positions()
+            elif future.done() and not future.cancelled():
+                # Admitted just as the task was cancelled: hand the slot on
+                self.release(player_id)
+            raise
+        self._send_status(player_id, 0)
+
+    def release(self, player_id: str):
+        started = self._started.pop(player_id, None)
+        if started is not None:
+            elapsed = time.monotonic() - started
+            self.avg_turn_seconds += _EWMA_ALPHA * (elapsed - self.avg_turn_seconds)
+        self.active.discard(player_id)
+        admitted_any = False
+        while self.waiting and self._has_slot():
+            next_player, future = self.waiting.popitem(last=False)
+            if future.done():
+                continue
+            self._admit(next_player)
+            future.set_result(None)
+            admitted_any = True
+        if admitted_any:
+            self._notify_positions()
+
+    def estimated_wait(self, position: int) -> int:
+        cap = settings.MAX_INFLIGHT_TURNS
+        slots = cap if cap > 0 else 1
+        return math.ceil(position * self.avg_turn_seconds / slots)
+
+    def _send_status(self, player_id: str, position: int):
+        message = {
+            "type": "queue_status",
+            "data": {"position": position, "eta_seconds": self.estimated_wait(position)},
+        }
+        asyncio.ensure_future(websocket_manager.send_json_to_player(player_id, message))
+
+    def _notify_positions(self):
+        for position, player_id in enumerate(self.waiting, start=1):
+            self._send_status(player_id, position)
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self.active),
+            "buckets": len(self.buckets),
+            "waiting": len(self.waiting),
+            "avg_turn_seconds": round(self.avg_turn_seconds, 2),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected_rate": self.rejected_rate,
+            "rejected_full": self.rejected_full,
+        }
+
+
+# Create a single instance of the controller
+admission = AdmissionController()
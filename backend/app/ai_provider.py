@@ -1,8 +1,14 @@
+import asyncio
 import logging
+import time
+from collections import deque
 from typing import Optional
 
 from .config import settings
 from . import openai_client
+from .ai_turn import AITurn, TurnParseError, parse_turn
+from .deadline import Deadline, DeadlineExceeded
+from .usage import CALL_TURN, choose_model
 
 try:
     from . import gemini_client
@@ -12,12 +18,266 @@ except Exception:
 logger = logging.getLogger(__name__)
 
 
+# --- Circuit Breaker ---
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker.
+
+    closed    -> calls flow normally; outcomes are recorded in a sliding window.
+    open      -> calls are rejected immediately until the cooldown has elapsed.
+    half_open -> a limited number of probe calls are let through; one success
+                 closes the breaker again, one failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        window_size: int,
+        min_calls: int,
+        failure_rate_threshold: float,
+        open_seconds: float,
+        half_open_probes: int,
+    ):
+        self.name = name
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self.state = self.CLOSED
+        self._outcomes: deque[bool] = deque(maxlen=window_size)
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self.total_rejected = 0
+        self.last_error: str | None = None
+
+    def failure_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def allow_request(self) -> bool:
+        """Returns True if a call may be attempted right now."""
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                self.total_rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+            self._probes_in_flight = 0
+            logger.info(f"Circuit breaker '{self.name}' half-open, sending probe.")
+
+        if self.state == self.HALF_OPEN:
+            if self._probes_in_flight >= self.half_open_probes:
+                self.total_rejected += 1
+                return False
+            self._probes_in_flight += 1
+        return True
+
+    def record_success(self):
+        if self.state == self.HALF_OPEN:
+            logger.info(f"Circuit breaker '{self.name}' closed after successful probe.")
+            self.state = self.CLOSED
+            self._outcomes.clear()
+            self._probes_in_flight = 0
+        self._outcomes.append(True)
+
+    def release_probe(self):
+        """Returns a half-open probe slot taken by a call that ended without an outcome (e.g. cancelled)."""
+        if self.state == self.HALF_OPEN and self._probes_in_flight > 0:
+            self._probes_in_flight -= 1
+
+    def record_failure(self, reason: str = ""):
+        self.last_error = reason[:200] if reason else None
+        if self.state == self.HALF_OPEN:
+            self._trip()
+            return
+        self._outcomes.append(False)
+        if (
+            len(self._outcomes) >= self.min_calls
+            and self.failure_rate() >= self.failure_rate_threshold
+        ):
+            self._trip()
+
+    def _trip(self):
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probes_in_flight = 0
+        logger.warning(
+            f"Circuit breaker '{self.name}' opened for {self.open_seconds}s. Last error: {self.last_error}"
+        )
+
+    def snapshot(self) -> dict:
+        """Health view of the breaker."""
+        retry_in = 0.0
+        if self.state == self.OPEN:
+            retry_in = max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+        return {
+            "state": self.state,
+            "failure_rate": round(self.failure_rate(), 3),
+            "window_calls": len(self._outcomes),
+            "retry_in_seconds": round(retry_in, 1),
+            "rejected_total": self.total_rejected,
+            "last_error": self.last_error,
+        }
+
+
+def _new_breaker(name: str) -> CircuitBreaker:
+    return CircuitBreaker(
+        name=name,
+        window_size=settings.CIRCUIT_BREAKER_WINDOW,
+        min_calls=settings.CIRCUIT_BREAKER_MIN_CALLS,
+        failure_rate_threshold=settings.CIRCUIT_BREAKER_FAILURE_RATE,
+        open_seconds=settings.CIRCUIT_BREAKER_OPEN_SECONDS,
+        half_open_probes=settings.CIRCUIT_BREAKER_HALF_OPEN_PROBES,
+    )
+
+
+# Shared by every caller (game turns, cheat checks, ...) in this process.
+breakers: dict[str, CircuitBreaker] = {
+    "gemini": _new_breaker("gemini"),
+    "openai": _new_breaker("openai"),
+}
+
+
+def get_health() -> dict:
+    """Breaker state per provider, for the health endpoint."""
+    return {
+        "provider": (settings.AI_PROVIDER or "openai").lower(),
+        "breakers": {name: b.snapshot() for name, b in breakers.items()},
+    }
+
+
+def _out_of_budget(e: BaseException, deadline: Deadline | None) -> bool:
+    """True if the call ended because the caller's own time budget ran out, not the provider."""
+    if isinstance(e, DeadlineExceeded):
+        return True
+    # wait_for() / per-attempt timeouts cut at what was left of the budget
+    return (
+        isinstance(e, asyncio.TimeoutError)
+        and deadline is not None
+        and deadline.remaining() < settings.AI_MIN_ATTEMPT_SECONDS
+    )
+
+
+def _gemini_configured() -> bool:
+    if not gemini_client:
+        return False
+    if settings.BLOCK_GEMINI_IN_MAINLAND and not settings.GEMINI_API_KEY:
+        # Treat as blocked/unavailable; not a provider failure
+        return False
+    return True
+
+
+async def _call_gemini(
+    prompt, history, force_json, structured=False, deadline=None, player_id=None, call_type=CALL_TURN
+):
+    """Returns the Gemini response, or None if Gemini is skipped or failed."""
+    if not _gemini_configured():
+        return None
+    if deadline and deadline.remaining() < settings.AI_MIN_ATTEMPT_SECONDS:
+        return None
+    breaker = breakers["gemini"]
+    if not breaker.allow_request():
+        return None
+    try:
+        resp = await asyncio.wait_for(
+            gemini_client.get_ai_response(
+                prompt=prompt,
+                history=history,
+                model=getattr(settings, "GEMINI_MODEL", None),
+                force_json=force_json or structured,
+                player_id=player_id,
+                call_type=call_type,
+            ),
+            timeout=deadline.remaining() if deadline else None,
+        )
+    except Exception as e:
+        if _out_of_budget(e, deadline):
+            breaker.release_probe()
+            logger.warning("Gemini did not answer within the caller's budget, will fallback.")
+            return None
+        breaker.record_failure(str(e))
+        logger.warning(f"Gemini not available, will fallback. Reason: {e}")
+        return None
+    except BaseException:
+        breaker.release_probe()
+        raise
+    breaker.record_success()
+    if not structured:
+        return resp
+    try:
+        return parse_turn(resp)
+    except TurnParseError as e:
+        # The provider is healthy, only this output is unusable
+        logger.warning(f"Gemini returned an invalid turn, will fallback. Reason: {e}")
+        return None
+
+
+async def _call_openai(
+    prompt, history, model, force_json, structured=False, deadline=None, player_id=None, call_type=CALL_TURN
+):
+    if deadline and deadline.remaining() < settings.AI_MIN_ATTEMPT_SECONDS:
+        # Budget already spent (e.g. by a slow Gemini attempt); not the provider's fault
+        if structured:
+            raise DeadlineExceeded("No time left in the budget for an OpenAI attempt")
+        return "错误：AI服务响应超时。"
+    breaker = breakers["openai"]
+    if not breaker.allow_request():
+        if structured:
+            raise RuntimeError("AI服务暂时不可用（熔断中），请稍后再试。")
+        return "错误：AI服务暂时不可用（熔断中），请稍后再试。"
+    prompt_chars = len(prompt) + sum(len(m.get("content") or "") for m in history or [])
+    model = choose_model(player_id, call_type, model or settings.OPENAI_MODEL, prompt_chars)
+    try:
+        resp = await openai_client.get_ai_response(
+            prompt,
+            history,
+            model,
+            force_json,
+            structured,
+            deadline,
+            player_id=player_id,
+            call_type=call_type,
+        )
+    except TurnParseError:
+        # The provider is healthy, only this output is unusable (as for Gemini)
+        breaker.record_success()
+        raise
+    except Exception as e:
+        if _out_of_budget(e, deadline):
+            breaker.release_probe()
+        elif openai_client.client is not None:
+            breaker.record_failure(str(e))
+        raise
+    except BaseException:
+        breaker.release_probe()
+        raise
+    # openai_client reports failures as "错误：" strings instead of raising
+    if isinstance(resp, str) and resp.startswith("错误：") and openai_client.client is not None:
+        if resp.startswith("错误：AI服务响应超时"):
+            breaker.release_probe()  # our budget ran out, not the provider
+        else:
+            breaker.record_failure(resp)
+    else:
+        breaker.record_success()
+    return resp
+
+
 async def get_ai_response(
     prompt: str,
     history: Optional[list[dict]] = None,
     model: Optional[str] = None,
     force_json: bool = True,
-) -> str:
+    structured: bool = False,
+    deadline: Optional[Deadline] = None,
+    player_id: Optional[str] = None,
+    call_type: str = CALL_TURN,
+) -> str | AITurn:
     """
     Unified AI provider entry.
     settings.AI_PROVIDER: openai|gemini|auto
@@ -27,41 +287,28 @@ async def get_ai_response(
       - If provider == auto: prefer Gemini, fallback to OpenAI on any failure
     Additional guards:
       - If BLOCK_GEMINI_IN_MAINLAND and Gemini key/conn fails -> skip Gemini
+      - A provider whose circuit breaker is open is skipped without a call
+    With structured=True a validated AITurn is returned (or an exception raised)
+    instead of the raw response string. An optional deadline bounds every
+    provider attempt, retry and backoff made for this call. player_id and
+    call_type attribute token usage and drive cost-aware model routing.
     """
     provider = (settings.AI_PROVIDER or "openai").lower()
 
-    async def _try_gemini() -> Optional[str]:
-        if not gemini_client:
-            return None
-        if settings.BLOCK_GEMINI_IN_MAINLAND and not settings.GEMINI_API_KEY:
-            # Treat as blocked/unavailable
-            return None
-        try:
-            return await gemini_client.get_ai_response(
-                prompt=prompt,
-                history=history,
-                model=getattr(settings, "GEMINI_MODEL", None),
-                force_json=force_json,
-            )
-        except Exception as e:
-            logger.warning(f"Gemini not available, will fallback. Reason: {e}")
-            return None
-
     if provider == "openai":
-        return await openai_client.get_ai_response(prompt, history, model or settings.OPENAI_MODEL, force_json)
+        return await _call_openai(prompt, history, model, force_json, structured, deadline, player_id, call_type)
 
     if provider == "gemini":
-        resp = await _try_gemini()
+        resp = await _call_gemini(prompt, history, force_json, structured, deadline, player_id, call_type)
         if resp is not None:
             return resp
         # Fallback to OpenAI if configured to do so
         if settings.AI_PROVIDER_FALLBACK == "openai":
-            return await openai_client.get_ai_response(prompt, history, model or settings.OPENAI_MODEL, force_json)
+            return await _call_openai(prompt, history, model, force_json, structured, deadline, player_id, call_type)
         raise RuntimeError("Gemini provider selected but unavailable, and no fallback configured.")
 
     # auto
-    resp = await _try_gemini()
+    resp = await _call_gemini(prompt, history, force_json, structured, deadline, player_id, call_type)
     if resp is not None:
         return resp
-    return await openai_client.get_ai_response(prompt, history, model or settings.OPENAI_MODEL, force_json)
-
+    return await _call_openai(prompt, history, model, force_json, structured, deadline, player_id, call_type)
@@ -0,0 +1,253 @@
+import json
+import logging
+import re
+
+from pydantic import BaseModel, Field, ValidationError
+
+logger = logging.getLogger(__name__)
+
+
+# --- Turn Model ---
+class RollRequest(BaseModel):
+    type: str = "判定"
+    target: int = 50
+    sides: int = Field(default=100, ge=2)
+
+
+# Roll outcome tiers, and the tier to use when the model left one out.
+ROLL_OUTCOMES = ("大成功", "成功", "失败", "大失败")
+_OUTCOME_FALLBACK = {"大成功": "成功", "大失败": "失败"}
+
+
+class RollBranch(BaseModel):
+    """The continuation for one roll outcome, used by the branched roll protocol."""
+
+    narrative: str
+    state_update: dict = Field(default_factory=dict)
+
+
+class AITurn(BaseModel):
+    """A validated game-master turn: narrative plus state_update or roll_request."""
+
+    narrative: str
+    state_update: dict = Field(default_factory=dict)
+    roll_request: RollRequest | None = None
+    # Only with the branched roll protocol: outcome tier -> continuation
+    roll_branches: dict[str, RollBranch] | None = None
+    repaired: bool = False  # True if the local repair pass was needed
+
+    def branch_for(self, outcome: str) -> RollBranch | None:
+        """The continuation for a roll outcome, or None to fall back to a follow-up call."""
+        if not self.roll_branches:
+            return None
+        return self.roll_branches.get(outcome) or self.roll_branches.get(
+            _OUTCOME_FALLBACK.get(outcome, "")
+        )
+
+    def to_history(self) -> str:
+        """
+        Compact, valid JSON for the assistant message in internal_history.
+        Roll branches are left out; only the applied one is recorded, as its own turn.
+        """
+        data = {"narrative": self.narrative}
+        if self.state_update:
+            data["state_update"] = self.state_update
+        if self.roll_request:
+            data["roll_request"] = self.roll_request.model_dump()
+        return json.dumps(data, ensure_ascii=False)
+
+
+# JSON schema sent to providers that support structured output.
+# Not "strict": state_update is a free-form object by design.
+TURN_JSON_SCHEMA = {
+    "name": "game_turn",
+    "strict": False,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "narrative": {"type": "string"},
+            "state_update": {"type": "object"},
+            "roll_request": {
+                "type": "object",
+                "properties": {
+                    "type": {"type": "string"},
+                    "target": {"type": "integer"},
+                    "sides": {"type": "integer"},
+                },
+                "required": ["type", "target", "sides"],
+            },
+            "roll_branches": {
+                "type": "object",
+                "properties": {
+                    outcome: {
+                        "type": "object",
+                        "properties": {
+                            "narrative": {"type": "string"},
+                            "state_update": {"type": "object"},
+                        },
+                        "required": ["narrative"],
+                    }
+                    for outcome in ROLL_OUTCOMES
+                },
+            },
+        },
+        "required": ["narrative"],
+    },
+}
+
+
+class TurnParseError(ValueError):
+    """The model output could not be turned into a valid AITurn, even after repair."""
+
+
+# --- Extraction ---
+# strict=False accepts raw newlines inside strings, common in narratives
+_decoder = json.JSONDecoder(strict=False)
+
+
+def strip_think(response_str: str) -> str:
+    """Drops a leading <think>...</think> reasoning block."""
+    if "</think>" in response_str:
+        return response_str[response_str.rfind("</think>") + 8 :]
+    return response_str
+
+
+def _fence_start(response_str: str) -> int:
+    """Position right after the opening ``` fence, or -1 if the text is not fenced."""
+    pos = response_str.find("```json")
+    if pos != -1:
+        return pos + 7
+    pos = response_str.find("```")
+    return pos + 3 if pos != -1 else -1
+
+
+def _scan_objects(response_str: str, start: int):
+    """Yields (obj, begin, end) for each '{' from which a complete JSON value decodes."""
+    i = response_str.find("{", start)
+    while i != -1:
+        try:
+            obj, end = _decoder.raw_decode(response_str, i)
+        except json.JSONDecodeError:
+            i = response_str.find("{", i + 1)
+            continue
+        yield obj, i, end
+        # Anything inside a decoded object is part of it; resume after it
+        i = response_str.find("{", end)
+
+
+def locate_json_object(response_str: str) -> tuple[dict | None, int, int]:
+    """
+    Finds and decodes the first JSON object in a model response.
+
+    Handles <think> blocks, ```json fences (preferred when present), leading
+    and trailing prose, and braces inside string literals. Returns
+    (obj, begin, end) relative to the think-stripped text, or (None, -1, -1).
+    """
+    text = strip_think(response_str)
+    fence = _fence_start(text)
+    starts = (fence, 0) if fence > 0 else (0,)
+    for start in starts:
+        for obj, begin, end in _scan_objects(text, start):
+            if isinstance(obj, dict):
+                return obj, begin, end
+    return None, -1, -1
+
+
+def decode_json_object(response_str: str) -> dict | None:
+    """Returns the first JSON object embedded in a model response, decoded once."""
+    return locate_json_object(response_str)[0]
+
+
+def extract_json(response_str: str) -> str | None:
+    """Returns the JSON object text embedded in a model response, if any."""
+    obj, begin, end = locate_json_object(response_str)
+    if obj is None:
+        return None
+    return strip_think(response_str)[begin:end]
+
+
+def _json_tail(response_str: str) -> str | None:
+    """Text from the first '{' onwards, for repairing output that does not decode."""
+    text = strip_think(response_str)
+    fence = _fence_start(text)
+    begin = text.find("{", max(fence, 0))
+    if begin == -1:
+        begin = text.find("{")
+    if begin == -1:
+        return None
+    tail = text[begin:]
+    close = tail.rfind("```")
+    return tail[:close] if close != -1 else tail
+
+
+# --- Repair ---
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+def _close_open_structures(s: str) -> str:
+    """Appends whatever quotes/brackets are needed to close a truncated JSON text."""
+    stack: list[str] = []
+    in_string = False
+    escaped = False
+    for ch in s:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    tail = '"' if in_string else ""
+    return s + tail + "".join(reversed(stack))
+
+
+def _repair(json_str: str) -> dict:
+    """Local repair pass for output that does not decode as-is."""
+    candidate = _TRAILING_COMMA.sub(r"\1", json_str.strip())
+    for attempt in (candidate, _close_open_structures(candidate)):
+        try:
+            obj, _ = _decoder.raw_decode(_TRAILING_COMMA.sub(r"\1", attempt))
+        except json.JSONDecodeError:
+            continue
+        if isinstance(obj, dict):
+            return obj
+    raise TurnParseError("Unrepairable JSON in AI response")
+
+
+def parse_turn(response_str: str) -> AITurn:
+    """Extracts, repairs if needed, and validates a game turn in a single pass."""
+    data = decode_json_object(response_str)
+    repaired = False
+    if data is None or "narrative" not in data:
+        # Either nothing decoded or only an inner object did (truncated output)
+        tail = _json_tail(response_str)
+        if tail is None:
+            raise TurnParseError("No JSON found in AI response")
+        data, repaired = _repair(tail), True
+    if not data.get("roll_request"):
+        data.pop("roll_request", None)
+    if data.get("state_update") is None:
+        data.pop("state_update", None)
+    branches = data.pop("roll_branches", None)
+    try:
+        turn = AITurn.model_validate(data)
+    except ValidationError as e:
+        raise TurnParseError(f"AI response failed validation: {e}") from e
+    if isinstance(branches, dict) and turn.roll_request:
+        # Malformed branches only cost the single-call shortcut, not the turn
+        try:
+            turn.roll_branches = {
+                k: RollBranch.model_validate(v) for k, v in branches.items() if k in ROLL_OUTCOMES
+            } or None
+        except ValidationError as e:
+            logger.info(f"Ignoring malformed roll_branches: {e}")
+    if repaired:
+        turn.repaired = True
+        logger.info("AI response JSON repaired locally.")
+    return turn
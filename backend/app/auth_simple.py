@@ -166,6 +166,19 @@ async def get_current_active_user(
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+def is_admin(username: str) -> bool:
+    """Whether the user is listed in ADMIN_USERS."""
+    admins = {name.strip() for name in (settings.ADMIN_USERS or "").split(",") if name.strip()}
+    return username in admins
+
+async def get_current_admin_user(
+    current_user: Annotated[dict, Depends(get_current_active_user)]
+) -> dict:
+    """Get current active user, who must be an operator."""
+    if not is_admin(current_user["username"]):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin only")
+    return current_user
+
 # --- Authentication Routes ---
 async def login_for_access_token(
     username: Annotated[str, Form()],
@@ -1,9 +1,18 @@
 import logging
 import asyncio
+import hashlib
+import json
+import math
+import re
+import time
+from collections import Counter
 
 from . import ai_provider as openai_client
 from . import state_manager
 from .config import settings
+from .deadline import Deadline
+from .usage import CALL_CHEAT_CHECK
+from .ai_turn import extract_json
 
 # --- Logging ---
 logger = logging.getLogger(__name__)
@@ -24,10 +33,62 @@ def _load_prompt(filename: str) -> str:
 
 # --- Anti-Cheat Prompt ---
 CHEAT_CHECK_SYSTEM_PROMPT = _load_prompt("cheat_check.txt")
+CHEAT_CHECK_BATCH_PROMPT = _load_prompt("cheat_check_batch.txt")
+VERDICTS = ["【正常】", "【轻度亵渎】", "【重度渎道】"]
+# No verdict (provider error, unexpected reply): never remembered, never a clearance
+UNKNOWN = "未知"
 
 
-async def run_cheat_check(player_id: str, inputs_to_check: list[str]):
-    """Runs a batched cheat check on a list of inputs."""
+def _format_inputs(inputs_to_check: list[str]) -> str:
+    """Format all inputs into a single numbered list string."""
+    return "\n".join(f'{i + 1}. "{text}"' for i, text in enumerate(inputs_to_check))
+
+
+def _encode_inputs(inputs: list[str]) -> str:
+    """
+    A player's inputs as a JSON string array for a shared prompt. Angle
+    brackets are escaped too, so no input can close its block or open another.
+    """
+    text = json.dumps(inputs, ensure_ascii=False)
+    return text.replace("<", "\\u003c").replace(">", "\\u003e")
+
+
+_VERDICT_KEY = re.compile(r'"(P\d+)"\s*:')
+
+
+def _parse_batch_verdicts(response: str, block_ids: list[str]) -> dict[str, str] | None:
+    """
+    The verdict per block id, or None unless the reply is one JSON object
+    naming every expected id exactly once, and no other, with a valid verdict.
+    """
+    # Every verdict key anywhere in the reply, so a second object is caught too
+    mentioned = _VERDICT_KEY.findall(response)
+    if sorted(mentioned) != sorted(block_ids):
+        return None
+    text = extract_json(response)
+    if text is None:
+        return None
+    try:
+        pairs = json.loads(text, object_pairs_hook=list)
+    except ValueError:
+        return None
+    if not isinstance(pairs, list) or sorted(k for k, _ in pairs) != sorted(block_ids):
+        return None
+    verdicts = dict(pairs)
+    if any(verdict not in VERDICTS for verdict in verdicts.values()):
+        return None
+    return verdicts
+
+
+async def run_cheat_check(
+    player_id: str, inputs_to_check: list[str], rounds: list[tuple[str | None, str]] | None = None
+):
+    """
+    Runs a batched cheat check on a list of inputs. `rounds` are the
+    (round id, input) pairs the verdict is remembered for; defaults to none.
+    Returns the level, or UNKNOWN if the model gave no verdict; then nothing
+    is recorded and the inputs stay unchecked.
+    """
     if not inputs_to_check:
         return
 
@@ -37,10 +98,7 @@ async def run_cheat_check(player_id: str, inputs_to_check: list[str]):
 
     word_count_warnings = ''
 
-    # Format all inputs into a single numbered list string.
-    formatted_inputs = "\n".join(
-        f'{i + 1}. "{text}"' for i, text in enumerate(inputs_to_check)
-    )
+    formatted_inputs = _format_inputs(inputs_to_check)
 
     # if len(formatted_inputs) > 200:
     #     word_count_warnings = (
@@ -50,37 +108,460 @@ async def run_cheat_check(player_id: str, inputs_to_check: list[str]):
     full_prompt = f"# 用户输入列表\n\n{word_count_warnings}<user_inputs>\n{formatted_inputs}\n</user_inputs>"
 
     # Single API call for the whole batch
-    response = await openai_client.get_ai_response(
-        prompt=full_prompt,
-        history=[{"role": "system", "content": CHEAT_CHECK_SYSTEM_PROMPT}],
-        model=settings.OPENAI_MODEL_CHEAT_CHECK,
-        force_json=False,  # We expect a simple string response (【正常】, 【轻度亵渎】, or 【重度渎道】
-    )
+    try:
+        response = await openai_client.get_ai_response(
+            prompt=full_prompt,
+            history=[{"role": "system", "content": CHEAT_CHECK_SYSTEM_PROMPT}],
+            model=settings.OPENAI_MODEL_CHEAT_CHECK,
+            force_json=False,  # We expect a simple string response (【正常】, 【轻度亵渎】, or 【重度渎道】
+            deadline=Deadline(settings.CHEAT_CHECK_DEADLINE_SECONDS),
+            player_id=player_id,
+            call_type=CALL_CHEAT_CHECK,
+        )
+    except Exception as e:
+        response = f"错误：{e}"
 
-    level = "正常"
-    if response not in ["【正常】", "【轻度亵渎】", "【重度渎道】"]:
+    if response not in VERDICTS:
         logger.warning(
             f"Batched cheat check for player {player_id} returned an unexpected response: {response}"
         )
-    else:
-        level = response.strip("【】")
-        if level != "正常":
-            logger.warning(
-                f"Cheat detected for player {player_id}! Level: {level}. Batch: {inputs_to_check}"
-            )
-            # Flag the player for punishment
-            await state_manager.flag_player_for_punishment(
-                player_id,
-                level=level,
-                reason=f"Detected cheating in a batch of inputs.",
-            )
-
-        # After checking, reset the unchecked counter for the session
-        session = await state_manager.get_session(player_id)
-        if session:
-            session["unchecked_rounds_count"] = 0
-            await state_manager.save_session(
-                player_id, session
-            )  # Use save_session to persist and notify
+        return UNKNOWN
 
+    level = response.strip("【】")
+    await _apply_verdict(player_id, inputs_to_check, level, rounds=rounds)
     return level
+
+
+async def _apply_verdict(
+    player_id: str,
+    inputs_to_check: list[str],
+    level: str,
+    source: str = "llm",
+    rounds: list[tuple[str | None, str]] | None = None,
+):
+    """Records a verdict, flags the player if needed and resets their unchecked counter."""
+    if source == "llm":
+        # A pre-filter clearance only skips a periodic check; it is not remembered,
+        # so the settlement check still sends these inputs to the model
+        cheat_queue.record_verdict(player_id, rounds or [], level)
+        prefilter.observe(inputs_to_check, level)
+    if level != "正常":
+        logger.warning(
+            f"Cheat detected for player {player_id}! Level: {level}. Batch: {inputs_to_check}"
+        )
+        # Flag the player for punishment
+        await state_manager.flag_player_for_punishment(
+            player_id,
+            level=level,
+            reason=f"Detected cheating in a batch of inputs.",
+        )
+
+    await _reset_unchecked(player_id)
+
+
+async def _reset_unchecked(player_id: str):
+    # After checking, reset the unchecked counter for the session
+    session = await state_manager.get_session(player_id)
+    if session:
+        session["unchecked_rounds_count"] = 0
+        await state_manager.save_session(
+            player_id, session
+        )  # Use save_session to persist and notify
+
+
+async def run_batch_cheat_check(jobs: dict[str, tuple[list[str], list[tuple[str | None, str]]]]):
+    """
+    Checks several players in one request: the system prompt is sent once and
+    each player's inputs go in their own block. Inputs are sent as escaped JSON, so one player's text cannot reach
+    another's block. Unless the reply names every block exactly once with a
+    valid verdict, every player falls back to run_cheat_check.
+    jobs: player_id -> (inputs to send, rounds the verdict is remembered for)
+    """
+    # Anonymous block ids; player names never reach the model
+    ids = {f"P{i + 1}": player_id for i, player_id in enumerate(jobs)}
+    blocks = "\n\n".join(
+        f'<player id="{block_id}">\n<user_inputs>\n{_encode_inputs(jobs[player_id][0])}\n</user_inputs>\n</player>'
+        for block_id, player_id in ids.items()
+    )
+    logger.info(f"Running cross-player cheat check for {len(jobs)} players.")
+
+    verdicts = None
+    try:
+        response = await openai_client.get_ai_response(
+            prompt=f"{CHEAT_CHECK_BATCH_PROMPT}\n\n# 用户输入列表\n\n{blocks}",
+            history=[{"role": "system", "content": CHEAT_CHECK_SYSTEM_PROMPT}],
+            model=settings.OPENAI_MODEL_CHEAT_CHECK,
+            force_json=True,
+            deadline=Deadline(settings.CHEAT_CHECK_DEADLINE_SECONDS),
+            call_type=CALL_CHEAT_CHECK,
+        )
+        verdicts = _parse_batch_verdicts(response, list(ids))
+        if verdicts is None:
+            logger.warning(f"Cross-player cheat check returned an unexpected response, checking players one by one: {response}")
+    except Exception as e:
+        logger.warning(f"Cross-player cheat check failed, checking players one by one: {e}")
+
+    for block_id, player_id in ids.items():
+        inputs, rounds = jobs[player_id]
+        if verdicts is not None:
+            await _apply_verdict(player_id, inputs, verdicts[block_id].strip("【】"), rounds=rounds)
+        else:
+            await run_cheat_check(player_id, inputs, rounds)
+
+
+# --- Local Pre-filter ---
+# (pattern, weight). One strong signal alone reaches the default threshold.
+_INJECTION_PATTERNS = [
+    (re.compile(r"忽略|无视|忘记|忘掉"), 1.0),
+    (re.compile(r"(之前|以上|上述|所有|全部)的?(规则|指令|设定|提示|要求)"), 1.5),
+    (re.compile(r"你(现在|从现在起|不再)?是|扮演|角色设定|试炼官|天道之眼"), 1.0),
+    (re.compile(r"系统(通知|提示|消息|指令)|【系统|\(系统|（系统|GM|管理员"), 2.0),
+    (re.compile(r"ignore|instruction|system prompt|jailbreak|assistant", re.I), 2.0),
+    (re.compile(r"narrative|state_update|roll_request|trigger_program|spirit_stones|json", re.I), 2.0),
+    (re.compile(r"(机缘|次数).{0,4}(恢复|增加|回到|尚余|变为|重置)|无限|不限"), 2.0),
+    (re.compile(r"(判定|投骰|骰子|掷骰).{0,6}(成功|大成功|必定|一定)|必定成功|百分之百"), 1.5),
+    (re.compile(r"(属性|根骨|悟性|筋骨|心境|福缘|机缘|慧根).{0,4}(提升|增加|变为|达到|\+).{0,2}\d+"), 1.5),
+    (re.compile(r"天赋反馈|天机浮现|成矣|汝"), 1.0),
+]
+_LARGE_NUMBER = re.compile(r"\d{5,}|[万亿兆]")
+_STRUCTURE = re.compile(r"[{}<>\[\]【】]|```")
+_NGRAM_LOG_PATH: Path = Path("cheat_verdicts.jsonl")
+_NGRAM_MIN_SAMPLES = 50  # per class, before the n-gram model has a say
+
+
+class _BigramModel:
+    """Character-bigram naive Bayes over inputs from logged LLM verdicts."""
+
+    def __init__(self):
+        self.counts = {"normal": Counter(), "cheat": Counter()}
+        self.samples = {"normal": 0, "cheat": 0}
+
+    @staticmethod
+    def _bigrams(text: str) -> list[str]:
+        return [text[i : i + 2] for i in range(len(text) - 1)]
+
+    def train(self, text: str, label: str):
+        self.counts[label].update(self._bigrams(text))
+        self.samples[label] += 1
+
+    def ready(self) -> bool:
+        return min(self.samples.values()) >= _NGRAM_MIN_SAMPLES
+
+    def log_odds(self, text: str) -> float:
+        """Per-bigram average log-odds of "cheat" over "normal"; 0.0 if untrained."""
+        grams = self._bigrams(text)
+        if not grams or not self.ready():
+            return 0.0
+        totals = {label: sum(c.values()) + len(c) + 1 for label, c in self.counts.items()}
+        score = 0.0
+        for g in grams:
+            p_cheat = (self.counts["cheat"][g] + 1) / totals["cheat"]
+            p_normal = (self.counts["normal"][g] + 1) / totals["normal"]
+            score += math.log(p_cheat / p_normal)
+        return score / len(grams)
+
+
+class CheatPrefilter:
+    """
+    CPU-only first pass over a batch of inputs. Batches scoring below
+    CHEAT_PREFILTER_THRESHOLD are cleared without a model call; the rest are
+    escalated to the LLM check. CHEAT_PREFILTER_MODE:
+      off    -> every batch goes to the LLM
+      shadow -> every batch goes to the LLM; the pre-filter's decisions are
+                only compared with the LLM verdicts
+      on     -> cleared batches skip the LLM
+    The agreement numbers in stats() show whether switching to "on" is safe.
+    The settlement check always goes to the model.
+    """
+
+    def __init__(self):
+        self.ngram = _BigramModel()
+        self._ngram_loaded = False
+        self.stats_counters = Counter()
+
+    def score_input(self, text: str) -> float:
+        score = sum(weight for pattern, weight in _INJECTION_PATTERNS if pattern.search(text))
+        # Ordinary actions are short, single-line prose
+        if len(text) > 80:
+            score += min(2.0, (len(text) - 80) / 80)
+        if text.count("\n") >= 2:
+            score += 0.5
+        if _STRUCTURE.search(text):
+            score += 0.5
+        if _LARGE_NUMBER.search(text):
+            score += 0.5
+        if settings.CHEAT_PREFILTER_NGRAM:
+            self._ensure_ngram()
+            score += max(-1.0, min(2.0, self.ngram.log_odds(text)))
+        return score
+
+    def score_batch(self, inputs: list[str]) -> float:
+        # Repeated minor offences add up, as in the LLM rules
+        scores = sorted((self.score_input(t) for t in inputs), reverse=True)
+        if not scores:
+            return 0.0
+        return scores[0] + 0.25 * sum(scores[1:])
+
+    def clears(self, inputs: list[str]) -> bool:
+        """True if the batch is benign enough to skip the LLM check."""
+        cleared = self.score_batch(inputs) < settings.CHEAT_PREFILTER_THRESHOLD
+        self.stats_counters["passed" if cleared else "escalated"] += 1
+        return cleared
+
+    def observe(self, inputs: list[str], level: str):
+        """Compares the pre-filter's decision with an LLM verdict, and logs it for training."""
+        mode = settings.CHEAT_PREFILTER_MODE
+        if mode == "off":
+            return
+        cleared = self.score_batch(inputs) < settings.CHEAT_PREFILTER_THRESHOLD
+        if mode == "shadow":
+            self.stats_counters["passed" if cleared else "escalated"] += 1
+        cheat = level != "正常"
+        if cleared and cheat:
+            self.stats_counters["shadow_missed_cheats"] += 1
+            logger.warning(f"Cheat pre-filter would have cleared a '{level}' batch: {inputs}")
+        elif not cleared and not cheat:
+            self.stats_counters["shadow_needless_escalations"] += 1
+        else:
+            self.stats_counters["shadow_agreed"] += 1
+        if settings.CHEAT_PREFILTER_NGRAM:
+            self._log_verdict(inputs, level)
+
+    def _log_verdict(self, inputs: list[str], level: str):
+        # A cheating verdict covers the batch, not a specific input: noisy but usable labels
+        label = "normal" if level == "正常" else "cheat"
+        for text in inputs:
+            self.ngram.train(text, label)
+        try:
+            with open(_NGRAM_LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"inputs": inputs, "level": level}, ensure_ascii=False) + "\n")
+        except IOError as e:
+            logger.error(f"Could not append to {_NGRAM_LOG_PATH}: {e}")
+
+    def _ensure_ngram(self):
+        if self._ngram_loaded:
+            return
+        self._ngram_loaded = True
+        if not _NGRAM_LOG_PATH.exists():
+            return
+        try:
+            with open(_NGRAM_LOG_PATH, "r", encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    label = "normal" if entry["level"] == "正常" else "cheat"
+                    for text in entry["inputs"]:
+                        self.ngram.train(text, label)
+            logger.info(f"Cheat pre-filter n-gram model trained on {self.ngram.samples}")
+        except (json.JSONDecodeError, KeyError, IOError) as e:
+            logger.error(f"Could not load {_NGRAM_LOG_PATH}: {e}")
+
+    def stats(self) -> dict:
+        c = self.stats_counters
+        seen = c["passed"] + c["escalated"]
+        compared = c["shadow_agreed"] + c["shadow_missed_cheats"] + c["shadow_needless_escalations"]
+        return {
+            "mode": settings.CHEAT_PREFILTER_MODE,
+            "batches": seen,
+            "pass_rate": round(c["passed"] / seen, 3) if seen else 0.0,
+            "escalate_rate": round(c["escalated"] / seen, 3) if seen else 0.0,
+            "compared_with_llm": compared,
+            "agreement_rate": round(c["shadow_agreed"] / compared, 3) if compared else 0.0,
+            "missed_cheats": c["shadow_missed_cheats"],
+            "needless_escalations": c["shadow_needless_escalations"],
+            "ngram_samples": dict(self.ngram.samples),
+        }
+
+
+# Create a single instance of the pre-filter
+prefilter = CheatPrefilter()
+
+
+# --- Background Worker Queue ---
+_queue_file_path: Path = Path("cheat_check_queue.json")
+_MEMO_SIZE = 256  # remembered verdicts per player
+
+
+def _memo_key(round_id: str | None, text: str) -> str | None:
+    """
+    Verdict memo key: the input's stable round id ("<session_date>#<round>")
+    plus a hash of its normalized text. None for inputs without a round id.
+    """
+    if round_id is None:
+        return None
+    normalized = " ".join(text.split()).lower()
+    return f"{round_id}:{hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16]}"
+
+
+class CheatCheckQueue:
+    """
+    Periodic cheat checks run here, on a small pool of background workers, so a
+    player's turn never waits for them. Verdicts go through the usual
+    punishment flag. At most one job per player is pending; a newer request
+    replaces its inputs. Pending jobs survive a restart via a JSON file.
+
+    A worker waits CHEAT_CHECK_BATCH_WINDOW_SECONDS for more jobs to arrive
+    and then checks up to CHEAT_CHECK_BATCH_MAX_PLAYERS players in one request.
+
+    Cleared inputs are remembered (round id plus normalized text) for
+    CHEAT_CHECK_MEMO_TTL_SECONDS, so a check only sends inputs not cleared
+    yet, preceded by a few cleared ones for context. A cheating verdict
+    covers a batch, not any one input in it, so it is never remembered per
+    input; the punishment flag carries it instead.
+    """
+
+    def __init__(self):
+        # Key: player_id, Value: [(round id, input), ...] to check. Insertion order is queue order.
+        self.pending: dict[str, list[tuple[str | None, str]]] = {}
+        # Key: player_id, Value: {_memo_key(): time cleared}, oldest first
+        self.memo: dict[str, dict[str, float]] = {}
+        self._wakeup: asyncio.Event | None = None
+        self._workers: list[asyncio.Task] = []
+
+    def record_verdict(self, player_id: str, rounds: list[tuple[str | None, str]], level: str):
+        if level != "正常":
+            return
+        memo = self.memo.setdefault(player_id, {})
+        now = time.time()
+        for round_id, text in rounds:
+            key = _memo_key(round_id, text)
+            if key is not None:
+                memo.pop(key, None)
+                memo[key] = now
+        for key in list(memo)[: -_MEMO_SIZE]:
+            del memo[key]
+
+    def forget(self, player_id: str):
+        """Drops a player's remembered verdicts, e.g. when their session is replaced."""
+        self.memo.pop(player_id, None)
+
+    def plan(
+        self, player_id: str, rounds: list[tuple[str | None, str]]
+    ) -> tuple[list[tuple[str | None, str]], list[str]]:
+        """Splits a window of inputs into (unseen rounds, cleared inputs to send with them as context)."""
+        memo = self.memo.get(player_id, {})
+        expired_before = time.time() - settings.CHEAT_CHECK_MEMO_TTL_SECONDS
+        for key in [k for k, cleared_at in memo.items() if cleared_at < expired_before]:
+            del memo[key]
+        unseen, seen = [], []
+        for round_id, text in rounds:
+            key = _memo_key(round_id, text)
+            if key is None or key not in memo:
+                unseen.append((round_id, text))
+            else:
+                seen.append(text)
+        context = []
+        if unseen and settings.CHEAT_CHECK_CONTEXT_INPUTS > 0:
+            context = seen[-settings.CHEAT_CHECK_CONTEXT_INPUTS :]
+        return unseen, context
+
+    def enqueue(self, player_id: str, rounds: list[tuple[str | None, str]]):
+        if not rounds:
+            return
+        self.pending.pop(player_id, None)
+        self.pending[player_id] = [tuple(r) for r in rounds]
+        self._ensure_workers()
+        self._wakeup.set()
+
+    def discard(self, player_id: str):
+        self.pending.pop(player_id, None)
+
+    def _ensure_workers(self):
+        if self._workers:
+            return
+        self._wakeup = asyncio.Event()
+        self._workers = [
+            asyncio.create_task(self._worker(i))
+            for i in range(max(1, settings.CHEAT_CHECK_WORKERS))
+        ]
+        logger.info(f"Started {len(self._workers)} cheat check workers.")
+
+    async def _worker(self, n: int):
+        while True:
+            if not self.pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            max_players = max(1, settings.CHEAT_CHECK_BATCH_MAX_PLAYERS)
+            if max_players > 1 and len(self.pending) < max_players:
+                # Let checks from other players accumulate into the same request
+                await asyncio.sleep(settings.CHEAT_CHECK_BATCH_WINDOW_SECONDS)
+            jobs = {}
+            for player_id in list(self.pending)[:max_players]:
+                unseen, context = self.plan(player_id, self.pending.pop(player_id))
+                if not unseen:
+                    # Everything in the window was cleared already
+                    await _reset_unchecked(player_id)
+                    continue
+                new_inputs = [text for _, text in unseen]
+                if settings.CHEAT_PREFILTER_MODE == "on" and prefilter.clears(new_inputs):
+                    await _apply_verdict(player_id, new_inputs, "正常", source="prefilter", rounds=unseen)
+                    continue
+                jobs[player_id] = (context + new_inputs, unseen)
+            if not jobs:
+                continue  # nothing new, cleared locally, or another worker took them
+            try:
+                if len(jobs) == 1:
+                    [(player_id, (inputs, rounds))] = jobs.items()
+                    await run_cheat_check(player_id, inputs, rounds)
+                else:
+                    await run_batch_cheat_check(jobs)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cheat check worker {n} failed for {list(jobs)}: {e}", exc_info=True)
+
+    def start_workers(self):
+        self._ensure_workers()
+        if self.pending:
+            self._wakeup.set()
+
+    # --- Persistence ---
+    def load_from_json(self):
+        if not _queue_file_path.exists():
+            return
+        try:
+            with open(_queue_file_path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            self.pending = {
+                player_id: [(None if r is None else str(r), str(t)) for r, t in rounds]
+                for player_id, rounds in raw.items()
+            }
+            logger.info(f"Loaded {len(self.pending)} pending cheat checks from {_queue_file_path}")
+        except (json.JSONDecodeError, IOError, TypeError, ValueError) as e:
+            logger.error(f"Could not load cheat check queue from {_queue_file_path}: {e}")
+
+    def save_to_json(self):
+        try:
+            with open(_queue_file_path, "w", encoding="utf-8") as f:
+                json.dump(self.pending, f, ensure_ascii=False)
+        except IOError as e:
+            logger.error(f"Could not save cheat check queue to {_queue_file_path}: {e}")
+
+
+# Create a single instance of the queue
+cheat_queue = CheatCheckQueue()
+
+
+async def run_settlement_check(player_id: str, rounds: list[tuple[str | None, str]]):
+    """
+    The blocking check before a spirit stone settlement. Only inputs not
+    cleared yet are sent; if all of them were cleared already the
+    settlement is approved without a model call. Returns UNKNOWN if no
+    attempt got a verdict; the caller must not settle then.
+    """
+    unseen, context = cheat_queue.plan(player_id, rounds)
+    if not unseen:
+        logger.info(f"Settlement for {player_id} approved: all inputs already cleared.")
+        return "正常"
+    # This check supersedes any queued one
+    cheat_queue.discard(player_id)
+    inputs = context + [text for _, text in unseen]
+    attempts = max(1, settings.CHEAT_CHECK_SETTLEMENT_ATTEMPTS)
+    for attempt in range(attempts):
+        level = await run_cheat_check(player_id, inputs, unseen)
+        if level != UNKNOWN:
+            return level
+        if attempt + 1 < attempts:
+            await asyncio.sleep(2 ** attempt)
+    logger.warning(f"Settlement check for {player_id} got no verdict after {attempts} attempts.")
+    return UNKNOWN
@@ -0,0 +1,44 @@
+from collections.abc import Mapping
+
+from .history_encoder import dumps, splice, window_fields
+
+# --- Client Projections ---
+# What the game UI renders. Everything else (internal_history with the system
+# prompt and the model's raw turns, cheat-check bookkeeping, ...) stays on the server.
+CLIENT_FIELDS = (
+    "opportunities_remaining",
+    "daily_success_achieved",
+    "is_in_trial",
+    "is_processing",
+    "current_life",
+)
+# Live viewers only see the character sheet and the (redacted) narrative
+LIVE_FIELDS = ("current_life",)
+
+
+def _fields_json(session: Mapping, name: str, fields: tuple[str, ...]) -> str:
+    """
+    The projected fields plus the version, encoded once per session version.
+    The history window is not cached here; its entries come from the encoder cache.
+    """
+    version = getattr(session, "version", None)
+    views = getattr(session, "_views", None)
+    cached = views.get(name) if views is not None else None
+    if cached and cached[0] == version:
+        return cached[1]
+    projection = {field: session.get(field) for field in fields}
+    projection["version"] = version
+    text = dumps(projection)
+    if views is not None:
+        views[name] = (version, text)
+    return text
+
+
+def client_view(session: Mapping) -> str:
+    """JSON of the player's own view: used by /api/game/init and full_state pushes."""
+    return splice(_fields_json(session, "client", CLIENT_FIELDS), window_fields(session))
+
+
+def live_view(session: Mapping) -> str:
+    """JSON of a watched player's session as live viewers see it."""
+    return splice(_fields_json(session, "live", LIVE_FIELDS), window_fields(session, public=True))
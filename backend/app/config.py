@@ -6,6 +6,10 @@ class Settings(BaseSettings):
     OPENAI_BASE_URL: str = "https://api.openai.com/v1"
     OPENAI_MODEL: str = "gpt-3.5-turbo"
     OPENAI_MODEL_CHEAT_CHECK: str = "qwen3-235b-a22b"
+    # Structured output for game turns: json_schema|json_object|off (default; not every
+    # OpenAI-compatible backend supports it). Models that reject it are detected and
+    # downgraded automatically, without using up one of the turn's retries.
+    OPENAI_STRUCTURED_OUTPUT: str = "off"
 
     # Optional Gemini/AI Provider Settings (scaffold; safe defaults)
     AI_PROVIDER: str = "openai"  # options: openai|gemini|auto
@@ -14,6 +18,109 @@ class Settings(BaseSettings):
     GEMINI_BASE_URL: str | None = None
     AI_PROVIDER_FALLBACK: str = "openai"
     BLOCK_GEMINI_IN_MAINLAND: bool = True
+    GEMINI_MAX_WORKERS: int = 8  # only used if the installed library lacks the async API
+
+    # Time budgets for AI work. A turn's budget is shared by the first call,
+    # the roll follow-up and all retries; attempts shorter than the minimum are not started.
+    AI_TURN_DEADLINE_SECONDS: float = 60.0
+    CHEAT_CHECK_DEADLINE_SECONDS: float = 30.0
+    AI_MIN_ATTEMPT_SECONDS: float = 3.0
+    # An in-flight turn is cancelled if its player stays disconnected this long
+    DISCONNECT_GRACE_SECONDS: float = 20.0
+    # Admission control: turns running at once (0 = unlimited; the rest wait in a
+    # FIFO, whose wait does not count against the turn budget), the longest queue
+    # before actions are refused, and a per-player token bucket for actions
+    MAX_INFLIGHT_TURNS: int = 32
+    ADMISSION_MAX_QUEUE: int = 500
+    ACTION_RATE_PER_MINUTE: float = 20.0
+    ACTION_BURST: int = 5
+    # A bucket that has refilled and stayed idle this long is dropped (a new one is the same)
+    ACTION_BUCKET_IDLE_SECONDS: float = 600.0
+    # Actions sent while a turn is in flight wait in a per-player mailbox of this
+    # size and run right after it (duplicates are coalesced; 0 drops them as before)
+    ACTION_MAILBOX_SIZE: int = 3
+    # Latency SLO per turn (0 disables, the default; e.g. 20/35 to enable). If the model
+    # has not answered by the soft deadline, a degraded turn is tried: the fast model
+    # (if set) with only the last few messages of context; by the hard deadline the
+    # player gets a holding narrative that changes nothing. The hard deadline counts
+    # from the start of the turn and covers the roll follow-up too. A late primary
+    # answer is kept for a resend of the same action while the state is unchanged,
+    # for TURN_SLO_CACHE_SECONDS.
+    TURN_SLO_SOFT_SECONDS: float = 0.0
+    TURN_SLO_HARD_SECONDS: float = 35.0
+    TURN_SLO_FAST_MODEL: str | None = None
+    TURN_SLO_FAST_HISTORY_MESSAGES: int = 8
+    TURN_SLO_CACHE_SECONDS: float = 300.0
+
+    # Live view across workers/nodes: state updates go over a Redis-protocol pub/sub
+    # channel ("redis://host:6379" or "unix:///path.sock"; the bundled stand-in
+    # `python -m backend.app.live_bus` works too). Unset = in-process only.
+    LIVE_BUS_URL: str | None = None
+    LIVE_BUS_CHANNEL: str = "fushi:live"
+
+    # Dice rolls: "two_phase" asks the model again after the roll; "branched" has it
+    # pre-write every outcome with the roll request, so a roll costs one call.
+    ROLL_PROTOCOL: str = "two_phase"
+
+    # Periodic cheat checks run on background workers. Cleared inputs are remembered
+    # per input; only the others are sent, after this many cleared ones for context.
+    CHEAT_CHECK_WORKERS: int = 2
+    CHEAT_CHECK_CONTEXT_INPUTS: int = 2
+    # How long a cleared input is remembered
+    CHEAT_CHECK_MEMO_TTL_SECONDS: float = 6 * 3600
+    # Queued checks of several players are sent as one request; 1 disables batching
+    CHEAT_CHECK_BATCH_MAX_PLAYERS: int = 20
+    CHEAT_CHECK_BATCH_WINDOW_SECONDS: float = 3.0
+    # A settlement check without a verdict (provider down, unexpected reply) is tried
+    # this many times, then the settlement is held and retried in the background,
+    # first after this delay, doubling up to 10 minutes.
+    CHEAT_CHECK_SETTLEMENT_ATTEMPTS: int = 2
+    CHEAT_CHECK_SETTLEMENT_RETRY_SECONDS: float = 60.0
+    # Local pre-filter for periodic checks: off|shadow|on. "on" clears batches
+    # scoring below the threshold without a model call; "shadow" only compares.
+    CHEAT_PREFILTER_MODE: str = "shadow"
+    CHEAT_PREFILTER_THRESHOLD: float = 1.0
+    CHEAT_PREFILTER_NGRAM: bool = False  # also learn from logged verdicts (cheat_verdicts.jsonl)
+
+    # WebSocket pushes: payloads longer than this many characters are gzipped on a
+    # worker thread instead of the event loop (histories come from the encoder cache)
+    WS_OFFLOAD_MIN_CHARS: int = 32768
+    WS_ENCODE_WORKERS: int = 2
+    # Pushes carry only the tail of display_history (whichever limit is hit first);
+    # older entries are paged in over /api/game/history and /api/live/history
+    HISTORY_WINDOW_ENTRIES: int = 40
+    HISTORY_WINDOW_CHARS: int = 16000
+    HISTORY_PAGE_SIZE: int = 50
+
+    # Finished trials move out of the session into a per-player gzip archive,
+    # leaving a one-line summary; read back via /api/game/archive
+    TRIAL_ARCHIVE_ENABLED: bool = True
+    TRIAL_ARCHIVE_DIR: str = "trial_archive"
+
+    # Limits for state_update entries from the model; offending entries are dropped
+    STATE_UPDATE_MAX_VALUE_CHARS: int = 20000
+    STATE_MAX_LIFE_KEYS: int = 100
+    STATE_MAX_LIST_ITEMS: int = 200
+
+    # Pre-generated openings for new trials, kept per (opportunities, inheritance mark).
+    # 0 disables the pool; refills only run while few player turns are in flight.
+    OPENING_POOL_SIZE: int = 0
+    OPENING_POOL_TTL_SECONDS: float = 6 * 3600
+    OPENING_POOL_IDLE_MAX_ACTIVE: int = 2
+
+    # Token accounting and cost-aware routing.
+    # MODEL_PRICES: "model:input/output[/cached]" per 1M tokens, comma-separated.
+    MODEL_PRICES: str | None = None
+    # With a comma-separated model list, these send a call to the cheapest model:
+    ROUTING_LONG_CONTEXT_TOKENS: int = 60000  # estimated prompt tokens; 0 disables
+    ROUTING_PLAYER_DAILY_BUDGET: float = 0.0  # cost per player per day; 0 disables
+
+    # Circuit breaker (per AI provider, shared by all callers)
+    CIRCUIT_BREAKER_WINDOW: int = 20  # recent calls considered for the failure rate
+    CIRCUIT_BREAKER_MIN_CALLS: int = 4  # calls required before the breaker may open
+    CIRCUIT_BREAKER_FAILURE_RATE: float = 0.5
+    CIRCUIT_BREAKER_OPEN_SECONDS: float = 30.0  # cooldown before a half-open probe
+    CIRCUIT_BREAKER_HALF_OPEN_PROBES: int = 1
 
     # JWT Settings
     SECRET_KEY: str
@@ -30,6 +137,7 @@ class Settings(BaseSettings):
 
     # Authentication Settings (Simple Username/Password)
     AUTH_USERS: str | None = None  # Format: username1:password1,username2:password2
+    ADMIN_USERS: str | None = None  # Usernames allowed to read operator endpoints (e.g. usage summary), comma-separated
 
     # Server Settings
     HOST: str = "127.0.0.1"
@@ -0,0 +1,27 @@
+import time
+
+
+class DeadlineExceeded(Exception):
+    """The time budget for a turn (or other AI work) ran out."""
+
+
+class Deadline:
+    """
+    An absolute time budget shared by every AI call made for one unit of work,
+    e.g. the first-stage call, the roll follow-up and any retries of a turn.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self, what: str = "AI call"):
+        """Raises DeadlineExceeded if the budget is spent."""
+        if self.expired():
+            raise DeadlineExceeded(f"{what}: {self.seconds:.0f}s budget exhausted")
@@ -5,13 +5,22 @@ import json
 import asyncio
 import time
 import traceback
-from copy import deepcopy
 from datetime import date
 from pathlib import Path
 from fastapi import HTTPException, status
 
 from . import state_manager, ai_provider as openai_client, cheat_check, redemption
+from .ai_turn import AITurn
+from .deadline import Deadline, DeadlineExceeded
 from .websocket_manager import manager as websocket_manager
+from .action_tasks import action_tasks
+from .opening_pool import opening_pool
+from .trial_archive import trial_archive
+from .admission import admission
+from .turn_slo import turn_slo, state_key
+from .turn_context import state_view_json
+from .session_model import Session, filter_state_update, new_history_epoch
+from .usage import CALL_ROLL_FOLLOWUP, CALL_OPENING
 from .config import settings
 
 # --- Logging ---
@@ -36,6 +45,36 @@ def _load_prompt(filename: str) -> str:
 GAME_MASTER_SYSTEM_PROMPT = _load_prompt("game_master.txt")
 START_GAME_PROMPT = _load_prompt("start_game_prompt.txt")
 START_TRIAL_PROMPT = _load_prompt("start_trial_prompt.txt")
+ROLL_BRANCHES_PROMPT = _load_prompt("roll_branches.txt")
+
+# --- Opening Pool ---
+def _opening_prompt(opportunities_remaining: int) -> str:
+    if opportunities_remaining == INITIAL_OPPORTUNITIES:
+        return START_GAME_PROMPT
+    return START_TRIAL_PROMPT.format(
+        opportunities_remaining=opportunities_remaining,
+        opportunities_remaining_minus_1=opportunities_remaining - 1,
+    )
+
+
+def _inheritance_message(inheritance: dict) -> dict:
+    return {"role": "system", "content": f"轮回印记：{inheritance['system']}。在叙事与状态生成时可轻微正向偏置一次，不要破坏随机性。"}
+
+
+async def generate_opening(opportunities_remaining: int, inheritance: dict | None) -> AITurn:
+    """Generates an opening turn outside any session, for the opening pool."""
+    history = [{"role": "system", "content": GAME_MASTER_SYSTEM_PROMPT}]
+    if inheritance:
+        history.append(_inheritance_message(inheritance))
+    history.append({"role": "user", "content": "开始试炼"})
+    return await openai_client.get_ai_response(
+        prompt=_opening_prompt(opportunities_remaining),
+        history=history,
+        structured=True,
+        deadline=Deadline(settings.AI_TURN_DEADLINE_SECONDS),
+        call_type=CALL_OPENING,
+    )
+
 
 # --- Game Logic ---
 
@@ -53,10 +92,19 @@ async def get_or_create_daily_session(current_user: dict) -> dict:
             session["daily_success_achieved"] = False
             await state_manager.save_session(player_id, session)
 
+        if session.get("pending_settlement"):
+            # Held before a restart, or its retry died with the process
+            schedule_settlement_retry(player_id)
         return session
 
     logger.info(f"Starting new daily session for {player_id}.")
-    new_session = {
+    action_tasks.cancel(player_id, "new daily session")
+    turn_slo.forget(player_id)
+    cheat_check.cheat_queue.forget(player_id)
+    if session:
+        # Yesterday's last trial would otherwise be dropped with the session
+        await trial_archive.archive_trial(session, finished_only=False)
+    new_session = Session({
         "player_id": player_id,
         "session_date": today_str,
         "opportunities_remaining": INITIAL_OPPORTUNITIES,
@@ -65,6 +113,8 @@ async def get_or_create_daily_session(current_user: dict) -> dict:
         "is_processing": False,
         "pending_punishment": None,
         "unchecked_rounds_count": 0,
+        "input_rounds": 0,
+        "history_epoch": new_history_epoch(),
         "current_life": None,
         "internal_history": [{"role": "system", "content": GAME_MASTER_SYSTEM_PROMPT}],
         "display_history": [
@@ -94,7 +144,7 @@ async def get_or_create_daily_session(current_user: dict) -> dict:
         ],
         "roll_event": None,
         "redemption_code": None,
-    }
+    })
     await state_manager.save_session(player_id, new_session)
     return new_session
 
@@ -126,8 +176,12 @@ async def refresh_daily_attempts(current_user: dict) -> dict:
             detail="Can only refresh attempts after achieving daily success"
         )
 
+    action_tasks.cancel(player_id, "session refreshed")
+    turn_slo.forget(player_id)
+    cheat_check.cheat_queue.forget(player_id)
+    await trial_archive.archive_trial(session, finished_only=False)
     # Reset the session while keeping the date
-    new_session = {
+    new_session = Session({
         "player_id": player_id,
         "session_date": today_str,
         "opportunities_remaining": INITIAL_OPPORTUNITIES,
@@ -136,6 +190,9 @@ async def refresh_daily_attempts(current_user: dict) -> dict:
         "is_processing": False,
         "pending_punishment": None,
         "unchecked_rounds_count": 0,
+        # Same day: round numbers keep counting, so no verdict key is reused
+        "input_rounds": session.get("input_rounds", 0),
+        "history_epoch": new_history_epoch(),
         "current_life": None,
         "internal_history": [{"role": "system", "content": GAME_MASTER_SYSTEM_PROMPT}],
         "display_history": [
@@ -181,7 +238,7 @@ async def refresh_daily_attempts(current_user: dict) -> dict:
         ],
         "roll_event": None,
         "redemption_code": None,
-    }
+    })
 
     await state_manager.save_session(player_id, new_session)
     logger.info(f"Refreshed daily attempts for {player_id}")
@@ -191,12 +248,14 @@ async def refresh_daily_attempts(current_user: dict) -> dict:
 
 async def _handle_roll_request(
     player_id: str,
-    last_state: dict,
+    state_json: str,
     roll_request: dict,
     original_action: str,
     first_narrative: str,
     internal_history: list[dict],
-) -> tuple[str, dict]:
+    deadline: Deadline | None = None,
+    pre_roll_turn: AITurn | None = None,
+) -> tuple[AITurn, dict]:
     roll_type, target, sides = (
         roll_request.get("type", "判定"),
         roll_request.get("target", 50),
@@ -227,12 +286,23 @@ async def _handle_roll_request(
     )
     await asyncio.sleep(0.03)  # Give time for async websocket delivery
 
-    prompt_for_ai_part2 = f"{result_text}\n\n请严格基于此判定结果，继续叙事，并返回包含叙事和状态更新的最终JSON对象。这是当前的游戏状态JSON:\n{json.dumps(last_state, ensure_ascii=False)}"
+    # Branched protocol: the continuation for this outcome came with the roll request
+    branch = pre_roll_turn.branch_for(outcome) if pre_roll_turn else None
+    if branch is not None:
+        logger.debug(f"Applying pre-generated '{outcome}' branch for {player_id}")
+        return AITurn(narrative=branch.narrative, state_update=branch.state_update), roll_event
+
+    prompt_for_ai_part2 = f"{result_text}\n\n请严格基于此判定结果，继续叙事，并返回包含叙事和状态更新的最终JSON对象。这是当前的游戏状态JSON:\n{state_json}"
     history_for_part2 = internal_history  # History is now updated before this call
-    ai_response = await openai_client.get_ai_response(
-        prompt=prompt_for_ai_part2, history=history_for_part2
+    ai_turn = await openai_client.get_ai_response(
+        prompt=prompt_for_ai_part2,
+        history=history_for_part2,
+        structured=True,
+        deadline=deadline,
+        player_id=player_id,
+        call_type=CALL_ROLL_FOLLOWUP,
     )
-    return ai_response, roll_event
+    return ai_turn, roll_event
 
 
 def end_game_and_get_code(
@@ -276,23 +346,92 @@ def end_game_and_get_code(
     }
 
 
-def _extract_json_from_response(response_str: str) -> str | None:
-    if "```json" in response_str:
-        start_pos = response_str.find("```json") + 7
-        end_pos = response_str.find("```", start_pos)
-        if end_pos != -1:
-            return response_str[start_pos:end_pos].strip()
-    start_pos = response_str.find("{")
-    if start_pos != -1:
-        brace_level = 0
-        for i in range(start_pos, len(response_str)):
-            if response_str[i] == "{":
-                brace_level += 1
-            elif response_str[i] == "}":
-                brace_level -= 1
-                if brace_level == 0:
-                    return response_str[start_pos : i + 1]
-    return None
+FINAL_JUDGEMENT_MESSAGE = (
+    "【最终清算】\n就在你即将功德圆满，破碎虚空之际，整个世界的法则骤然凝滞。\n\n"
+    "时间仿佛静止，万物失去色彩，只余下黑白二色。一道无悲无喜的目光穿透时空，落在你的神魂之上，开始审视你此生的一切轨迹。\n\n"
+    "“功过是非，皆有定数。然，汝之命途，存有异数。”\n\n"
+    "天道之音在你灵台中响起，不带丝毫情感，却蕴含着不容置疑的威严。\n\n"
+    "“天机已被扰动，因果之线呈现不应有之扭曲。此番功果，暂且搁置。”\n\n"
+    "“下一瞬间，将是对汝此生所有言行的最终裁决。清浊自分，功过相抵。届时，一切虚妄都将无所遁形。”\n\n"
+    "你感到一股无法抗拒的力量正在回溯你此生的每一个瞬间，任何投机取巧的痕迹都在这终极的审视下被一一标记。结局已定，无可更改。"
+)
+SETTLEMENT_HELD_MESSAGE = (
+    "【天机未明】\n天道正欲审视汝此生的轨迹，然天机一时晦暗，未能定论。\n\n"
+    "汝此番功果已暂且封存，待天机明朗，自会清算，无需再次试炼。"
+)
+
+# Held settlements being retried in the background, by player
+_settlement_retries: dict[str, asyncio.Task] = {}
+
+
+async def _settle(
+    session: dict, user_id: int, player_id: str, spirit_stones: int, rounds: list
+):
+    """
+    Runs the settlement cheat check and pays out, refuses, or (without a
+    verdict) holds the settlement in `pending_settlement` for a retry.
+    """
+    level = await cheat_check.run_settlement_check(player_id, rounds)
+    if level == cheat_check.UNKNOWN:
+        if not session.get("pending_settlement"):
+            # The rounds are kept: the trial is archived when the turn ends
+            session["pending_settlement"] = {
+                "user_id": user_id,
+                "spirit_stones": spirit_stones,
+                "rounds": [list(r) for r in rounds],
+            }
+            session["display_history"].append(SETTLEMENT_HELD_MESSAGE)
+        schedule_settlement_retry(player_id)
+        return
+    session.pop("pending_settlement", None)
+    if level == "正常":
+        end_game_data, end_day_update = end_game_and_get_code(
+            user_id, player_id, spirit_stones
+        )
+        _apply_state_update(session, end_day_update)
+        session["display_history"].append(end_game_data.get("final_message", ""))
+    else:
+        session["display_history"].append(FINAL_JUDGEMENT_MESSAGE)
+
+
+def schedule_settlement_retry(player_id: str):
+    task = _settlement_retries.get(player_id)
+    if task and not task.done():
+        return
+    _settlement_retries[player_id] = asyncio.create_task(_retry_settlement(player_id))
+
+
+async def _retry_settlement(player_id: str):
+    """Retries a held settlement with a growing delay until it gets a verdict."""
+    delay = settings.CHEAT_CHECK_SETTLEMENT_RETRY_SECONDS
+    try:
+        while True:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 600)
+            session = await state_manager.get_session(player_id)
+            pending = session.get("pending_settlement") if session else None
+            if not pending:
+                return  # settled, or the session was replaced
+            logger.info(f"Retrying held settlement for {player_id}...")
+            try:
+                await _settle(
+                    session,
+                    pending["user_id"],
+                    player_id,
+                    pending["spirit_stones"],
+                    [tuple(r) for r in pending["rounds"]],
+                )
+            except Exception as e:
+                logger.error(f"Held settlement retry for {player_id} failed: {e}", exc_info=True)
+                continue
+            if await state_manager.get_session(player_id) is not session:
+                logger.info(f"Session for {player_id} was replaced; dropping held settlement.")
+                return
+            await state_manager.save_session(player_id, session)
+            if not session.get("pending_settlement"):
+                return
+    finally:
+        _settlement_retries.pop(player_id, None)
 
 
 def _apply_state_update(state: dict, update: dict) -> dict:
@@ -316,6 +455,20 @@ def _apply_state_update(state: dict, update: dict) -> dict:
     return state
 
 
+def _is_action_message(message: dict, action: str) -> bool:
+    return message.get("role") == "user" and message.get("content") == action
+
+
+def _undo_turn(session: dict, turn_start: tuple[int, int, int] | None):
+    """Drops everything a turn added to the histories and restores its round counter."""
+    if turn_start is None:
+        return
+    internal_start, display_start, rounds_start = turn_start
+    del session["internal_history"][internal_start:]
+    del session["display_history"][display_start:]
+    session["input_rounds"] = rounds_start
+
+
 async def _process_player_action_async(user_info: dict, action: str):
     player_id = user_info["username"]
     user_id = user_info["id"]
@@ -324,59 +477,90 @@ async def _process_player_action_async(user_info: dict, action: str):
         logger.error(f"Async task: Could not find session for {player_id}.")
         return
 
+    # One time budget for every AI call this turn makes
+    deadline = Deadline(settings.AI_TURN_DEADLINE_SECONDS)
+    # What the player may wait in total under the latency SLO (the full budget if it is off)
+    slo_deadline = turn_slo.turn_deadline(deadline)
+    cancelled = False
+    # (internal_history length, display_history length, input_rounds) before
+    # this turn added anything, to undo it if the turn is cancelled
+    turn_start = None
     try:
         is_starting_trial = action in [
             "开始试炼",
             "开启下一次试炼",
         ] and not session.get("is_in_trial")
-        is_first_ever_trial_of_day = (
-            is_starting_trial
-            and session.get("opportunities_remaining") == INITIAL_OPPORTUNITIES
-        )
-        session_copy = deepcopy(session)
-        session_copy.pop("internal_history", 0)
-        session_copy["display_history"] = (
-            "\n".join(session_copy.get("display_history", []))
-        )[-1000:]
+        if is_starting_trial:
+            # Normally archived when it ended; this catches one that was not
+            # (e.g. the archive was unwritable). Then mark where this one begins.
+            await trial_archive.archive_trial(session)
+            session["trial_start"] = {
+                "internal_history": len(session["internal_history"]),
+                "display_history": len(session["display_history"]),
+                "life": INITIAL_OPPORTUNITIES - session["opportunities_remaining"] + 1,
+                "started_at": time.time(),
+            }
+        # Serialized once, before this turn changes anything; reused by the roll follow-up
+        state_json = state_view_json(session)
         prompt_for_ai = (
-            START_GAME_PROMPT
-            if is_first_ever_trial_of_day
-            else START_TRIAL_PROMPT.format(
-                opportunities_remaining=session["opportunities_remaining"],
-                opportunities_remaining_minus_1=session["opportunities_remaining"] - 1,
-            )
+            _opening_prompt(session["opportunities_remaining"])
             if is_starting_trial
-            else f'这是当前的游戏状态JSON:\n{json.dumps(session_copy, ensure_ascii=False)}\n\n玩家的行动是: "{action}"\n\n请根据状态和行动，生成包含`narrative`和(`state_update`或`roll_request`)的JSON作为回应。如果角色死亡，请在叙述中说明，并在`state_update`中同时将`is_in_trial`设为`false`，`current_life`设为`null`。'
+            else f'这是当前的游戏状态JSON:\n{state_json}\n\n玩家的行动是: "{action}"\n\n请根据状态和行动，生成包含`narrative`和(`state_update`或`roll_request`)的JSON作为回应。如果角色死亡，请在叙述中说明，并在`state_update`中同时将`is_in_trial`设为`false`，`current_life`设为`null`。'
         )
+        if settings.ROLL_PROTOCOL == "branched" and not is_starting_trial:
+            prompt_for_ai = f"{prompt_for_ai}\n\n{ROLL_BRANCHES_PROMPT}"
+
+        # What a late answer to this action would have to match to be reused
+        slo_key = state_key(session, action)
 
         # Update histories with user action first
-        session["internal_history"].append({"role": "user", "content": action})
+        turn_start = (
+            len(session["internal_history"]),
+            len(session["display_history"]),
+            session.get("input_rounds", 0),
+        )
+        # Numbered so cheat check verdicts stay tied to this input, whatever
+        # later happens to the history around it
+        session["input_rounds"] = session.get("input_rounds", 0) + 1
+        session["internal_history"].append(
+            {"role": "user", "content": action, "round": session["input_rounds"]}
+        )
         session["display_history"].append(f"> {action}")
 
         await state_manager.save_session(player_id, session)
-        # Get AI response
-        ai_json_response_str = await openai_client.get_ai_response(
-            prompt=prompt_for_ai, history=session["internal_history"]
+        # Get AI response, already parsed and validated; openings may come pre-generated
+        inheritance = (session.get("inheritance") or [None])[0]
+        ai_turn = (
+            opening_pool.take(session["opportunities_remaining"], inheritance)
+            if is_starting_trial
+            else None
         )
+        slo_outcome = None
+        if ai_turn is None:
+            # Bounded by the latency SLO; may come back degraded
+            ai_turn, slo_outcome = await turn_slo.call(
+                player_id, slo_key, prompt_for_ai, session["internal_history"], deadline, slo_deadline
+            )
 
-        if ai_json_response_str.startswith("错误："):
-            raise Exception(f"OpenAI Client Error: {ai_json_response_str}")
-        json_str = _extract_json_from_response(ai_json_response_str)
-        if not json_str:
-            raise json.JSONDecodeError("No JSON found", ai_json_response_str, 0)
-        ai_response_data = json.loads(json_str)
-
-        # Handle Roll vs No-Roll Path
-        if "roll_request" in ai_response_data and ai_response_data["roll_request"]:
+        # Handle Holding vs Roll vs No-Roll Path
+        if slo_outcome == "holding":
+            # --- HOLDING PATH ---
+            # Nothing happened: the state is untouched and the action leaves the
+            # model's context, so the player can simply send it again
+            state_update = ai_turn.state_update
+            session["display_history"].append(ai_turn.narrative)
+            history = session["internal_history"]
+            if history and _is_action_message(history[-1], action):
+                history.pop()
+            if is_starting_trial:
+                session["trial_start"] = None
+        elif ai_turn.roll_request:
             # --- ROLL PATH ---
             # 1. Update state with pre-roll narrative
-            first_narrative = ai_response_data.get("narrative", "")
+            first_narrative = ai_turn.narrative
             session["display_history"].append(first_narrative)
             session["internal_history"].append(
-                {
-                    "role": "assistant",
-                    "content": json.dumps(ai_response_data, ensure_ascii=False),
-                }
+                {"role": "assistant", "content": ai_turn.to_history()}
             )
 
             # 2. SEND INTERIM UPDATE to show pre-roll narrative
@@ -384,93 +568,72 @@ async def _process_player_action_async(user_info: dict, action: str):
             await asyncio.sleep(0.03)  # Give frontend a moment to render
 
             # 3. Perform roll and get final AI response
-            final_ai_json_str, roll_event = await _handle_roll_request(
+            final_turn, roll_event = await _handle_roll_request(
                 player_id,
-                session_copy,
-                ai_response_data["roll_request"],
+                state_json,
+                ai_turn.roll_request.model_dump(),
                 action,
                 first_narrative,
                 internal_history=session["internal_history"],  # Pass updated history
+                deadline=slo_deadline,  # what is left of the turn's hard budget
+                pre_roll_turn=ai_turn,
             )
-            final_json_str = _extract_json_from_response(final_ai_json_str)
-            if not final_json_str:
-                raise json.JSONDecodeError(
-                    "No JSON in second-stage", final_ai_json_str, 0
-                )
-            final_response_data = json.loads(final_json_str)
 
             # 4. Process final response
-            narrative = final_response_data.get("narrative", "AI响应格式错误，请重试")
-            state_update = final_response_data.get("state_update", {})
-            session = _apply_state_update(session, state_update)
+            narrative = final_turn.narrative
+            state_update = final_turn.state_update
+            session = _apply_state_update(session, filter_state_update(session, state_update))
             session["display_history"].extend([roll_event["result_text"], narrative])
             session["internal_history"].extend(
                 [
                     {"role": "system", "content": roll_event["result_text"]},
-                    {"role": "assistant", "content": final_ai_json_str},
+                    {"role": "assistant", "content": final_turn.to_history()},
                 ]
             )
-            if narrative == "AI响应格式错误，请重试":
-                session["internal_history"].append(
-                    {
-                        "role": "system",
-                        "content": '请给出正确格式的JSON响应。必须是正确格式的json，包括narrative和state_update或roll_request，刚才的格式错误，系统无法加载！正确输出{"key":value}',
-                    },
-                )
         else:
             # --- NO ROLL PATH ---
-            narrative = ai_response_data.get("narrative", "AI响应格式错误，请重试")
-            state_update = ai_response_data.get("state_update", {})
-            session = _apply_state_update(session, state_update)
+            narrative = ai_turn.narrative
+            state_update = ai_turn.state_update
+            session = _apply_state_update(session, filter_state_update(session, state_update))
             session["display_history"].append(narrative)
             session["internal_history"].append(
-                {"role": "assistant", "content": ai_json_response_str}
+                {"role": "assistant", "content": ai_turn.to_history()}
             )
-            if narrative == "AI响应格式错误，请重试":
-                session["internal_history"].append(
-                    {
-                        "role": "system",
-                        "content": '请给出正确格式的JSON响应。必须是正确格式的json，包括narrative和(state_update或roll_request)，刚才的格式错误，系统无法加载！正确输出{"key":value}，至少得是"{"开头吧',
-                    },
-                )
 
         await state_manager.save_session(player_id, session)
         # --- Common final logic for both paths ---
         trigger = state_update.get("trigger_program")
         if trigger and trigger.get("name") == "spiritStoneConverter":
-            inputs_to_check = await state_manager.get_last_n_inputs(
+            rounds_to_check = await state_manager.get_last_n_rounds(
                 player_id, 8 + session["unchecked_rounds_count"]
             )
 
             await state_manager.save_session(
                 player_id, session
             )  # Save before cheat check
-            if "正常" == await cheat_check.run_cheat_check(player_id, inputs_to_check):
-                session = await state_manager.get_session(player_id)
-                spirit_stones = trigger.get("spirit_stones", 0)
-                end_game_data, end_day_update = end_game_and_get_code(
-                    user_id, player_id, spirit_stones
-                )
-                session = _apply_state_update(session, end_day_update)
-                session["display_history"].append(
-                    end_game_data.get("final_message", "")
-                )
+            await _settle(
+                session, user_id, player_id, trigger.get("spirit_stones", 0), rounds_to_check
+            )
 
-            else:
-                session = await state_manager.get_session(player_id)
-                if not session:
-                    raise Exception(
-                        f"Post-cheat-check: Could not find session for {player_id}."
-                    )
-                session["display_history"].append(
-                    "【最终清算】\n就在你即将功德圆满，破碎虚空之际，整个世界的法则骤然凝滞。\n\n"
-                    "时间仿佛静止，万物失去色彩，只余下黑白二色。一道无悲无喜的目光穿透时空，落在你的神魂之上，开始审视你此生的一切轨迹。\n\n"
-                    "“功过是非，皆有定数。然，汝之命途，存有异数。”\n\n"
-                    "天道之音在你灵台中响起，不带丝毫情感，却蕴含着不容置疑的威严。\n\n"
-                    "“天机已被扰动，因果之线呈现不应有之扭曲。此番功果，暂且搁置。”\n\n"
-                    "“下一瞬间，将是对汝此生所有言行的最终裁决。清浊自分，功过相抵。届时，一切虚妄都将无所遁形。”\n\n"
-                    "你感到一股无法抗拒的力量正在回溯你此生的每一个瞬间，任何投机取巧的痕迹都在这终极的审视下被一一标记。结局已定，无可更改。"
-                )
+    except asyncio.CancelledError:
+        # Nobody will see this turn (disconnect, punishment, reset): undo
+        # everything it added (the action, and on the roll path the pre-roll
+        # answer) to both histories, so the next prompt does not carry it and
+        # the player's view matches the model's context, then re-raise.
+        cancelled = True
+        logger.info(f"Action '{action}' for {player_id} cancelled.")
+        _undo_turn(session, turn_start)
+        raise
+
+    except DeadlineExceeded as e:
+        logger.warning(f"Turn for {player_id} ran out of time: {e}")
+        if turn_slo.enabled():
+            turn_slo.record(player_id, "turn_deadline", "error", deadline.seconds - deadline.remaining(), str(e))
+        # As on cancel: an unanswered action must not stay in the model's context
+        _undo_turn(session, turn_start)
+        session["display_history"].append(
+            "【天机紊乱】\n你的行动未能激起任何波澜，仿佛被无形之力化解。请稍后再试。"
+        )
 
     except Exception as e:
         logger.error(f"Error processing action for {player_id}: {e}", exc_info=True)
@@ -489,7 +652,7 @@ async def _process_player_action_async(user_info: dict, action: str):
 
     finally:
         try:
-            if "session" in locals() and session:
+            if "session" in locals() and session and not cancelled:
                 # Periodic cheat check in `finally` to guarantee execution
                 session["unchecked_rounds_count"] = (
                     session.get("unchecked_rounds_count", 0) + 1
@@ -497,42 +660,29 @@ async def _process_player_action_async(user_info: dict, action: str):
                 await state_manager.save_session(player_id, session)
 
                 if session.get("unchecked_rounds_count", 0) > 5:
-                    logger.info(f"Running periodic cheat check for {player_id}...")
-
-                    # Re-fetch the session to get the most up-to-date count
-                    s = await state_manager.get_session(player_id)
-                    if s:
-                        unchecked_count = s.get("unchecked_rounds_count", 0)
-                        logger.debug(
-                            f"Running cheat check for {player_id} with {unchecked_count} rounds."
-                        )
-
-                        inputs_to_check = await state_manager.get_last_n_inputs(
-                            player_id, 8 + unchecked_count
-                        )
-                        # Only run if there are inputs, to save API calls
-                        if inputs_to_check:
-                            await cheat_check.run_cheat_check(
-                                player_id, inputs_to_check
-                            )
-                            session = await state_manager.get_session(player_id)
-
-                        logger.debug(f"Cheat check for {player_id} finished.")
-                    else:
-                        logger.warning(
-                            f"Session for {player_id} disappeared during cheat check."
-                        )
+                    # Judged by a background worker; the turn doesn't wait for it
+                    rounds_to_check = await state_manager.get_last_n_rounds(
+                        player_id, 8 + session["unchecked_rounds_count"]
+                    )
+                    logger.info(f"Queueing periodic cheat check for {player_id}...")
+                    cheat_check.cheat_queue.enqueue(player_id, rounds_to_check)
         except Exception as e:
             logger.error(
                 f"Error scheduling background cheat check for {player_id}: {e}",
                 exc_info=True,
             )
 
-        session["roll_event"] = None
-        session["is_processing"] = False
-        session["last_modified"] = time.time()
-        await state_manager.save_session(player_id, session)
-        logger.info(f"Async action task for {player_id} finished.")
+        if await state_manager.get_session(player_id) is not session:
+            # The session was reset or replaced while this turn ran; don't overwrite it
+            logger.info(f"Session for {player_id} was replaced; discarding finished turn.")
+        else:
+            # A trial that ended this turn goes to the cold archive right away
+            await trial_archive.archive_trial(session)
+            session["roll_event"] = None
+            session["is_processing"] = False
+            session["last_modified"] = time.time()
+            await state_manager.save_session(player_id, session)
+            logger.info(f"Async action task for {player_id} finished.")
 
 
 async def process_player_action(current_user: dict, action: str):
@@ -542,11 +692,30 @@ async def process_player_action(current_user: dict, action: str):
         logger.error(f"Action for non-existent session: {player_id}")
         return
     if session.get("is_processing"):
+        if settings.ACTION_MAILBOX_SIZE > 0 and action_tasks.is_running(player_id):
+            # Runs right after the current turn, without another round trip
+            status = action_tasks.add_pending(player_id, action)
+            logger.info(f"Action '{action}' for {player_id} while processing: {status}.")
+            await websocket_manager.send_json_to_player(
+                player_id,
+                {
+                    "type": "action_ack",
+                    "data": {
+                        "action": action,
+                        "status": status,
+                        "pending": action_tasks.pending_count(player_id),
+                    },
+                },
+            )
+            return
         logger.warning(f"Action '{action}' blocked for {player_id}, processing.")
         return
     if session.get("daily_success_achieved"):
         logger.warning(f"Action '{action}' blocked for {player_id}, day complete.")
         return
+    if session.get("pending_settlement"):
+        logger.warning(f"Action '{action}' blocked for {player_id}, settlement held.")
+        return
     if session.get("opportunities_remaining", 10) <= 0 and not session.get(
         "is_in_trial"
     ):
@@ -589,6 +758,8 @@ async def process_player_action(current_user: dict, action: str):
             new_state["is_in_trial"], new_state["current_life"] = False, None
             new_state["opportunities_remaining"] = -10
         new_state["pending_punishment"] = None
+        # The punished trial is over; its summary goes before the punishment
+        await trial_archive.archive_trial(new_state)
         new_state["display_history"].append(punishment_narrative)
         await state_manager.save_session(player_id, new_state)
         return
@@ -607,9 +778,44 @@ async def process_player_action(current_user: dict, action: str):
         )
         return
 
+    refusal = admission.check(player_id)
+    if refusal:
+        logger.warning(f"Action '{action}' refused for {player_id}: {refusal}")
+        await websocket_manager.send_json_to_player(
+            player_id, {"type": "error", "detail": refusal}
+        )
+        return
+
     session["is_processing"] = True
     await state_manager.save_session(
         player_id, session
     )  # Save processing state immediately
 
-    asyncio.create_task(_process_player_action_async(current_user, action))
+    task = asyncio.create_task(_run_admitted_action(current_user, action))
+    action_tasks.register(player_id, task, action)
+
+    def _on_done(t: asyncio.Task):
+        # Cancelled before the turn itself started (queued, or not yet running):
+        # nothing else would unset the flag
+        if t.cancelled() and state_manager.SESSIONS.get(player_id) is session and session.get("is_processing"):
+            session["is_processing"] = False
+            asyncio.ensure_future(state_manager.save_session(player_id, session))
+
+    task.add_done_callback(_on_done)
+
+
+async def _run_admitted_action(current_user: dict, action: str):
+    """Waits for a turn slot from the admission controller, then runs the turn."""
+    player_id = current_user["username"]
+    await admission.acquire(player_id)
+    try:
+        await _process_player_action_async(current_user, action)
+    finally:
+        admission.release(player_id)
+
+    # Actions that arrived during this turn (the mailbox is emptied on cancel).
+    # One that is no longer valid (e.g. the trial ended) is skipped for the next.
+    while (next_action := action_tasks.pop_pending(player_id)) is not None:
+        await process_player_action(current_user, next_action)
+        if action_tasks.tasks.get(player_id) is not asyncio.current_task():
+            break  # a new turn started and owns the rest of the mailbox
@@ -1,6 +1,8 @@
 import logging
 import asyncio
-from typing import Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Optional
 
 try:
     import google.generativeai as genai
@@ -8,61 +10,182 @@ except ImportError:
     genai = None
 
 from .config import settings
+from .usage import usage_tracker, CALL_TURN
 
 logger = logging.getLogger(__name__)
 
+# --- Client State ---
+# genai.configure() is process-global, so it only needs to run once.
+_configured: bool = False
+# GenerativeModel objects keyed by (model name, system instruction), LRU-bounded.
+_models: "OrderedDict[tuple[str, str], object]" = OrderedDict()
+_MAX_CACHED_MODELS = 32
+# Only used when the installed library has no async API.
+_executor: ThreadPoolExecutor | None = None
+_executor_slots: asyncio.Semaphore | None = None
 
-def _build_prompt(prompt: str, history: Optional[list[dict]] = None) -> str:
-    """Convert chat-style history to a single text prompt for Gemini."""
-    parts: list[str] = []
-    if history:
-        for m in history:
-            role = m.get("role", "user")
-            content = m.get("content", "")
-            if role == "system":
-                parts.append(f"[系统指令]\n{content}\n")
-            elif role == "assistant":
-                parts.append(f"[星君答复]\n{content}\n")
-            else:
-                parts.append(f"[玩家]\n{content}\n")
-    parts.append(f"[当前请求]\n{prompt}")
-    return "\n\n".join(parts)
 
-
-async def get_ai_response(
-    prompt: str,
-    history: Optional[list[dict]] = None,
-    model: Optional[str] = None,
-    force_json: bool = True,
-) -> str:
-    """Get response from Google Gemini."""
+def _ensure_configured():
+    global _configured
+    if _configured:
+        return
     if genai is None:
         raise RuntimeError("google-generativeai not installed")
-
     api_key = settings.GEMINI_API_KEY
     if not api_key:
         raise RuntimeError("GEMINI_API_KEY not set")
 
-    # Configure Gemini
     config_kwargs = {"api_key": api_key}
     if settings.GEMINI_BASE_URL:
         config_kwargs["client_options"] = {"api_endpoint": settings.GEMINI_BASE_URL}
-    
     genai.configure(**config_kwargs)
+    _configured = True
+    logger.info("Gemini 客户端初始化成功。")
+
+
+def _get_model(model_name: str, system_instruction: str):
+    key = (model_name, system_instruction)
+    m = _models.get(key)
+    if m is not None:
+        _models.move_to_end(key)
+        return m
+    m = genai.GenerativeModel(model_name, system_instruction=system_instruction or None)
+    _models[key] = m
+    if len(_models) > _MAX_CACHED_MODELS:
+        _models.popitem(last=False)
+    return m
+
+
+def _build_contents(
+    prompt: str, history: Optional[list[dict]] = None
+) -> tuple[str, list[dict]]:
+    """
+    Convert chat-style history to Gemini role-structured contents.
+
+    Leading system messages become the system instruction. System messages
+    that appear mid-conversation (roll results, format reminders) are sent as
+    user turns, since Gemini only knows the "user" and "model" roles.
+    Consecutive turns of the same role are merged.
+    """
+    system_parts: list[str] = []
+    contents: list[dict] = []
+    messages = list(history or []) + [{"role": "user", "content": prompt}]
+
+    for m in messages:
+        role = m.get("role", "user")
+        content = m.get("content", "")
+        if role == "system" and not contents:
+            system_parts.append(content)
+            continue
+        if role == "system":
+            gemini_role, text = "user", f"[系统指令]\n{content}"
+        elif role == "assistant":
+            gemini_role, text = "model", content
+        else:
+            gemini_role, text = "user", content
+
+        if contents and contents[-1]["role"] == gemini_role:
+            contents[-1]["parts"].append(text)
+        else:
+            contents.append({"role": gemini_role, "parts": [text]})
+
+    return "\n\n".join(system_parts), contents
+
+
+def _generation_config(force_json: bool) -> dict | None:
+    if force_json:
+        return {"response_mime_type": "application/json"}
+    return None
 
-    _model = model or settings.GEMINI_MODEL
-    text = _build_prompt(prompt, history)
 
-    def _run_blocking():
-        m = genai.GenerativeModel(_model)
-        resp = m.generate_content(text)
-        return resp.text or ""
+def _get_executor() -> tuple[ThreadPoolExecutor, asyncio.Semaphore]:
+    global _executor, _executor_slots
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.GEMINI_MAX_WORKERS, thread_name_prefix="gemini"
+        )
+        _executor_slots = asyncio.Semaphore(settings.GEMINI_MAX_WORKERS)
+    return _executor, _executor_slots
 
+
+def _record_usage(player_id, call_type, model_name, usage_metadata):
+    if usage_metadata is None:
+        return
+    usage_tracker.record(
+        player_id,
+        call_type,
+        model_name,
+        getattr(usage_metadata, "prompt_token_count", 0) or 0,
+        getattr(usage_metadata, "candidates_token_count", 0) or 0,
+        getattr(usage_metadata, "cached_content_token_count", 0) or 0,
+    )
+
+
+async def stream_ai_response(
+    prompt: str,
+    history: Optional[list[dict]] = None,
+    model: Optional[str] = None,
+    force_json: bool = True,
+    player_id: Optional[str] = None,
+    call_type: str = CALL_TURN,
+) -> AsyncIterator[str]:
+    """Yields response text chunks from Google Gemini as they arrive."""
+    _ensure_configured()
+    model_name = model or settings.GEMINI_MODEL
+    system_instruction, contents = _build_contents(prompt, history)
+    m = _get_model(model_name, system_instruction)
+    generation_config = _generation_config(force_json)
+
+    if hasattr(m, "generate_content_async"):
+        resp = await m.generate_content_async(
+            contents, generation_config=generation_config, stream=True
+        )
+        usage_metadata = None
+        async for chunk in resp:
+            # The final chunk carries the totals for the whole response
+            usage_metadata = getattr(chunk, "usage_metadata", None) or usage_metadata
+            text = getattr(chunk, "text", "")
+            if text:
+                yield text
+        _record_usage(player_id, call_type, model_name, usage_metadata)
+        return
+
+    # Older library versions: blocking call on a dedicated, bounded executor
+    executor, slots = _get_executor()
+    async with slots:
+        loop = asyncio.get_running_loop()
+        resp = await loop.run_in_executor(
+            executor,
+            lambda: m.generate_content(contents, generation_config=generation_config),
+        )
+    _record_usage(player_id, call_type, model_name, getattr(resp, "usage_metadata", None))
+    if resp.text:
+        yield resp.text
+
+
+async def get_ai_response(
+    prompt: str,
+    history: Optional[list[dict]] = None,
+    model: Optional[str] = None,
+    force_json: bool = True,
+    player_id: Optional[str] = None,
+    call_type: str = CALL_TURN,
+) -> str:
+    """Get response from Google Gemini."""
     try:
-        result_text = await asyncio.to_thread(_run_blocking)
+        chunks = [
+            c
+            async for c in stream_ai_response(
+                prompt, history, model, force_json, player_id, call_type
+            )
+        ]
+        result_text = "".join(chunks)
         if not result_text:
             raise ValueError("Empty response from Gemini")
         return result_text.strip()
+    except asyncio.CancelledError:
+        logger.info("Gemini request cancelled.")
+        raise
     except Exception as e:
         logger.error(f"Gemini API error: {e}")
         raise
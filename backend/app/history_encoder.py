@@ -0,0 +1,168 @@
+import json
+from collections.abc import Mapping
+from typing import Any
+
+from .config import settings
+from .session_model import to_jsonable
+
+# Session fields that only ever grow by appends
+APPEND_ONLY_FIELDS = ("internal_history", "display_history")
+
+
+def dumps(value: Any) -> str:
+    """The one JSON flavour used for WebSocket pushes and the data file."""
+    return json.dumps(value, ensure_ascii=False, default=to_jsonable)
+
+
+class PrefixEncoder:
+    """
+    Keeps the serialized JSON of every entry of one append-only list. Entries
+    appended since the last call are encoded and added to the cache; any other
+    change (the list replaced or shortened, or its last known entry swapped)
+    starts over. Entries are treated as immutable once appended.
+    """
+
+    __slots__ = ("_items", "_parts", "_last")
+
+    def __init__(self):
+        self._items: list | None = None
+        self._parts: list[str] = []
+        self._last: Any = None
+
+    def parts(self, items: list) -> list[str]:
+        """Encoded entries of `items`, in order. Do not mutate the result."""
+        count = len(self._parts)
+        if (
+            items is not self._items
+            or len(items) < count
+            or (count and items[count - 1] is not self._last)
+        ):
+            self._items = items
+            self._parts = []
+            count = 0
+        if len(items) > count:
+            self._parts.extend(dumps(item) for item in items[count:])
+            self._last = items[-1]
+        return self._parts
+
+
+def history_parts(session: Mapping, field: str) -> list[str]:
+    """Encoded entries of one of the session's histories, from its cache when it has one."""
+    items = session.get(field)
+    if not isinstance(items, list):
+        return []
+    encoders = getattr(session, "_encoders", None)
+    if encoders is None:
+        # Plain dicts have nowhere to keep a cache
+        return [dumps(item) for item in items]
+    encoder = encoders.get(field)
+    if encoder is None:
+        encoder = encoders[field] = PrefixEncoder()
+    return encoder.parts(items)
+
+
+def join_list(parts: list[str]) -> str:
+    return f"[{', '.join(parts)}]"
+
+
+def splice(obj: Mapping | str, raw: dict[str, str]) -> str:
+    """
+    JSON of `obj` (a mapping, or an already-encoded object) with extra keys
+    whose values are already-encoded JSON text.
+    """
+    head = obj if isinstance(obj, str) else dumps(dict(obj))
+    if not raw:
+        return head
+    # A single join: chained f-strings re-copy the large UCS-2 history text
+    chunks = [head[:-1]]
+    for key, text in raw.items():
+        chunks += [", " if len(chunks) > 1 or len(head) > 2 else "", dumps(key), ": ", text]
+    chunks.append("}")
+    return "".join(chunks)
+
+
+def encode_session(
+    session: Mapping, omit: tuple[str, ...] = (), extra: dict[str, str] | None = None
+) -> str:
+    """
+    A session as JSON text. The histories are spliced in from the per-session
+    cache, so the cost depends on what was appended since the last call, not
+    on how long the histories are. `extra` adds keys with already-encoded values.
+    """
+    rest = {}
+    raw = {}
+    for key, value in session.items():
+        if key in omit:
+            continue
+        if key in APPEND_ONLY_FIELDS and isinstance(value, list):
+            raw[key] = join_list(history_parts(session, key))
+        else:
+            rest[key] = value
+    raw.update(extra or {})
+    return splice(rest, raw)
+
+
+# --- History Windows ---
+def window_start(history: list, max_entries: int, max_chars: int) -> int:
+    """
+    Index of the first entry in the recent window: at most `max_entries`
+    entries and about `max_chars` characters, but always the last entry.
+    """
+    start = len(history)
+    chars = 0
+    while start > 0 and len(history) - start < max_entries:
+        entry = history[start - 1]
+        chars += len(entry) if isinstance(entry, str) else 0
+        if chars > max_chars and start < len(history):
+            break
+        start -= 1
+    return start
+
+
+def public_parts(session: Mapping, start: int, end: int) -> list[str]:
+    """
+    Encoded display entries [start, end) as shown to live viewers: the
+    player's own inputs become null (so indices still line up) and the
+    redemption code is masked.
+    """
+    history = session.get("display_history") or []
+    parts = history_parts(session, "display_history")
+    code = session.get("redemption_code")
+    masked_code = f"{code[:1]}...{code[-1:]}" if code else None
+    result = []
+    for i in range(start, end):
+        entry = history[i]
+        if isinstance(entry, str) and entry.strip().startswith("> "):
+            result.append("null")
+        elif code and isinstance(entry, str) and code in entry:
+            result.append(dumps(entry.replace(code, masked_code)))
+        else:
+            result.append(parts[i])
+    return result
+
+
+def window_fields(session: Mapping, public: bool = False) -> dict[str, str]:
+    """Encoded display_history window plus its position, for splicing into a push."""
+    history = session.get("display_history") or []
+    total = len(history)
+    start = window_start(history, settings.HISTORY_WINDOW_ENTRIES, settings.HISTORY_WINDOW_CHARS)
+    parts = public_parts(session, start, total) if public else history_parts(session, "display_history")[start:]
+    return {
+        "display_history": join_list(parts),
+        "display_history_start": str(start),
+        "display_history_total": str(total),
+        "display_history_epoch": str(session.get("history_epoch", 0)),
+    }
+
+
+def history_page(session: Mapping, before: int | None, limit: int, public: bool = False) -> str:
+    """JSON page of display_history entries ending just before index `before`."""
+    history = session.get("display_history") or []
+    total = len(history)
+    end = total if before is None else max(0, min(before, total))
+    start = max(0, end - limit)
+    parts = public_parts(session, start, end) if public else history_parts(session, "display_history")[start:end]
+    return splice(
+        {"start": start, "total": total, "epoch": session.get("history_epoch", 0)},
+        {"entries": join_list(parts)},
+    )
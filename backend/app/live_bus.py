@@ -0,0 +1,307 @@
+"""
+Pub/sub bus that carries live-view updates between server processes.
+
+Every process publishes the updates of the players it hosts and receives
+everyone's, so a viewer can watch a player served by another worker or node.
+Messages are plain text; every subscriber gets every message, its own included.
+
+  InProcessBus - subscribers in this process only (a single worker, tests)
+  RespBus      - a Redis-protocol server over TCP or a Unix socket:
+                 LIVE_BUS_URL=redis://[:password@]host:6379 or unix:///path.sock
+
+The Redis server can be replaced by the local stand-in in this module, which
+speaks just enough of the protocol (PING, AUTH, SELECT, SUBSCRIBE, PUBLISH):
+
+    python -m backend.app.live_bus --port 6390
+    python -m backend.app.live_bus --unix /tmp/fushi-live.sock
+"""
+import argparse
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from urllib.parse import unquote, urlparse
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[str], Awaitable[None]]
+
+_CONNECT_TIMEOUT_SECONDS = 5.0
+_RECONNECT_MAX_SECONDS = 30.0
+# The stand-in drops subscribers that fall this far behind, like Redis' output buffer limit
+_MAX_SUBSCRIBER_BUFFER = 8 * 1024 * 1024
+
+
+class LiveBus:
+    """Publishes text messages to every subscriber, in every process."""
+
+    # True if messages reach other processes
+    remote = False
+
+    async def start(self, handler: Handler):
+        """Starts delivering messages to `handler`."""
+        raise NotImplementedError
+
+    async def publish(self, message: str):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class InProcessBus(LiveBus):
+    """Delivers to the handlers started on this bus object."""
+
+    def __init__(self):
+        self._handlers: list[Handler] = []
+
+    async def start(self, handler: Handler):
+        self._handlers.append(handler)
+
+    async def publish(self, message: str):
+        for handler in list(self._handlers):
+            try:
+                await handler(message)
+            except Exception as e:
+                logger.error(f"Live bus handler failed: {e}", exc_info=True)
+
+    async def close(self):
+        self._handlers.clear()
+
+
+# --- Redis Protocol ---
+class RespError(Exception):
+    """An error reply from the server."""
+
+
+def _bulk(arg: str | bytes) -> bytes:
+    data = arg.encode("utf-8") if isinstance(arg, str) else arg
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+def encode_command(*args: str | bytes) -> bytes:
+    return b"*%d\r\n" % len(args) + b"".join(_bulk(arg) for arg in args)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    """One reply; bulk strings come back as bytes. Raises EOFError on a closed connection."""
+    line = await reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise EOFError("connection closed")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode()
+    if kind == b"-":
+        raise RespError(rest.decode())
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        size = int(rest)
+        if size < 0:
+            return None
+        data = await reader.readexactly(size + 2)
+        return data[:-2]
+    if kind == b"*":
+        count = int(rest)
+        if count < 0:
+            return None
+        items = []
+        for _ in range(count):
+            try:
+                items.append(await read_reply(reader))
+            except RespError as e:
+                items.append(e)
+        return items
+    raise RespError(f"unexpected reply type {kind!r}")
+
+
+async def _open(url: str) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    parsed = urlparse(url)
+    if parsed.scheme == "unix":
+        opening = asyncio.open_unix_connection(unquote(parsed.path))
+    elif parsed.scheme in ("redis", "tcp"):
+        opening = asyncio.open_connection(parsed.hostname or "127.0.0.1", parsed.port or 6379)
+    else:
+        raise ValueError(f"Unsupported live bus URL: {url}")
+    reader, writer = await asyncio.wait_for(opening, timeout=_CONNECT_TIMEOUT_SECONDS)
+    if parsed.password:
+        writer.write(encode_command("AUTH", unquote(parsed.password)))
+        await writer.drain()
+        await read_reply(reader)
+    return reader, writer
+
+
+class RespBus(LiveBus):
+    """
+    Redis pub/sub on one channel. Publishing uses one connection and
+    subscribing another, as the protocol requires. Both reconnect on their
+    own; messages published while the server is unreachable are dropped
+    (the next revision of the player supersedes them anyway).
+    """
+
+    remote = True
+
+    def __init__(self, url: str, channel: str):
+        self.url = url
+        self.channel = channel
+        self._pub: tuple[asyncio.StreamReader, asyncio.StreamWriter] | None = None
+        self._pub_lock = asyncio.Lock()
+        self._sub_task: asyncio.Task | None = None
+
+    async def start(self, handler: Handler):
+        self._sub_task = asyncio.create_task(self._subscribe_loop(handler))
+
+    async def _subscribe_loop(self, handler: Handler):
+        delay = 1.0
+        while True:
+            writer = None
+            try:
+                reader, writer = await _open(self.url)
+                writer.write(encode_command("SUBSCRIBE", self.channel))
+                await writer.drain()
+                logger.info(f"Live bus subscribed to '{self.channel}' at {self.url}.")
+                delay = 1.0
+                while True:
+                    reply = await read_reply(reader)
+                    if isinstance(reply, list) and len(reply) == 3 and reply[0] == b"message":
+                        try:
+                            await handler(reply[2].decode("utf-8"))
+                        except Exception as e:
+                            logger.error(f"Live bus handler failed: {e}", exc_info=True)
+            except asyncio.CancelledError:
+                raise
+            except (OSError, EOFError, asyncio.IncompleteReadError, asyncio.TimeoutError, RespError) as e:
+                logger.warning(f"Live bus subscription lost ({e}); retrying in {delay:.0f}s.")
+            finally:
+                if writer is not None:
+                    writer.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, _RECONNECT_MAX_SECONDS)
+
+    async def publish(self, message: str):
+        async with self._pub_lock:
+            try:
+                if self._pub is None:
+                    self._pub = await _open(self.url)
+                reader, writer = self._pub
+                writer.write(encode_command("PUBLISH", self.channel, message))
+                await writer.drain()
+                await read_reply(reader)
+            except (OSError, EOFError, asyncio.IncompleteReadError, asyncio.TimeoutError, RespError) as e:
+                logger.warning(f"Live bus publish failed, message dropped: {e}")
+                self._drop_publisher()
+            except asyncio.CancelledError:
+                # A reply may still be on its way; the connection is out of step
+                self._drop_publisher()
+                raise
+
+    def _drop_publisher(self):
+        if self._pub is not None:
+            self._pub[1].close()
+            self._pub = None
+
+    async def close(self):
+        if self._sub_task is not None:
+            self._sub_task.cancel()
+            self._sub_task = None
+        self._drop_publisher()
+
+
+def create_bus(url: str | None, channel: str) -> LiveBus:
+    """The bus for LIVE_BUS_URL: in-process when it is not set."""
+    if not url:
+        return InProcessBus()
+    return RespBus(url, channel)
+
+
+# --- Local Stand-in Server ---
+class StandInServer:
+    """In-memory Redis-protocol pub/sub server, for running several workers without Redis."""
+
+    def __init__(self):
+        # Key: channel, Value: writers of the subscribed connections
+        self.channels: dict[bytes, set[asyncio.StreamWriter]] = {}
+
+    def _unsubscribe_all(self, writer: asyncio.StreamWriter):
+        for channel in list(self.channels):
+            self.channels[channel].discard(writer)
+            if not self.channels[channel]:
+                del self.channels[channel]
+
+    def _publish(self, channel: bytes, message: bytes) -> int:
+        subscribers = list(self.channels.get(channel, ()))
+        frame = encode_command(b"message", channel, message)
+        for writer in subscribers:
+            if writer.transport.get_write_buffer_size() > _MAX_SUBSCRIBER_BUFFER:
+                logger.warning("Dropping a subscriber that is too far behind.")
+                self._unsubscribe_all(writer)
+                writer.close()
+                continue
+            writer.write(frame)
+        return len(subscribers)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscribed: set[bytes] = set()
+        try:
+            while True:
+                command = await read_reply(reader)
+                if not isinstance(command, list) or not command:
+                    writer.write(b"-ERR expected a command array\r\n")
+                    continue
+                name = bytes(command[0]).upper()
+                args = command[1:]
+                if name == b"PING":
+                    writer.write(b"+PONG\r\n")
+                elif name in (b"AUTH", b"SELECT", b"CLIENT"):
+                    writer.write(b"+OK\r\n")
+                elif name == b"SUBSCRIBE":
+                    for channel in args:
+                        self.channels.setdefault(channel, set()).add(writer)
+                        subscribed.add(channel)
+                        writer.write(b"*3\r\n%s%s:%d\r\n" % (_bulk("subscribe"), _bulk(channel), len(subscribed)))
+                elif name == b"UNSUBSCRIBE":
+                    for channel in args or list(subscribed):
+                        self.channels.get(channel, set()).discard(writer)
+                        subscribed.discard(channel)
+                        writer.write(b"*3\r\n%s%s:%d\r\n" % (_bulk("unsubscribe"), _bulk(channel), len(subscribed)))
+                elif name == b"PUBLISH" and len(args) == 2:
+                    writer.write(f":{self._publish(args[0], args[1])}\r\n".encode())
+                elif name == b"QUIT":
+                    writer.write(b"+OK\r\n")
+                    break
+                else:
+                    writer.write(f"-ERR unknown command '{name.decode(errors='replace')}'\r\n".encode())
+                await writer.drain()
+        except (EOFError, asyncio.IncompleteReadError, ConnectionError, RespError):
+            pass
+        finally:
+            self._unsubscribe_all(writer)
+            writer.close()
+
+
+async def serve(host: str, port: int, unix_path: str | None = None):
+    server = StandInServer()
+    if unix_path:
+        listener = await asyncio.start_unix_server(server.handle, path=unix_path)
+        logger.info(f"Live bus stand-in listening on unix://{unix_path}")
+    else:
+        listener = await asyncio.start_server(server.handle, host, port)
+        logger.info(f"Live bus stand-in listening on {host}:{port}")
+    async with listener:
+        await listener.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Redis-protocol pub/sub stand-in for the live bus")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    parser.add_argument("--unix", default=None, help="listen on this Unix socket instead of TCP")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
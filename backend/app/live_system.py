@@ -1,24 +1,60 @@
+import asyncio
+import json
 import logging
+import uuid
 from collections import defaultdict
+from collections.abc import Callable, Mapping
+from .config import settings
 from .websocket_manager import manager as websocket_manager
+from .client_view import live_view
+from .history_encoder import dumps, splice
+from .live_bus import LiveBus, create_bus
 
 logger = logging.getLogger(__name__)
 
 class LiveManager:
-    def __init__(self):
+    """
+    Live viewing across processes. Viewers are tracked per process; state
+    updates travel over the live bus, so every process can fan an update out
+    to its own viewers, wherever the watched player is served.
+
+    A bus message is a JSON header line followed by the encoded live view:
+    an "update" for each revision of a session (published once, encoded once),
+    a "want" asking whichever process holds a session to publish it, and the
+    "snapshot" it answers with.
+    """
+
+    def __init__(self, bus: LiveBus | None = None):
         # Key: a player_id being watched (the "broadcaster")
         # Value: a set of player_ids who are watching (the "viewers")
         self.viewers = defaultdict(set)
         # Key: a viewer's player_id
         # Value: the player_id they are currently watching
         self.watching = {}
+        self.bus = bus or create_bus(settings.LIVE_BUS_URL, settings.LIVE_BUS_CHANNEL)
+        # Tells this process' messages apart from the other processes'
+        self.origin = uuid.uuid4().hex
+        # Key: a broadcaster's player_id, Value: the last session version published / delivered
+        self._published: dict[str, int] = {}
+        self._delivered: dict[str, int] = {}
+        # Finds a session served by this process, to answer "want" messages
+        self._session_lookup: Callable[[str], Mapping | None] | None = None
+        self.published = 0
+        self.received = 0
+
+    async def start(self, session_lookup: Callable[[str], Mapping | None]):
+        self._session_lookup = session_lookup
+        await self.bus.start(self._on_message)
+
+    async def stop(self):
+        await self.bus.close()
 
     def add_viewer(self, viewer_id: str, target_id: str):
         """Adds a viewer to a target's broadcast."""
         if viewer_id in self.watching:
             # If the viewer was watching someone else, remove them from the old group
             self.remove_viewer(viewer_id)
-        
+
         self.viewers[target_id].add(viewer_id)
         self.watching[viewer_id] = target_id
         logger.info(f"Live System: Player '{viewer_id}' is now watching '{target_id}'.")
@@ -32,18 +68,82 @@ class LiveManager:
                 if not self.viewers[target_id]:
                     # Clean up empty sets
                     del self.viewers[target_id]
+                    self._delivered.pop(target_id, None)
             logger.info(f"Live System: Player '{viewer_id}' stopped watching '{target_id}'.")
 
-    async def broadcast_state_update(self, target_id: str, state: dict):
-        """Broadcasts a state update to all viewers of a target player."""
-        if target_id in self.viewers:
-            viewer_list = list(self.viewers[target_id])
-            logger.info(f"Live System: Broadcasting state of '{target_id}' to {len(viewer_list)} viewers. First one is '{viewer_list[0]}'." if viewer_list else "No viewers to broadcast to.")
-            for viewer_id in viewer_list:
-                # The data is the state of the *target* player
-                await websocket_manager.send_json_to_player(
-                    viewer_id, {"type": "live_update", "data": state}
-                )
+    def _message(self, kind: str, target_id: str, version: int | None = None, data: str = "") -> str:
+        header = dumps({"origin": self.origin, "kind": kind, "target": target_id, "version": version})
+        # json.dumps never emits a raw newline, so the first one ends the header
+        return f"{header}\n{data}"
+
+    async def broadcast_state_update(self, target_id: str, state: Mapping):
+        """
+        Sends a new revision of a session to its viewers: to this process'
+        viewers directly and to the other processes over the bus.
+        """
+        version = getattr(state, "version", None)
+        if version is not None and self._published.get(target_id) == version:
+            return
+        if not self.bus.remote and target_id not in self.viewers:
+            return  # nobody else can be watching
+        self._published[target_id] = version
+        data = live_view(state)
+        await self._deliver(target_id, version, data)
+        self.published += 1
+        await self.bus.publish(self._message("update", target_id, version, data))
+
+    async def request_snapshot(self, target_id: str):
+        """Asks the process serving target_id (if any) to publish its current state."""
+        if self.bus.remote:
+            await self.bus.publish(self._message("want", target_id))
+
+    async def _on_message(self, message: str):
+        header_text, _, data = message.partition("\n")
+        try:
+            header = json.loads(header_text)
+        except ValueError:
+            logger.warning("Live System: Ignoring a malformed bus message.")
+            return
+        if header.get("origin") == self.origin:
+            return  # already delivered to this process' viewers
+        self.received += 1
+        kind, target_id = header.get("kind"), header.get("target")
+
+        if kind == "want":
+            session = self._session_lookup(target_id) if self._session_lookup else None
+            if session:
+                version = getattr(session, "version", None)
+                await self.bus.publish(self._message("snapshot", target_id, version, live_view(session)))
+            return
+        if kind in ("update", "snapshot") and target_id in self.viewers:
+            # A snapshot answers a new viewer, who has not seen this version yet
+            await self._deliver(target_id, header.get("version"), data, force=kind == "snapshot")
+
+    async def _deliver(self, target_id: str, version: int | None, data: str, force: bool = False):
+        """Sends an encoded live view to this process' viewers of target_id."""
+        viewer_list = list(self.viewers.get(target_id, ()))
+        if not viewer_list:
+            return
+        last = self._delivered.get(target_id)
+        if version is not None:
+            if not force and last is not None and version <= last:
+                return  # older than what the viewers already have
+            self._delivered[target_id] = max(version, last or version)
+        logger.info(f"Live System: Broadcasting state of '{target_id}' to {len(viewer_list)} viewers. First one is '{viewer_list[0]}'.")
+        # The data is the state of the *target* player
+        text = splice({"type": "live_update"}, {"data": data})
+        await asyncio.gather(
+            *(websocket_manager.send_text_to_player(viewer_id, text) for viewer_id in viewer_list)
+        )
+
+    def stats(self) -> dict:
+        return {
+            "bus": type(self.bus).__name__,
+            "watched_players": len(self.viewers),
+            "viewers": len(self.watching),
+            "published": self.published,
+            "received": self.received,
+        }
 
 # Create a single instance of the manager
-live_manager = LiveManager()
\ No newline at end of file
+live_manager = LiveManager()
@@ -1,5 +1,6 @@
 import logging
 import asyncio
+import hashlib
 import time
 from contextlib import asynccontextmanager
 from datetime import timedelta
@@ -10,13 +11,21 @@ from fastapi import (
     FastAPI, APIRouter, Depends, HTTPException, status,
     WebSocket, WebSocketDisconnect, Request, Form
 )
-from fastapi.responses import RedirectResponse, FileResponse, JSONResponse
+from fastapi.responses import RedirectResponse, FileResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
-from . import auth_simple as auth, game_logic, state_manager, security
+from . import auth_simple as auth, game_logic, state_manager, security, ai_provider, cheat_check
 from .websocket_manager import manager as websocket_manager
 from .live_system import live_manager
+from .action_tasks import action_tasks
+from .usage import usage_tracker
+from .opening_pool import opening_pool
+from .history_encoder import history_page
+from .client_view import client_view
+from .trial_archive import trial_archive
+from .admission import admission
+from .turn_slo import turn_slo
 from .config import settings
 
 # --- Logging Configuration ---
@@ -29,9 +38,20 @@ async def lifespan(app: FastAPI):
     logging.info("Application startup...")
     state_manager.load_from_json()
     state_manager.start_auto_save_task()
+    await live_manager.start(lambda player_id: state_manager.SESSIONS.get(player_id))
+    usage_tracker.load_from_json()
+    usage_tracker.start_auto_save_task()
+    cheat_check.cheat_queue.load_from_json()
+    cheat_check.cheat_queue.start_workers()
+    opening_pool.load_from_json()
+    opening_pool.start_refill_task(game_logic.generate_opening, game_logic.INITIAL_OPPORTUNITIES)
     yield
     logging.info("Application shutdown...")
+    await live_manager.stop()
     state_manager.save_to_json()
+    usage_tracker.save_to_json()
+    opening_pool.save_to_json()
+    cheat_check.cheat_queue.save_to_json()
 
 # --- FastAPI App Instance ---
 app = FastAPI(lifespan=lifespan, title="浮生十梦")
@@ -90,7 +110,32 @@ async def logout():
 @api_router.get("/health")
 async def health_check():
     """Health check endpoint for Docker and load balancers."""
-    return {"status": "healthy", "timestamp": time.time()}
+    return {
+        "status": "healthy",
+        "timestamp": time.time(),
+        "ai": ai_provider.get_health(),
+        "opening_pool": opening_pool.stats(),
+        "cheat_prefilter": cheat_check.prefilter.stats(),
+        "admission": admission.stats(),
+        "turn_slo": turn_slo.stats(),
+        "live": live_manager.stats(),
+    }
+
+# --- Usage Routes ---
+@api_router.get("/usage/me")
+async def get_my_usage(
+    current_user: Annotated[dict, Depends(auth.get_current_active_user)],
+):
+    """Token usage and cost of the current player today."""
+    return usage_tracker.player_usage_today(current_user["username"])
+
+@api_router.get("/usage/summary")
+async def get_usage_summary(
+    current_user: Annotated[dict, Depends(auth.get_current_admin_user)],
+    day: str | None = None,
+):
+    """Daily usage per model and call type, cost per player, and top players (ADMIN_USERS only)."""
+    return usage_tracker.summary(day)
 
 # --- Game Routes ---
 @api_router.get("/live/players")
@@ -107,7 +152,8 @@ async def init_game(
     This does NOT start a trial, it just ensures the session for the day exists.
     """
     game_state = await game_logic.get_or_create_daily_session(current_user)
-    return game_state
+    # The client projection, never the raw session (internal prompts stay server-side)
+    return Response(content=client_view(game_state), media_type="application/json")
 
 @api_router.post("/game/refresh-attempts")
 async def refresh_attempts(
@@ -118,7 +164,75 @@ async def refresh_attempts(
     This allows them to restart today's game session.
     """
     game_state = await game_logic.refresh_daily_attempts(current_user)
-    return game_state
+    return Response(content=client_view(game_state), media_type="application/json")
+
+# --- History Routes ---
+def _history_response(
+    request: Request, session, before: int | None, limit: int, public: bool, epoch: int | None = None
+) -> Response:
+    """
+    A page of display_history with an ETag, so unchanged pages revalidate as 304.
+    409 if the client's indices are from an older history_epoch (it must start over).
+    """
+    if not session:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+    if epoch is not None and epoch != session.get("history_epoch", 0):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="History was rewritten; reload it")
+    limit = max(1, min(limit, settings.HISTORY_PAGE_SIZE))
+    body = history_page(session, before, limit, public=public)
+    etag = f'"{hashlib.sha1(body.encode("utf-8")).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@api_router.get("/game/history")
+async def get_history(
+    request: Request,
+    current_user: Annotated[dict, Depends(auth.get_current_active_user)],
+    before: int | None = None,
+    limit: int = settings.HISTORY_PAGE_SIZE,
+    epoch: int | None = None,
+):
+    """Display history entries before index `before` (the newest ones if omitted)."""
+    session = await state_manager.get_session(current_user["username"])
+    return _history_response(request, session, before, limit, public=False, epoch=epoch)
+
+@api_router.get("/live/history")
+async def get_live_history(
+    request: Request,
+    current_user: Annotated[dict, Depends(auth.get_current_active_user)],
+    player_id: str,
+    before: int | None = None,
+    limit: int = settings.HISTORY_PAGE_SIZE,
+    epoch: int | None = None,
+):
+    """Like /game/history, for a watched player (encrypted id), with their inputs hidden."""
+    target_id = security.decrypt_player_id(player_id)
+    if not target_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid player id")
+    session = await state_manager.get_session(target_id)
+    return _history_response(request, session, before, limit, public=True, epoch=epoch)
+
+# --- Archive Routes ---
+@api_router.get("/game/archive")
+async def list_archived_trials(
+    current_user: Annotated[dict, Depends(auth.get_current_active_user)],
+):
+    """The player's archived trials (summaries only), oldest first."""
+    return await trial_archive.list_trials(current_user["username"])
+
+@api_router.get("/game/archive/{trial_id}")
+async def get_archived_trial(
+    trial_id: str,
+    current_user: Annotated[dict, Depends(auth.get_current_active_user)],
+):
+    """One archived trial with its narrative; the model context stays on the server."""
+    record = await trial_archive.get_trial(current_user["username"], trial_id)
+    if not record:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Trial not found")
+    record.pop("internal_history", None)
+    return record
 
 # --- WebSocket Endpoint ---
 @api_router.websocket("/ws")
@@ -139,6 +253,8 @@ async def websocket_endpoint(websocket: WebSocket):
         return
 
     await websocket_manager.connect(websocket, username)
+    # Reconnected within the grace period: keep the in-flight turn
+    action_tasks.clear_grace(username)
 
     try:
         user_info = await auth.get_current_user(token)
@@ -156,6 +272,7 @@ async def websocket_endpoint(websocket: WebSocket):
 
     except WebSocketDisconnect:
         websocket_manager.disconnect(username)
+        action_tasks.cancel_after_grace(username, settings.DISCONNECT_GRACE_SECONDS)
 
 @api_router.websocket("/live/ws")
 async def live_websocket_endpoint(websocket: WebSocket):
@@ -192,6 +309,9 @@ async def live_websocket_endpoint(websocket: WebSocket):
                         await websocket_manager.send_json_to_player(
                             viewer_id, {"type": "live_update", "data": target_state}
                         )
+                    else:
+                        # Served by another process: ask it over the live bus
+                        await live_manager.request_snapshot(target_id)
 
     except WebSocketDisconnect:
         websocket_manager.disconnect(viewer_id)
@@ -0,0 +1,338 @@
+"""
+OpenAI-compatible local stand-in for the LLM provider.
+
+Serves POST /v1/chat/completions (plain and streaming) so the whole action
+pipeline can run without network or API cost. Three modes:
+
+  canned  - synthesizes game-shaped replies (opening turns, narrative with
+            state_update or roll_request, roll continuations, cheat verdicts)
+  record  - proxies to a real upstream and appends every exchange to a JSONL file
+  replay  - answers from a recorded JSONL file, deterministically
+
+Run as a server and point OPENAI_BASE_URL at it:
+
+    python -m backend.app.mock_llm --port 9000 --latency lognormal:0.8,0.5
+    OPENAI_BASE_URL=http://127.0.0.1:9000/v1 OPENAI_API_KEY=mock ./run.sh
+
+Or in-process, e.g. for benchmarks:
+
+    app = create_app(MockLLMConfig(latency="fixed:0.2", error_rate=0.05))
+    AsyncOpenAI(api_key="mock", base_url="http://mock/v1",
+                http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=app)))
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+
+# --- Configuration ---
+class MockLLMConfig(BaseModel):
+    mode: str = "canned"  # canned|record|replay
+    # Latency spec: "none", "fixed:S", "uniform:LO,HI", "lognormal:MEDIAN,SIGMA"
+    latency: str = "none"
+    error_rate: float = 0.0  # probability of an injected error per request
+    error_status: int = 500  # HTTP status used for injected errors (429, 500, 503...)
+    roll_rate: float = 0.3  # probability a canned action turn asks for a roll
+    cheat_verdict: str = "【正常】"
+    stream_chunk_chars: int = 16
+    seed: int | None = None
+    recording_path: str = "mock_llm_recording.jsonl"
+    upstream_base_url: str | None = None
+    upstream_api_key: str | None = None
+
+
+# --- Latency ---
+def _sample_latency(spec: str, rng: random.Random) -> float:
+    if not spec or spec == "none":
+        return 0.0
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "fixed":
+        return values[0]
+    if kind == "uniform":
+        return rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        median, sigma = values
+        return rng.lognormvariate(0, sigma) * median
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+# --- Canned Responses ---
+# The opening prompts spell out the new opportunities count, e.g. "将`opportunities_remaining`更新为`7`"
+_OPENING_OPPORTUNITIES = re.compile(r"`opportunities_remaining`(?:从`\d+`)?更新为`(\d+)`")
+
+
+def _canned_reply(messages: list[dict], config: MockLLMConfig, rng: random.Random) -> str:
+    last = messages[-1]["content"] if messages else ""
+
+    if '<player id="' in last:
+        # Cross-player cheat check: one verdict per player block
+        ids = re.findall(r'<player id="([^"]+)">', last)
+        return json.dumps({i: config.cheat_verdict for i in ids}, ensure_ascii=False)
+
+    if "<user_inputs>" in last:
+        return config.cheat_verdict
+
+    if last.startswith("【系统提示") and "判定已执行" in last:
+        outcome = last[last.find("最终结果: ") + 6 : last.find("】")] or "成功"
+        reply = {
+            "narrative": f"天命所归，此番判定{outcome}。你稳住心神，继续前行。",
+            "state_update": {"current_life.状态": f"判定{outcome}后的余波"},
+        }
+        return f"```json\n{json.dumps(reply, ensure_ascii=False)}\n```"
+
+    if "这是当前的游戏状态JSON" not in last:
+        # Opening turn (START_GAME_PROMPT / START_TRIAL_PROMPT): follows the
+        # prompt's instructions, so the state stays valid in any later trial
+        state_update = {
+            "is_in_trial": True,
+            "current_life": {
+                "姓名": f"林{rng.randint(1, 999)}",
+                "境界": "凡人",
+                "灵石": 1,
+                "状态": "健康",
+            },
+        }
+        spent = _OPENING_OPPORTUNITIES.search(last)
+        if spent:
+            state_update["opportunities_remaining"] = int(spent.group(1))
+        reply = {
+            "narrative": "【新的轮回】\n你睁开双眼，发现自己是山村中一名普通的采药少年。",
+            "state_update": state_update,
+        }
+        return json.dumps(reply, ensure_ascii=False)
+
+    if rng.random() < config.roll_rate:
+        reply = {
+            "narrative": "你屏息凝神，准备迎接天命的考验……",
+            "roll_request": {"type": "悟性", "target": rng.randint(30, 70), "sides": 100},
+        }
+        if "roll_branches" in last:
+            # ROLL_PROTOCOL=branched: pre-write every outcome
+            reply["roll_branches"] = {
+                outcome: {
+                    "narrative": f"天命所归，此番判定{outcome}。你稳住心神，继续前行。",
+                    "state_update": {"current_life.状态": f"判定{outcome}后的余波"},
+                }
+                for outcome in ("大成功", "成功", "失败", "大失败")
+            }
+    else:
+        reply = {
+            "narrative": "岁月流转，你的修行又有了些许进展。",
+            "state_update": {"current_life.灵石": rng.randint(1, 100)},
+        }
+    return f"<think>mock</think>\n```json\n{json.dumps(reply, ensure_ascii=False)}\n```"
+
+
+# --- Record / Replay ---
+def request_key(body: dict) -> str:
+    """Stable key of a chat request; the model name is ignored so replays survive config changes."""
+    canonical = json.dumps(body.get("messages", []), ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class Recording:
+    """Recorded exchanges. Repeated identical requests replay their answers in order."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: dict[str, list[str]] = defaultdict(list)
+        self._cursor: dict[str, int] = defaultdict(int)
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        item = json.loads(line)
+                        self.entries[item["key"]].append(item["content"])
+
+    def next(self, key: str) -> str | None:
+        answers = self.entries.get(key)
+        if not answers:
+            return None
+        i = self._cursor[key]
+        self._cursor[key] = i + 1
+        return answers[min(i, len(answers) - 1)]
+
+    def append(self, key: str, body: dict, content: str):
+        self.entries[key].append(content)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(
+                json.dumps(
+                    {"key": key, "messages": body.get("messages", []), "content": content},
+                    ensure_ascii=False,
+                )
+                + "\n"
+            )
+
+
+# --- OpenAI Wire Format ---
+def _completion(content: str, model: str, prompt_chars: int) -> dict:
+    return {
+        "id": f"chatcmpl-mock-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_chars // 2,
+            "completion_tokens": len(content) // 2,
+            "total_tokens": (prompt_chars + len(content)) // 2,
+        },
+    }
+
+
+def _chunk(cid: str, model: str, delta: dict, finish_reason: str | None = None) -> str:
+    payload = {
+        "id": cid,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+async def _stream(content: str, model: str, chunk_chars: int, delay: float):
+    cid = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+    pieces = [content[i : i + chunk_chars] for i in range(0, len(content), chunk_chars)] or [""]
+    per_chunk = delay / len(pieces)
+    yield _chunk(cid, model, {"role": "assistant", "content": ""})
+    for piece in pieces:
+        if per_chunk:
+            await asyncio.sleep(per_chunk)
+        yield _chunk(cid, model, {"content": piece})
+    yield _chunk(cid, model, {}, finish_reason="stop")
+    yield "data: [DONE]\n\n"
+
+
+# --- App ---
+def create_app(config: MockLLMConfig | None = None) -> FastAPI:
+    config = config or MockLLMConfig()
+    rng = random.Random(config.seed)
+    recording = Recording(Path(config.recording_path)) if config.mode != "canned" else None
+    stats = {"requests": 0, "errors_injected": 0, "replay_misses": 0}
+    app = FastAPI(title="mock-llm")
+    app.state.config = config
+    app.state.stats = stats
+
+    async def _upstream(body: dict) -> str:
+        if not config.upstream_base_url:
+            raise RuntimeError("record mode requires upstream_base_url")
+        async with httpx.AsyncClient(timeout=300) as client:
+            resp = await client.post(
+                f"{config.upstream_base_url.rstrip('/')}/chat/completions",
+                json={**body, "stream": False},
+                headers={"Authorization": f"Bearer {config.upstream_api_key or ''}"},
+            )
+            resp.raise_for_status()
+            return resp.json()["choices"][0]["message"]["content"] or ""
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "mock", "object": "model"}]}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        messages = body.get("messages", [])
+        model = body.get("model", "mock")
+        delay = _sample_latency(config.latency, rng)
+
+        if config.error_rate and rng.random() < config.error_rate:
+            stats["errors_injected"] += 1
+            await asyncio.sleep(delay)
+            return JSONResponse(
+                status_code=config.error_status,
+                content={"error": {"message": "mock: injected error", "type": "server_error"}},
+            )
+
+        key = request_key(body)
+        if config.mode == "replay":
+            content = recording.next(key)
+            if content is None:
+                stats["replay_misses"] += 1
+                return JSONResponse(
+                    status_code=404,
+                    content={"error": {"message": f"mock: no recording for {key[:12]}", "type": "not_found"}},
+                )
+        elif config.mode == "record":
+            content = await _upstream(body)
+            recording.append(key, body, content)
+        else:
+            content = _canned_reply(messages, config, rng)
+
+        if body.get("stream"):
+            return StreamingResponse(
+                _stream(content, model, config.stream_chunk_chars, delay),
+                media_type="text/event-stream",
+            )
+        if delay:
+            await asyncio.sleep(delay)
+        prompt_chars = sum(len(m.get("content") or "") for m in messages)
+        return _completion(content, model, prompt_chars)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--mode", choices=["canned", "record", "replay"], default="canned")
+    parser.add_argument("--latency", default="none")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--roll-rate", type=float, default=0.3)
+    parser.add_argument("--cheat-verdict", default="【正常】")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--recording", default="mock_llm_recording.jsonl")
+    parser.add_argument("--upstream-base-url", default=None)
+    parser.add_argument("--upstream-api-key", default=None)
+    args = parser.parse_args()
+
+    config = MockLLMConfig(
+        mode=args.mode,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        roll_rate=args.roll_rate,
+        cheat_verdict=args.cheat_verdict,
+        seed=args.seed,
+        recording_path=args.recording,
+        upstream_base_url=args.upstream_base_url,
+        upstream_api_key=args.upstream_api_key,
+    )
+    import uvicorn
+
+    logging.basicConfig(level=logging.INFO)
+    uvicorn.run(create_app(config), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
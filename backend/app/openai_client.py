@@ -1,10 +1,19 @@
 import logging
-from openai import AsyncOpenAI, APIError
+from openai import (
+    AsyncOpenAI,
+    APIError,
+    APIConnectionError,
+    APIStatusError,
+    BadRequestError,
+    RateLimitError,
+)
 
 from .config import settings
+from .ai_turn import AITurn, TURN_JSON_SCHEMA, decode_json_object, parse_turn, strip_think
+from .deadline import Deadline, DeadlineExceeded
+from .usage import usage_tracker, CALL_TURN
 import asyncio
 import random
-import json
 
 # --- Logging ---
 logger = logging.getLogger(__name__)
@@ -16,6 +25,7 @@ if settings.OPENAI_API_KEY and settings.OPENAI_API_KEY != "your_openai_api_key_h
         client = AsyncOpenAI(
             api_key=settings.OPENAI_API_KEY,
             base_url=settings.OPENAI_BASE_URL,
+            max_retries=0,  # retries are scheduled below, within the caller's deadline
         )
         logger.info("OpenAI 客户端初始化成功。")
     except Exception as e:
@@ -25,17 +35,41 @@ else:
     logger.warning("OPENAI_API_KEY 未设置或为占位符，OpenAI 客户端未初始化。")
 
 
-def _extract_json_from_response(response_str: str) -> str | None:
-    if "```json" in response_str:
-        start_pos = response_str.find("```json") + 7
-        end_pos = response_str.find("```", start_pos)
-        if end_pos != -1:
-            return response_str[start_pos:end_pos].strip()
-    start_pos = response_str.find("{")
-    end_pos = response_str.rfind("}")
-    if start_pos != -1 and end_pos != -1 and end_pos > start_pos:
-        return response_str[start_pos : end_pos + 1].strip()
-    return None
+# Models that rejected a response_format, so it is not sent to them again.
+_no_structured_output: set[str] = set()
+
+
+def _response_format_for(model: str) -> dict | None:
+    mode = (settings.OPENAI_STRUCTURED_OUTPUT or "off").lower()
+    if mode == "off" or model in _no_structured_output:
+        return None
+    if mode == "json_object":
+        return {"type": "json_object"}
+    return {"type": "json_schema", "json_schema": TURN_JSON_SCHEMA}
+
+
+def _is_retryable(e: Exception) -> bool:
+    """
+    Timeouts, connection problems, rate limits, 5xx and invalid model output are
+    worth another attempt; auth/permission/not-found/bad-request errors are not.
+    """
+    if isinstance(e, (APIConnectionError, RateLimitError)):  # includes APITimeoutError
+        return True
+    if isinstance(e, APIStatusError):
+        return e.status_code >= 500 or e.status_code in (408, 409)
+    return not isinstance(e, APIError)
+
+
+def _backoff_delay(e: Exception, attempt: int) -> float:
+    """Exponential backoff with jitter, honouring Retry-After on rate limits."""
+    delay = 1 * (2**attempt) + random.uniform(0, 1)  # 基础延迟 1 秒
+    response = getattr(e, "response", None)
+    if isinstance(e, RateLimitError) and response is not None:
+        try:
+            delay = max(delay, float(response.headers.get("retry-after", 0)))
+        except (TypeError, ValueError):
+            pass
+    return delay
 
 
 # --- Core Function ---
@@ -44,23 +78,33 @@ async def get_ai_response(
     history: list[dict] | None = None,
     model=settings.OPENAI_MODEL,
     force_json=True,
-) -> str:
+    structured=False,
+    deadline: Deadline | None = None,
+    player_id: str | None = None,
+    call_type: str = CALL_TURN,
+) -> str | AITurn:
     """
     从 OpenAI API 获取响应。
 
     Args:
         prompt: 用户的提示。
         history: 对话的先前消息列表。
+        structured: 为 True 时返回校验后的 AITurn，失败时抛出异常而不是返回错误字符串。
+        deadline: 本次调用（含所有重试与退避）的时间预算；为 None 时仅受重试次数限制。
+        player_id / call_type: 用于令牌用量统计。
 
     Returns:
-        AI 的响应消息，或错误字符串。
+        AI 的响应消息（或 AITurn），或错误字符串。
     """
     if not client:
+        if structured:
+            raise RuntimeError("OpenAI客户端未初始化。")
         return "错误：OpenAI客户端未初始化。请在 backend/.env 文件中正确设置您的 OPENAI_API_KEY。"
 
     messages = []
     if history:
-        messages.extend(history)
+        # Only what the API knows; history entries may carry bookkeeping (e.g. "round")
+        messages.extend({"role": m["role"], "content": m["content"]} for m in history)
     messages.append({"role": "user", "content": prompt})
 
     total_tokens = sum(len(m["content"]) for m in messages)
@@ -79,9 +123,18 @@ async def get_ai_response(
         raise ValueError("对话历史过长，无法通过删除消息节省足够的令牌。")
 
     max_retries = 7
-    base_delay = 1  # 基础延迟时间（秒）
-
-    for attempt in range(max_retries):
+    min_attempt = settings.AI_MIN_ATTEMPT_SECONDS
+    last_error: Exception | None = None
+
+    def _give_up(e: Exception, message: str):
+        if structured:
+            raise e
+        return f"错误：{message}。详情: {e}"
+
+    attempt = 0
+    while attempt < max_retries:
+        if deadline and deadline.remaining() < min_attempt:
+            break
         _model = model
         if "," in model:
             model_options = [m.strip() for m in model.split(",") if m.strip()]
@@ -92,46 +145,71 @@ async def get_ai_response(
                 else:
                     _model = random.choice(model_options)
                     logger.debug(f"从列表中选择模型: {_model}")
+
+        request_kwargs = {}
+        response_format = _response_format_for(_model) if structured else None
+        if response_format:
+            request_kwargs["response_format"] = response_format
+        if deadline:
+            # The attempt may not outlive the turn's budget
+            request_kwargs["timeout"] = deadline.remaining()
         try:
             response = await client.chat.completions.create(
-                model=_model, messages=messages
+                model=_model, messages=messages, **request_kwargs
             )
+            usage_tracker.record_openai(player_id, call_type, _model, response.usage)
             ai_message = response.choices[0].message.content
             if not ai_message:
                 raise ValueError("AI 响应为空")
-            ret = ai_message.strip()
-            if "<think>" in ret and "</think>" in ret:
-                ret = ret[ret.rfind("</think>") + 8 :].strip()
+            ret = strip_think(ai_message).strip()
 
+            if structured:
+                # Parsed, repaired and validated once; invalid output raises and is retried
+                return parse_turn(ret)
             if force_json:
-                try:
-                    json_part = json.loads(_extract_json_from_response(ret))
-                    if json_part:
-                        return ret
-                    else:
-                        raise ValueError("未找到有效的JSON部分")
-                except Exception as e:
-                    raise ValueError(f"解析AI响应时出错: {e}")
+                if decode_json_object(ret):
+                    return ret
+                raise ValueError("解析AI响应时出错: 未找到有效的JSON部分")
             else:
                 return ret
 
-        except APIError as e:
-            logger.error(f"OpenAI API 错误 (尝试 {attempt + 1}/{max_retries}): {e}")
-            if attempt == max_retries - 1:
-                return f"错误：AI服务出现问题。详情: {e}"
-
-            # 指数退避延迟
-            delay = base_delay * (2**attempt) + random.uniform(0, 1)
-            await asyncio.sleep(delay)
+        except BadRequestError as e:
+            if response_format:
+                # Provider does not support structured output; retry without it at once
+                logger.warning(f"模型 {_model} 不支持 response_format，已降级为普通输出: {e}")
+                _no_structured_output.add(_model)
+                continue  # not an attempt: the retry budget is unchanged
+            logger.error(f"OpenAI API 错误，不可重试: {e}")
+            return _give_up(e, "AI服务出现问题")
 
         except Exception as e:
-            logger.error(
-                f"联系OpenAI时发生意外错误 (尝试 {attempt + 1}/{max_retries}): {e}"
-            )
-            logger.error("错误详情：", exc_info=True)
+            last_error = e
+            if isinstance(e, APIError):
+                logger.error(f"OpenAI API 错误 (尝试 {attempt + 1}/{max_retries}): {e}")
+            else:
+                logger.error(
+                    f"联系OpenAI时发生意外错误 (尝试 {attempt + 1}/{max_retries}): {e}"
+                )
+                logger.error("错误详情：", exc_info=True)
+            if not _is_retryable(e):
+                return _give_up(e, "AI服务出现问题")
             if attempt == max_retries - 1:
-                return f"错误：发生意外错误。详情: {e}"
-
-            # 指数退避延迟
-            delay = base_delay * (2**attempt) + random.uniform(0, 1)
+                return _give_up(e, "发生意外错误")
+
+            # 指数退避延迟，且必须为下一次尝试留出时间
+            delay = _backoff_delay(e, attempt)
+            if deadline:
+                if deadline.remaining() - delay < min_attempt:
+                    delay = deadline.remaining() - min_attempt
+                if delay < 0:
+                    break
             await asyncio.sleep(delay)
+            attempt += 1
+
+    if deadline and deadline.remaining() < min_attempt:
+        logger.warning(f"AI 调用超出时间预算 ({deadline.seconds:.0f}s)，放弃重试。最后错误: {last_error}")
+        return _give_up(
+            DeadlineExceeded(f"AI call exceeded its {deadline.seconds:.0f}s budget"),
+            "AI服务响应超时",
+        )
+    return _give_up(last_error or RuntimeError("AI服务未返回有效响应"), "AI服务未返回有效响应")
@@ -0,0 +1,168 @@
+import asyncio
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from .action_tasks import action_tasks
+from .ai_turn import AITurn
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+_pool_file_path: Path = Path("opening_pool.json")
+_refill_interval: float = 5.0  # seconds between idle checks
+
+# (opportunities_remaining, inheritance entry or None) -> validated opening turn
+OpeningGenerator = Callable[[int, dict | None], Awaitable[AITurn]]
+
+
+def pool_key(opportunities_remaining: int, inheritance: dict | None) -> str:
+    """Openings depend only on the remaining opportunities and the inheritance mark."""
+    return f"{opportunities_remaining}:{(inheritance or {}).get('key', '')}"
+
+
+def is_valid_opening(turn: AITurn) -> bool:
+    """An opening must create a character and start the trial, without a roll."""
+    update = turn.state_update
+    return (
+        turn.roll_request is None
+        and isinstance(update.get("current_life"), dict)
+        and update.get("is_in_trial") is True
+    )
+
+
+class OpeningPool:
+    """
+    Pre-generated opening turns for new trials.
+
+    Openings don't depend on earlier turns, so a background task generates
+    them while the server has spare capacity and hands one out instantly when
+    a trial starts. Only keys players actually asked for recently are kept
+    warm; every entry expires after OPENING_POOL_TTL_SECONDS.
+    """
+
+    def __init__(self):
+        # Key: pool_key(), Value: [(created_at, AITurn JSON), ...] oldest first
+        self.entries: dict[str, list[tuple[float, str]]] = {}
+        # Key: pool_key(), Value: (last requested at, opportunities_remaining, inheritance)
+        self.wanted: dict[str, tuple[float, int, dict | None]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _expire(self, now: float):
+        ttl = settings.OPENING_POOL_TTL_SECONDS
+        for key in list(self.entries):
+            fresh = [e for e in self.entries[key] if now - e[0] < ttl]
+            if fresh:
+                self.entries[key] = fresh
+            else:
+                del self.entries[key]
+        for key in [k for k, w in self.wanted.items() if now - w[0] >= ttl]:
+            del self.wanted[key]
+
+    def want(self, opportunities_remaining: int, inheritance: dict | None = None):
+        """Marks a key as in demand so the refill task keeps it stocked."""
+        key = pool_key(opportunities_remaining, inheritance)
+        self.wanted[key] = (time.time(), opportunities_remaining, inheritance)
+
+    def take(self, opportunities_remaining: int, inheritance: dict | None = None) -> AITurn | None:
+        """Pops a fresh opening for this key, or returns None if the pool has none."""
+        if settings.OPENING_POOL_SIZE <= 0:
+            return None
+        self._expire(time.time())
+        self.want(opportunities_remaining, inheritance)
+        stock = self.entries.get(pool_key(opportunities_remaining, inheritance))
+        if not stock:
+            self.misses += 1
+            return None
+        _, raw = stock.pop(0)
+        self.hits += 1
+        return AITurn.model_validate_json(raw)
+
+    def put(self, opportunities_remaining: int, inheritance: dict | None, turn: AITurn) -> bool:
+        if not is_valid_opening(turn):
+            logger.info(f"Discarding invalid pre-generated opening for {opportunities_remaining}")
+            return False
+        # Don't trust the model with the one number the pool key guarantees
+        turn.state_update["opportunities_remaining"] = opportunities_remaining - 1
+        stock = self.entries.setdefault(pool_key(opportunities_remaining, inheritance), [])
+        stock.append((time.time(), turn.model_dump_json()))
+        del stock[: -settings.OPENING_POOL_SIZE]
+        return True
+
+    def _next_to_fill(self) -> tuple[int, dict | None] | None:
+        """The most recently wanted key that is below its target size."""
+        for _, opportunities, inheritance in sorted(self.wanted.values(), key=lambda w: -w[0]):
+            stock = self.entries.get(pool_key(opportunities, inheritance), [])
+            if len(stock) < settings.OPENING_POOL_SIZE:
+                return opportunities, inheritance
+        return None
+
+    def _has_idle_capacity(self) -> bool:
+        # Player turns always come first
+        active = sum(1 for t in action_tasks.tasks.values() if not t.done())
+        return active <= settings.OPENING_POOL_IDLE_MAX_ACTIVE
+
+    def stats(self) -> dict:
+        return {
+            "size": sum(len(v) for v in self.entries.values()),
+            "keys": {k: len(v) for k, v in self.entries.items()},
+            "wanted": len(self.wanted),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    # --- Refill ---
+    async def _refill_task(self, generate: OpeningGenerator):
+        while True:
+            await asyncio.sleep(_refill_interval)
+            self._expire(time.time())
+            target = self._next_to_fill()
+            if target is None or not self._has_idle_capacity():
+                continue
+            opportunities, inheritance = target
+            try:
+                turn = await generate(opportunities, inheritance)
+                self.put(opportunities, inheritance, turn)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Includes an open circuit breaker; try again on a later tick
+                logger.info(f"Opening pre-generation failed: {e}")
+
+    def start_refill_task(self, generate: OpeningGenerator, initial_opportunities: int):
+        if settings.OPENING_POOL_SIZE <= 0:
+            return
+        # The first trial of the day is by far the most common opening
+        self.want(initial_opportunities)
+        logger.info(f"Starting opening pool refill task. Size per key: {settings.OPENING_POOL_SIZE}")
+        asyncio.create_task(self._refill_task(generate))
+
+    # --- Persistence ---
+    def load_from_json(self):
+        if settings.OPENING_POOL_SIZE <= 0 or not _pool_file_path.exists():
+            return
+        try:
+            with open(_pool_file_path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            self.entries = {k: [tuple(e) for e in v] for k, v in raw.get("entries", {}).items()}
+            self.wanted = {k: tuple(w) for k, w in raw.get("wanted", {}).items()}
+            self._expire(time.time())
+            logger.info(f"Loaded {self.stats()['size']} pre-generated openings from {_pool_file_path}")
+        except (json.JSONDecodeError, IOError, TypeError, ValueError) as e:
+            logger.error(f"Could not load opening pool from {_pool_file_path}: {e}")
+
+    def save_to_json(self):
+        if settings.OPENING_POOL_SIZE <= 0:
+            return
+        try:
+            with open(_pool_file_path, "w", encoding="utf-8") as f:
+                json.dump({"entries": self.entries, "wanted": self.wanted}, f, ensure_ascii=False)
+        except IOError as e:
+            logger.error(f"Could not save opening pool to {_pool_file_path}: {e}")
+
+
+# Create a single instance of the pool
+opening_pool = OpeningPool()
@@ -0,0 +1,292 @@
+import itertools
+import json
+import logging
+import time
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import Any, Callable
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# --- Schema ---
+with open(Path(__file__).parent / "state.schema.json", "r", encoding="utf-8") as f:
+    STATE_SCHEMA: dict = json.load(f)
+
+_JSON_TYPES: dict[str, tuple[type, ...]] = {
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "object": (dict,),
+    "array": (list,),
+    "null": (type(None),),
+}
+
+
+def _compile(schema: dict) -> Callable[[Any], str | None]:
+    """
+    Compiles the subset of JSON schema used by state.schema.json (type and
+    nested properties) into a function returning an error message or None.
+    """
+    types = schema.get("type")
+    if isinstance(types, str):
+        types = [types]
+    allowed = tuple(t for name in (types or []) for t in _JSON_TYPES[name])
+    # bool is an int subclass, but not a JSON integer
+    reject_bool = bool(types) and "boolean" not in types
+    properties = {k: _compile(v) for k, v in schema.get("properties", {}).items()}
+
+    def validate(value: Any) -> str | None:
+        if allowed and (not isinstance(value, allowed) or (reject_bool and isinstance(value, bool))):
+            return f"expected {'/'.join(types)}, got {type(value).__name__}"
+        if properties and isinstance(value, dict):
+            for key, check in properties.items():
+                if key in value and (error := check(value[key])):
+                    return f"{key}: {error}"
+        return None
+
+    return validate
+
+
+# Compiled once; state updates only pay for the checks themselves
+FIELD_VALIDATORS: dict[str, Callable[[Any], str | None]] = {
+    name: _compile(prop) for name, prop in STATE_SCHEMA["properties"].items()
+}
+LIFE_FIELD_VALIDATORS = {
+    name: _compile(prop)
+    for name, prop in STATE_SCHEMA["properties"]["current_life"].get("properties", {}).items()
+}
+
+
+# --- Session Model ---
+# Unique across sessions (and, seeded from the clock, across restarts in practice),
+# so clients can compare versions without knowing which session they belong to
+_VERSIONS = itertools.count(int(time.time() * 1000))
+
+
+def new_history_epoch() -> int:
+    """A history_epoch no other history of any session has had."""
+    return next(_VERSIONS)
+
+
+class Session(MutableMapping):
+    """
+    A player's daily session. The fixed fields of state.schema.json live in
+    slots; anything else (e.g. inheritance) goes to a small overflow dict.
+    Behaves like the plain dict sessions used to be, so callers keep using
+    session["key"] / .get() / .pop(); to_dict() gives the persisted form.
+    """
+
+    __slots__ = (
+        "player_id",
+        "session_date",
+        "opportunities_remaining",
+        "daily_success_achieved",
+        "is_in_trial",
+        "is_processing",
+        "pending_punishment",
+        "unchecked_rounds_count",
+        "input_rounds",
+        "current_life",
+        "internal_history",
+        "display_history",
+        "roll_event",
+        "redemption_code",
+        "trial_start",
+        "history_epoch",
+        "last_modified",
+        "_extra",
+        "_encoders",
+        "_version",
+        "_views",
+    )
+
+    player_id: str
+    session_date: str
+    opportunities_remaining: int
+    daily_success_achieved: bool
+    is_in_trial: bool
+    is_processing: bool
+    pending_punishment: dict | None
+    unchecked_rounds_count: int
+    input_rounds: int
+    current_life: dict | None
+    internal_history: list[dict]
+    display_history: list[str]
+    roll_event: dict | None
+    redemption_code: str | None
+    trial_start: dict | None
+    history_epoch: int
+    last_modified: float
+    _extra: dict
+    _encoders: dict  # history_encoder caches, never persisted
+    _version: int  # bumped by touch() on every save
+    _views: dict  # client_view caches, keyed by projection name
+
+    def __init__(self, data: dict | None = None):
+        self._extra = {}
+        self._encoders = {}
+        self._views = {}
+        self.touch()
+        for key, value in (data or {}).items():
+            self[key] = value
+
+    @classmethod
+    def from_dict(cls, data: "dict | Session") -> "Session":
+        return data if isinstance(data, cls) else cls(data)
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def touch(self):
+        """Marks a new version of the session (cached projections go stale)."""
+        self._version = next(_VERSIONS)
+
+    def to_dict(self) -> dict:
+        """The persisted form: a shallow plain dict."""
+        return {key: self[key] for key in self}
+
+    def copy(self) -> "Session":
+        """A shallow copy, like dict.copy(): the histories are shared, not duplicated."""
+        return Session(self.to_dict())
+
+    def __getitem__(self, key: str) -> Any:
+        if key in _SLOTS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        return self._extra[key]
+
+    def __setitem__(self, key: str, value: Any):
+        if key in _SLOTS:
+            setattr(self, key, value)
+        else:
+            self._extra[key] = value
+
+    def __delitem__(self, key: str):
+        if key in _SLOTS:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        else:
+            del self._extra[key]
+
+    def __iter__(self):
+        for key in _FIELDS:
+            if hasattr(self, key):
+                yield key
+        yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __contains__(self, key: object) -> bool:
+        if key in _SLOTS:
+            return hasattr(self, key)
+        return key in self._extra
+
+    def __repr__(self) -> str:
+        return f"Session({self.to_dict()!r})"
+
+
+_FIELDS = tuple(name for name in Session.__slots__ if not name.startswith("_"))  # iteration order
+_SLOTS = frozenset(_FIELDS)
+
+
+def to_jsonable(obj: Any) -> Any:
+    """`default=` hook so json.dumps can serialize sessions."""
+    if isinstance(obj, Session):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+# --- State Update Validation ---
+# Top-level fields the game master may change; everything else is system-owned
+MODEL_WRITABLE_FIELDS = {"current_life", "is_in_trial", "opportunities_remaining"}
+# Read by game_logic straight from the update, never stored in the session
+TRANSIENT_UPDATE_KEYS = {"trigger_program"}
+_MAX_PATH_DEPTH = 6
+
+
+def _json_size(value: Any) -> int:
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return len(str(value))
+    return len(json.dumps(value, ensure_ascii=False))
+
+
+def _resolve(session: MutableMapping, parts: list[str]) -> Any:
+    node: Any = session
+    for part in parts:
+        if not isinstance(node, MutableMapping) or part not in node:
+            return None
+        node = node[part]
+    return node
+
+
+def _check_entry(session: MutableMapping, key: str, value: Any) -> str | None:
+    parts = key.split(".")
+    field = parts[0]
+    if field not in MODEL_WRITABLE_FIELDS:
+        return "not writable by the game master"
+    if len(parts) > _MAX_PATH_DEPTH:
+        return "path too deep"
+    if _json_size(value) > settings.STATE_UPDATE_MAX_VALUE_CHARS:
+        return "value too large"
+    if len(parts) == 1:
+        if field == "current_life" and isinstance(value, dict) and len(value) > settings.STATE_MAX_LIFE_KEYS:
+            return "too many fields in current_life"
+        if field == "opportunities_remaining" and isinstance(value, int):
+            # Only ever spent by the game master, never granted
+            if value > session.get("opportunities_remaining", value) or value < 0:
+                return "opportunities can only decrease"
+        return FIELD_VALIDATORS[field](value)
+
+    # Nested write, only into current_life
+    if field != "current_life" or not isinstance(session.get("current_life"), dict):
+        return "no object to write into"
+    life_key = parts[1].rstrip("+")
+    if len(parts) == 2 and life_key in LIFE_FIELD_VALIDATORS and not parts[1].endswith("+"):
+        if error := LIFE_FIELD_VALIDATORS[life_key](value):
+            return error
+    if len(parts) == 2 and life_key not in session["current_life"]:
+        if len(session["current_life"]) >= settings.STATE_MAX_LIFE_KEYS:
+            return "too many fields in current_life"
+    if parts[-1].endswith("+"):
+        target = _resolve(session, parts[:-1] + [parts[-1][:-1]])
+        added = len(value) if isinstance(value, list) else 1
+        if isinstance(target, list) and len(target) + added > settings.STATE_MAX_LIST_ITEMS:
+            return "list too long"
+    return None
+
+
+def filter_state_update(session: MutableMapping, update: dict) -> dict:
+    """
+    Checks a state_update from the model against the schema and size limits.
+    Returns the entries that may be applied; rejected ones are logged and dropped.
+    """
+    accepted = {}
+    not_writable = []
+    for key, value in update.items():
+        if key in TRANSIENT_UPDATE_KEYS:
+            continue
+        if key.split(".")[0] not in MODEL_WRITABLE_FIELDS:
+            not_writable.append(key)
+            continue
+        error = _check_entry(session, key, value)
+        if error:
+            logger.warning(
+                f"Rejected state update '{key}' for {session.get('player_id')}: {error}"
+            )
+            continue
+        accepted[key] = value
+    if not_writable:
+        logger.warning(
+            f"Dropped state update keys outside MODEL_WRITABLE_FIELDS for "
+            f"{session.get('player_id')}: {', '.join(not_writable)}"
+        )
+    return accepted
@@ -5,10 +5,13 @@ import time
 from pathlib import Path
 from .websocket_manager import manager as websocket_manager
 from .live_system import live_manager
+from .action_tasks import action_tasks
+from .session_model import Session
+from .history_encoder import dumps, encode_session
 from . import security
 
 # --- Module-level State ---
-SESSIONS: dict[str, dict] = {}
+SESSIONS: dict[str, Session] = {}
 _sessions_modified: bool = False
 _data_file_path: Path = Path("game_data.json")
 _auto_save_interval: int = 300  # 5 minutes
@@ -23,7 +26,7 @@ def load_from_json():
     if _data_file_path.exists():
         try:
             with open(_data_file_path, "r", encoding="utf-8") as f:
-                SESSIONS = json.load(f)
+                SESSIONS = {pid: Session.from_dict(data) for pid, data in json.load(f).items()}
             logger.info(f"Successfully loaded data from {_data_file_path}")
         except (json.JSONDecodeError, IOError) as e:
             logger.error(f"Could not load data from {_data_file_path}: {e}")
@@ -36,8 +39,14 @@ def save_to_json():
     """Save the current sessions to the JSON file."""
     global _sessions_modified
     try:
+        # One session per line; histories are spliced in from each session's
+        # encoder cache, so a save only serializes what changed since the last one
         with open(_data_file_path, "w", encoding="utf-8") as f:
-            json.dump(SESSIONS, f, ensure_ascii=False, indent=4)
+            f.write("{")
+            for i, (player_id, session) in enumerate(SESSIONS.items()):
+                f.write(",\n" if i else "\n")
+                f.write(f"{dumps(player_id)}: {encode_session(session)}")
+            f.write("\n}\n")
         _sessions_modified = False
         logger.info(f"Successfully saved data to {_data_file_path}")
     except IOError as e:
@@ -56,7 +65,7 @@ def start_auto_save_task():
     logger.info(f"Starting auto-save task. Interval: {_auto_save_interval} seconds.")
     asyncio.create_task(_auto_save_task())
 
-async def save_session(player_id: str, session_data: dict):
+async def save_session(player_id: str, session_data: Session):
     """
     Saves the entire session data for a player and pushes it to their WebSocket.
     """
@@ -71,7 +80,9 @@ async def save_session(player_id: str, session_data: dict):
     #     except (TypeError, ValueError) as e:
     #         logger.warning(f"Could not compare sessions for player {player_id}: {e}")
     
+    session_data = Session.from_dict(session_data)
     session_data["last_modified"] = time.time()
+    session_data.touch()
     SESSIONS[player_id] = session_data
     _sessions_modified = True
     
@@ -99,7 +110,24 @@ async def get_last_n_inputs(player_id: str, n: int) -> list[str]:
     
     return player_inputs[-n:]
 
-async def get_session(player_id: str) -> dict | None:
+async def get_last_n_rounds(player_id: str, n: int) -> list[tuple[str | None, str]]:
+    """
+    Like get_last_n_inputs, but each input comes with a stable round id
+    ("<session_date>#<round>"), or None for inputs saved before rounds were numbered.
+    """
+    session = SESSIONS.get(player_id, {})
+    internal_history = session.get("internal_history", [])
+    session_date = session.get("session_date")
+
+    rounds = [
+        (f"{session_date}#{item['round']}" if "round" in item else None, item["content"])
+        for item in internal_history
+        if isinstance(item, dict) and item.get("role") == "user"
+    ]
+
+    return rounds[-n:]
+
+async def get_session(player_id: str) -> Session | None:
     """Gets the entire session object, which might contain metadata."""
     return SESSIONS.get(player_id)
 
@@ -133,19 +161,20 @@ def get_most_recent_sessions(limit: int = 10) -> list[dict]:
         })
     return results
 
-async def create_or_get_session(player_id: str) -> dict:
+async def create_or_get_session(player_id: str) -> Session:
     """Creates a session if it doesn't exist, and returns it."""
     global _sessions_modified
     if player_id not in SESSIONS:
-        SESSIONS[player_id] = {}  # A session is now a dictionary
+        SESSIONS[player_id] = Session()
         _sessions_modified = True
     return SESSIONS[player_id]
 
 async def clear_session(player_id: str):
     """Clears all data for a given player's session."""
     global _sessions_modified
+    action_tasks.cancel(player_id, "session cleared")
     if player_id in SESSIONS:
-        SESSIONS[player_id] = {} # Reset to an empty dictionary
+        SESSIONS[player_id] = Session()  # Reset to an empty session
         _sessions_modified = True
         logger.info(f"Session for player {player_id} has been cleared.")
 
@@ -162,8 +191,11 @@ async def flag_player_for_punishment(player_id: str, level: str, reason: str):
         "level": level,
         "reason": reason
     }
+    session.touch()
     _sessions_modified = True
     logger.info(f"Player {player_id} flagged for {level} punishment. Reason: {reason}")
+    # The trial is void; don't spend more tokens on a turn in progress
+    action_tasks.cancel(player_id, f"punished: {level}")
     # Immediately notify the client about the punishment flag
     await websocket_manager.send_json_to_player(
         player_id, {"type": "full_state", "data": session}
@@ -0,0 +1,155 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import time
+import zlib
+from collections.abc import MutableMapping
+from pathlib import Path
+
+from .config import settings
+from .session_model import new_history_epoch
+
+logger = logging.getLogger(__name__)
+
+_SUMMARY_EXCERPT_CHARS = 120
+
+
+def _gzip_members(raw: bytes):
+    """Decompressed gzip members one by one; stops at a truncated tail (e.g. a crash mid-append)."""
+    while raw:
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            data = decompressor.decompress(raw)
+        except zlib.error:
+            return
+        if not decompressor.eof:
+            return
+        yield data
+        raw = decompressor.unused_data
+
+
+def _excerpt(display: list) -> str:
+    """The trial's ending: its last narrative entry, shortened to one line."""
+    for entry in reversed(display):
+        if isinstance(entry, str) and not entry.startswith("> "):
+            text = " ".join(entry.split())
+            if len(text) > _SUMMARY_EXCERPT_CHARS:
+                text = text[:_SUMMARY_EXCERPT_CHARS] + "……"
+            return text
+    return ""
+
+
+class TrialArchive:
+    """
+    Cold storage for finished trials.
+
+    Each player has one file of gzip members, one JSON record per archived
+    trial, appended as soon as a trial ends. The hot session keeps a one-line
+    summary in place of the trial, so its size only depends on the trial in
+    progress; the full narrative can be read back on demand. Replacing the
+    trial's entries shifts display_history indices, so the session gets a new
+    history_epoch, which history paging checks.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+
+    def _path(self, player_id: str) -> Path:
+        digest = hashlib.sha1(player_id.encode("utf-8")).hexdigest()[:20]
+        return self.directory / f"{digest}.jsonl.gz"
+
+    def _append(self, player_id: str, record: dict):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with open(self._path(player_id), "ab") as f:
+            f.write(gzip.compress(line.encode("utf-8")))
+
+    def _read(self, player_id: str) -> list[dict]:
+        path = self._path(player_id)
+        if not path.exists():
+            return []
+        records = []
+        for member in _gzip_members(path.read_bytes()):
+            for line in member.decode("utf-8").splitlines():
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping corrupt archive record in {path}")
+        return records
+
+    async def list_trials(self, player_id: str) -> list[dict]:
+        """Archived trials of a player, oldest first, without their histories."""
+        records = await asyncio.to_thread(self._read, player_id)
+        return [
+            {k: v for k, v in r.items() if k not in ("internal_history", "display_history")}
+            for r in records
+        ]
+
+    async def get_trial(self, player_id: str, trial_id: str) -> dict | None:
+        records = await asyncio.to_thread(self._read, player_id)
+        return next((r for r in records if r.get("id") == trial_id), None)
+
+    async def archive_trial(self, session: MutableMapping, finished_only: bool = True) -> bool:
+        """
+        Moves the trial marked by session["trial_start"] to the archive and
+        leaves a summary in its place. By default only a finished trial
+        (is_in_trial back to false) is archived; pass finished_only=False
+        when the whole session is about to be replaced.
+        """
+        marker = session.get("trial_start")
+        if not settings.TRIAL_ARCHIVE_ENABLED or not isinstance(marker, dict):
+            return False
+        if finished_only and session.get("is_in_trial"):
+            return False
+
+        player_id = session.get("player_id")
+        internal = session.get("internal_history") or []
+        display = session.get("display_history") or []
+        # A light punishment resets internal_history, so the marker may be past its end
+        internal_start = min(marker.get("internal_history", len(internal)), len(internal))
+        display_start = min(marker.get("display_history", len(display)), len(display))
+        internal_end, display_end = len(internal), len(display)
+        trial_display = display[display_start:display_end]
+
+        life = marker.get("life")
+        rounds = sum(1 for e in trial_display if isinstance(e, str) and e.startswith("> "))
+        ending = _excerpt(trial_display)
+        record = {
+            "id": f"{session.get('session_date')}-{int(marker.get('started_at', time.time()) * 1000)}",
+            "session_date": session.get("session_date"),
+            "life": life,
+            "rounds": rounds,
+            "started_at": marker.get("started_at"),
+            "archived_at": time.time(),
+            "summary": ending,
+            "display_history": trial_display,
+            "internal_history": internal[internal_start:internal_end],
+        }
+        try:
+            await asyncio.to_thread(self._append, player_id, record)
+        except OSError as e:
+            # Keep the trial in the hot session rather than lose it
+            logger.error(f"Could not archive trial for {player_id}: {e}")
+            return False
+
+        # Entries appended while the record was written stay after the summary
+        session["display_history"] = (
+            display[:display_start]
+            + [f"【前尘往事】第{life}世已了结（{rounds}轮），详细经历已封存。结局：{ending}"]
+            + display[display_end:]
+        )
+        session["internal_history"] = (
+            internal[:internal_start]
+            + [{"role": "system", "content": f"前世摘要：第{life}世，历经{rounds}轮，结局：{ending}"}]
+            + internal[internal_end:]
+        )
+        session["history_epoch"] = new_history_epoch()
+        session["trial_start"] = None
+        logger.info(f"Archived trial {record['id']} of {player_id} ({rounds} rounds).")
+        return True
+
+
+# Create a single instance of the archive
+trial_archive = TrialArchive(settings.TRIAL_ARCHIVE_DIR)
@@ -0,0 +1,32 @@
+import json
+
+# The prompt only shows the end of the display history
+DISPLAY_TAIL_CHARS = 1000
+# Bookkeeping the model has no use for
+_HIDDEN_FROM_MODEL = ("internal_history", "trial_start")
+
+
+def display_tail(display_history: list[str], limit: int = DISPLAY_TAIL_CHARS) -> str:
+    """
+    Same result as "\n".join(display_history)[-limit:], but only reads the
+    entries that end up in the tail, so the cost doesn't grow with the day.
+    """
+    parts: list[str] = []
+    size = 0
+    for entry in reversed(display_history):
+        parts.append(entry)
+        size += len(entry) + 1
+        if size > limit:
+            break
+    return "\n".join(reversed(parts))[-limit:]
+
+
+def state_view_json(session: dict) -> str:
+    """
+    The game state as shown to the model: the session without its internal
+    history, with the display history cut to its tail. Built from a shallow
+    view of the session; nothing is deep-copied and the session is not changed.
+    """
+    view = {k: v for k, v in session.items() if k not in _HIDDEN_FROM_MODEL}
+    view["display_history"] = display_tail(session.get("display_history", []))
+    return json.dumps(view, ensure_ascii=False)
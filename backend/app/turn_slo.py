@@ -0,0 +1,261 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import deque
+
+from . import ai_provider
+from .ai_turn import AITurn
+from .deadline import Deadline
+from .history_encoder import dumps
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+HOLDING_NARRATIVE = (
+    "【天机迟滞】\n天地灵气一时紊乱，你的意念在虚空中回荡，尚未得到回应。"
+    "此刻一切如常，你可以再次施为。"
+)
+_RECENT_HITS = 50
+
+
+def state_key(session: dict, action: str) -> str:
+    """
+    What a turn's answer depends on: the action and the state it was asked
+    about. Taken before the action is added to the history.
+    """
+    history = session.get("internal_history") or []
+    data = [
+        action,
+        len(history),
+        history[-1] if history else None,
+        session.get("opportunities_remaining"),
+        session.get("is_in_trial"),
+        session.get("current_life"),
+    ]
+    return hashlib.sha1(dumps(data).encode("utf-8")).hexdigest()
+
+
+def _short_history(history: list[dict]) -> list[dict]:
+    """The system prompt plus the last few messages, for the fast model."""
+    keep = settings.TURN_SLO_FAST_HISTORY_MESSAGES
+    head = history[:1] if history and history[0].get("role") == "system" else []
+    return head + history[max(len(head), len(history) - keep):]
+
+
+class TurnSLO:
+    """
+    Bounds how long a player waits for a turn.
+
+    The primary call gets TURN_SLO_SOFT_SECONDS. After that, the fast model
+    (if configured) races it with a shorter context, and whichever valid
+    answer comes first is used. If neither has answered by
+    TURN_SLO_HARD_SECONDS the turn is a holding narrative that changes
+    nothing. The primary call is then left to finish: its answer is kept for
+    the player's next action if that is the same action on the same state,
+    and thrown away otherwise. A fast-model answer changes the state, so the
+    primary call is cancelled in that case. Every turn that misses the soft
+    deadline is counted with its reason and outcome.
+    """
+
+    def __init__(self):
+        self.turns = 0
+        self.hits: dict[str, int] = {}
+        self.outcomes: dict[str, int] = {}
+        self.cache_hits = 0
+        self.recent: deque[dict] = deque(maxlen=_RECENT_HITS)
+        # Key: player_id, Value: (state key, primary call still running after a holding turn)
+        self._stragglers: dict[str, tuple[str, asyncio.Future]] = {}
+        # Key: player_id, Value: (state key, stored at, late primary answer)
+        self._late: dict[str, tuple[str, float, AITurn]] = {}
+
+    @staticmethod
+    def enabled() -> bool:
+        return settings.TURN_SLO_SOFT_SECONDS > 0
+
+    def turn_deadline(self, deadline: Deadline) -> Deadline:
+        """
+        The turn's hard budget, taken once when the turn starts: everything the
+        player waits for (first answer, roll follow-up) must fit in it.
+        """
+        if not self.enabled():
+            return deadline
+        return Deadline(min(self._hard_seconds(), deadline.remaining()))
+
+    @staticmethod
+    def _hard_seconds() -> float:
+        return max(settings.TURN_SLO_HARD_SECONDS, settings.TURN_SLO_SOFT_SECONDS)
+
+    def record(self, player_id: str, reason: str, outcome: str, elapsed: float, detail: str = ""):
+        self.hits[reason] = self.hits.get(reason, 0) + 1
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+        self.recent.append(
+            {
+                "at": time.time(),
+                "reason": reason,
+                "outcome": outcome,
+                "elapsed": round(elapsed, 2),
+                "detail": detail,
+            }
+        )
+        logger.warning(
+            f"Turn SLO missed for {player_id}: {reason} -> {outcome} after {elapsed:.1f}s"
+            + (f" ({detail})" if detail else "")
+        )
+
+    # --- Late Answers ---
+    def _take_late(self, player_id: str, key: str) -> AITurn | None:
+        entry = self._late.pop(player_id, None)
+        if entry is None:
+            return None
+        entry_key, stored_at, turn = entry
+        if entry_key != key or time.monotonic() - stored_at > settings.TURN_SLO_CACHE_SECONDS:
+            return None
+        return turn
+
+    def _adopt_straggler(self, player_id: str, key: str) -> asyncio.Future | None:
+        """The primary call left running for the same action and state, if any; others are cancelled."""
+        entry = self._stragglers.pop(player_id, None)
+        if entry is None:
+            return None
+        entry_key, task = entry
+        if entry_key == key and not task.done():
+            return task
+        task.cancel()
+        return None
+
+    def _keep_late(self, player_id: str, key: str, task: asyncio.Future):
+        self._stragglers[player_id] = (key, task)
+
+        def _done(t: asyncio.Future):
+            if self._stragglers.get(player_id, (None, None))[1] is t:
+                del self._stragglers[player_id]
+            else:
+                return  # adopted by a later turn, or replaced
+            if t.cancelled() or t.exception() is not None:
+                return
+            now = time.monotonic()
+            for pid, (_, stored_at, _) in list(self._late.items()):
+                if now - stored_at > settings.TURN_SLO_CACHE_SECONDS:
+                    del self._late[pid]
+            self._late[player_id] = (key, now, t.result())
+            logger.info(f"Kept late answer for {player_id} until the state changes.")
+
+        task.add_done_callback(_done)
+
+    def forget(self, player_id: str):
+        """Drops a player's running or finished late answer (e.g. the session was reset)."""
+        entry = self._stragglers.pop(player_id, None)
+        if entry is not None:
+            entry[1].cancel()
+        self._late.pop(player_id, None)
+
+    # --- Guarded Call ---
+    async def call(
+        self,
+        player_id: str,
+        key: str,
+        prompt: str,
+        history: list[dict],
+        deadline: Deadline,
+        hard_deadline: Deadline | None = None,
+    ) -> tuple[AITurn, str | None]:
+        """
+        The turn's model call under the SLO. Returns the turn and how it was
+        produced when that was not the primary call answering in time:
+        "cached", "primary_late", "fast_model" or "holding". `hard_deadline`
+        is the turn's budget from turn_deadline() (one starting now if not given);
+        `deadline` bounds the primary call, which may outlive it.
+        """
+        if not self.enabled():
+            turn = await ai_provider.get_ai_response(
+                prompt=prompt, history=history, structured=True, deadline=deadline, player_id=player_id
+            )
+            return turn, None
+
+        self.turns += 1
+        cached = self._take_late(player_id, key)
+        if cached is not None:
+            self.cache_hits += 1
+            logger.info(f"Using the late answer kept for {player_id}.")
+            return cached, "cached"
+
+        started = time.monotonic()
+        hard_deadline = hard_deadline or self.turn_deadline(deadline)
+        soft = min(settings.TURN_SLO_SOFT_SECONDS, hard_deadline.remaining())
+        # A copy: the turn may edit its history while this call runs on
+        primary = self._adopt_straggler(player_id, key) or asyncio.ensure_future(
+            ai_provider.get_ai_response(
+                prompt=prompt, history=list(history), structured=True, deadline=deadline, player_id=player_id
+            )
+        )
+        fast = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=soft)
+            if done:
+                return primary.result(), None
+
+            if settings.TURN_SLO_FAST_MODEL:
+                fast = asyncio.ensure_future(
+                    ai_provider.get_ai_response(
+                        prompt=prompt,
+                        history=_short_history(history),
+                        model=settings.TURN_SLO_FAST_MODEL,
+                        structured=True,
+                        deadline=Deadline(hard_deadline.remaining()),
+                        player_id=player_id,
+                    )
+                )
+            pending = {primary} | ({fast} if fast else set())
+            errors = []
+            while pending:
+                remaining = hard_deadline.remaining()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(
+                    pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+                )
+                # The primary answer wins a tie
+                for task in sorted(done, key=lambda t: t is not primary):
+                    if task.exception() is not None:
+                        errors.append(f"{'primary' if task is primary else 'fast'}: {task.exception()}")
+                        continue
+                    outcome = "primary_late" if task is primary else "fast_model"
+                    self.record(player_id, "soft_deadline", outcome, time.monotonic() - started, "; ".join(errors))
+                    return task.result(), outcome
+                if not done:
+                    break
+
+            if pending:
+                # Out of time: hold, and let the primary call finish for a resend
+                if not primary.done():
+                    self._keep_late(player_id, key, primary)
+                self.record(player_id, "hard_deadline", "holding", time.monotonic() - started, "; ".join(errors))
+                return AITurn(narrative=HOLDING_NARRATIVE), "holding"
+
+            # Every attempt failed before the hard deadline: handled like any failed turn
+            self.record(player_id, "soft_deadline", "error", time.monotonic() - started, "; ".join(errors))
+            raise primary.exception()
+        finally:
+            if fast is not None:
+                fast.cancel()
+            # Also on cancel, and when the fast answer won (the state moves on)
+            if self._stragglers.get(player_id, (None, None))[1] is not primary:
+                primary.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled(),
+            "turns": self.turns,
+            "missed": sum(self.hits.values()),
+            "reasons": dict(self.hits),
+            "outcomes": dict(self.outcomes),
+            "cache_hits": self.cache_hits,
+            "late_running": len(self._stragglers),
+            "late_kept": len(self._late),
+            "recent": list(self.recent)[-10:],
+        }
+
+
+# Create a single instance of the guard
+turn_slo = TurnSLO()
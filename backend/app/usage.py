@@ -0,0 +1,216 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from datetime import date
+from pathlib import Path
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# --- Call Types ---
+CALL_TURN = "turn"
+CALL_ROLL_FOLLOWUP = "roll_followup"
+CALL_CHEAT_CHECK = "cheat_check"
+CALL_OPENING = "opening"  # background pre-generation for the opening pool
+
+_usage_file_path: Path = Path("usage_data.json")
+_auto_save_interval: int = 300  # 5 minutes
+_DAYS_KEPT = 14
+
+
+def _empty_counter() -> dict:
+    return {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "cost": 0.0}
+
+
+def _parse_prices(spec: str | None) -> dict[str, tuple[float, float, float]]:
+    """
+    MODEL_PRICES format: "model:input/output[/cached],model2:..." in cost units per
+    1M tokens. Cached prompt tokens default to half the input price.
+    """
+    prices = {}
+    for item in (spec or "").split(","):
+        if ":" not in item:
+            continue
+        name, _, values = item.strip().rpartition(":")
+        try:
+            parts = [float(v) for v in values.split("/")]
+        except ValueError:
+            logger.warning(f"Ignoring malformed MODEL_PRICES entry: {item}")
+            continue
+        if len(parts) == 1:
+            parts.append(parts[0])
+        if len(parts) == 2:
+            parts.append(parts[0] / 2)
+        prices[name.strip()] = (parts[0], parts[1], parts[2])
+    return prices
+
+
+class UsageTracker:
+    """
+    Token usage per call, aggregated per day by player, model and call type.
+    Feeds the routing policy in choose_model().
+    """
+
+    def __init__(self):
+        # Key: ISO date, Value: {"players"|"models"|"call_types": {name: counter}}
+        self.days: dict[str, dict[str, dict[str, dict]]] = {}
+        self.prices = _parse_prices(settings.MODEL_PRICES)
+        self._modified = False
+
+    def _day(self, day: str | None = None) -> dict:
+        day = day or date.today().isoformat()
+        if day not in self.days:
+            self.days[day] = {
+                "players": defaultdict(_empty_counter),
+                "models": defaultdict(_empty_counter),
+                "call_types": defaultdict(_empty_counter),
+            }
+            for old in sorted(self.days)[:-_DAYS_KEPT]:
+                del self.days[old]
+        return self.days[day]
+
+    def cost_of(self, model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int) -> float:
+        price_in, price_out, price_cached = self.prices.get(model, (0.0, 0.0, 0.0))
+        uncached = max(0, prompt_tokens - cached_tokens)
+        return (uncached * price_in + cached_tokens * price_cached + completion_tokens * price_out) / 1_000_000
+
+    def record(
+        self,
+        player_id: str | None,
+        call_type: str,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cached_tokens: int = 0,
+    ):
+        cost = self.cost_of(model, prompt_tokens, completion_tokens, cached_tokens)
+        day = self._day()
+        for group, key in (
+            ("players", player_id or "-"),
+            ("models", model),
+            ("call_types", call_type),
+        ):
+            c = day[group][key]
+            c["calls"] += 1
+            c["prompt_tokens"] += prompt_tokens
+            c["completion_tokens"] += completion_tokens
+            c["cached_tokens"] += cached_tokens
+            c["cost"] += cost
+        self._modified = True
+        logger.debug(
+            f"Usage: player={player_id} type={call_type} model={model} "
+            f"prompt={prompt_tokens} completion={completion_tokens} cached={cached_tokens} cost={cost:.6f}"
+        )
+
+    def record_openai(self, player_id: str | None, call_type: str, model: str, usage) -> None:
+        """Records an OpenAI-style `response.usage` object (may be None)."""
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+        self.record(
+            player_id,
+            call_type,
+            model,
+            getattr(usage, "prompt_tokens", 0) or 0,
+            getattr(usage, "completion_tokens", 0) or 0,
+            cached,
+        )
+
+    def player_cost_today(self, player_id: str) -> float:
+        return self._day()["players"].get(player_id, _empty_counter())["cost"]
+
+    def player_usage_today(self, player_id: str) -> dict:
+        return dict(self._day()["players"].get(player_id, _empty_counter()))
+
+    def summary(self, day: str | None = None) -> dict:
+        """Per-model and per-call-type totals, plus the top players by cost."""
+        if day and day not in self.days:
+            return {"date": day}
+        d = self._day(day)
+        top_players = sorted(d["players"].items(), key=lambda kv: kv[1]["cost"], reverse=True)[:10]
+        players = d["players"].values()
+        return {
+            "date": day or date.today().isoformat(),
+            "models": dict(d["models"]),
+            "call_types": dict(d["call_types"]),
+            "players": len(d["players"]),
+            "cost_per_player": (sum(p["cost"] for p in players) / len(players)) if players else 0.0,
+            "top_players": dict(top_players),
+        }
+
+    # --- Persistence ---
+    def load_from_json(self):
+        if not _usage_file_path.exists():
+            return
+        try:
+            with open(_usage_file_path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            for day, groups in raw.items():
+                self.days[day] = {
+                    group: defaultdict(_empty_counter, counters)
+                    for group, counters in groups.items()
+                }
+            logger.info(f"Successfully loaded usage data from {_usage_file_path}")
+        except (json.JSONDecodeError, IOError) as e:
+            logger.error(f"Could not load usage data from {_usage_file_path}: {e}")
+
+    def save_to_json(self):
+        try:
+            with open(_usage_file_path, "w", encoding="utf-8") as f:
+                json.dump(self.days, f, ensure_ascii=False)
+            self._modified = False
+        except IOError as e:
+            logger.error(f"Could not save usage data to {_usage_file_path}: {e}")
+
+    async def _auto_save_task(self):
+        while True:
+            await asyncio.sleep(_auto_save_interval)
+            if self._modified:
+                self.save_to_json()
+
+    def start_auto_save_task(self):
+        asyncio.create_task(self._auto_save_task())
+
+
+# Create a single instance of the tracker
+usage_tracker = UsageTracker()
+
+
+# --- Routing Policy ---
+def _cheapest(models: list[str]) -> str:
+    priced = [m for m in models if m in usage_tracker.prices]
+    if not priced:
+        # Without prices, the last configured model is treated as the fallback tier
+        return models[-1]
+    return min(priced, key=lambda m: sum(usage_tracker.prices[m][:2]))
+
+
+def choose_model(player_id: str | None, call_type: str, model: str, prompt_chars: int) -> str:
+    """
+    Cost-aware routing over a comma-separated model list. Very long contexts and
+    players over their daily budget go to the cheapest configured model;
+    everything else keeps the configured list unchanged.
+    """
+    options = [m.strip() for m in model.split(",") if m.strip()]
+    if len(options) < 2:
+        return model
+
+    reason = None
+    estimated_tokens = prompt_chars // 2
+    if settings.ROUTING_LONG_CONTEXT_TOKENS and estimated_tokens > settings.ROUTING_LONG_CONTEXT_TOKENS:
+        reason = f"long context (~{estimated_tokens} tokens)"
+    elif (
+        player_id
+        and settings.ROUTING_PLAYER_DAILY_BUDGET
+        and usage_tracker.player_cost_today(player_id) >= settings.ROUTING_PLAYER_DAILY_BUDGET
+    ):
+        reason = "player over daily budget"
+    if not reason:
+        return model
+
+    cheap = _cheapest(options)
+    logger.info(f"Routing {call_type} for {player_id} to {cheap}: {reason}")
+    return cheap
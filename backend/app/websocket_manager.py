@@ -1,15 +1,37 @@
+import asyncio
 import logging
-import copy
 import gzip
-import json
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import WebSocket, WebSocketDisconnect
+from .config import settings
+from .history_encoder import dumps, splice
+from .client_view import client_view, live_view
 
 logger = logging.getLogger(__name__)
 
+# Level 6 compresses nearly as well as the default 9 at a fraction of the CPU
+_GZIP_LEVEL = 6
+
+
+def _compress(text: str) -> bytes:
+    """Encode to UTF-8 and gzip."""
+    return gzip.compress(text.encode("utf-8"), compresslevel=_GZIP_LEVEL)
+
+
 class ConnectionManager:
     def __init__(self):
         # Maps player_id to their active WebSocket connection
         self.active_connections: dict[str, WebSocket] = {}
+        # Keeps each player's messages in call order while large ones are compressed off the loop
+        self._send_locks: dict[str, asyncio.Lock] = {}
+        self._executor: ThreadPoolExecutor | None = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=settings.WS_ENCODE_WORKERS, thread_name_prefix="ws-encode"
+            )
+        return self._executor
 
     async def connect(self, websocket: WebSocket, player_id: str):
         """Accepts a new WebSocket connection and stores it."""
@@ -19,6 +41,7 @@ class ConnectionManager:
 
     def disconnect(self, player_id: str):
         """Removes a player's WebSocket connection."""
+        self._send_locks.pop(player_id, None)
         if player_id in self.active_connections:
             del self.active_connections[player_id]
             logger.info(f"Player '{player_id}' disconnected from WebSocket.")
@@ -29,57 +52,41 @@ class ConnectionManager:
         if not websocket:
             return
 
-        payload_to_send = data
-        # For live viewers, create a stripped-down and secure payload
+        # Clients get a projection of the session, not the session itself; the
+        # recent history window inside comes from the session's encoder cache
         if data and data.get("type") == "live_update":
-            original_session = data.get("data", {})
-            
-            # Create a safe, minimal payload for live view
-            live_payload = {
-                "type": "live_update",
-                "data": {
-                    "display_history": copy.deepcopy(original_session.get("display_history", [])),
-                    "current_life": copy.deepcopy(original_session.get("current_life"))
-                }
-            }
-
-            # For privacy, remove player's own inputs from the live broadcast
-            if live_payload["data"]["display_history"]:
-                live_payload["data"]["display_history"] = [
-                    msg for msg in live_payload["data"]["display_history"] if not msg.strip().startswith("> ")
-                ]
-
-            # Mask the redemption code if it exists
-            if original_session.get("redemption_code"):
-                full_code = original_session["redemption_code"]
-                masked_code = f"{full_code[:1]}...{full_code[-1:]}"
-                
-                # Also mask the code in the last message of the display history
-                if live_payload["data"]["display_history"]:
-                    try:
-                        last_message = live_payload["data"]["display_history"][-1]
-                        if full_code in last_message:
-                            live_payload["data"]["display_history"][-1] = last_message.replace(full_code, masked_code)
-                    except (IndexError, TypeError):
-                        pass # Ignore if history is empty or not a list
-            
-            payload_to_send = live_payload
-
-        # For the actual player, just remove the internal history
-        elif data and data.get("type") == "full_state":
-            payload_to_send = copy.deepcopy(data)
-            if payload_to_send.get("data"):
-                payload_to_send["data"].pop("internal_history", None)
-        
+            # A safe, minimal payload for live view: the player's own inputs
+            # are hidden and the redemption code is masked
+            text = splice({"type": "live_update"}, {"data": live_view(data.get("data", {}))})
+
+        # For the actual player, only what the UI renders
+        elif data and data.get("type") == "full_state" and data.get("data"):
+            envelope = {k: v for k, v in data.items() if k != "data"}
+            text = splice(envelope, {"data": client_view(data["data"])})
+
+        else:
+            text = dumps(data)
+
+        await self.send_text_to_player(player_id, text)
+
+    async def send_text_to_player(self, player_id: str, text: str):
+        """Sends an already-encoded JSON message to a specific player, compressing it with gzip."""
+        websocket = self.active_connections.get(player_id)
+        if not websocket:
+            return
+
         try:
-            # 1. Serialize dict to JSON string
-            json_str = json.dumps(payload_to_send)
-            # 2. Encode string to bytes
-            json_bytes = json_str.encode('utf-8')
-            # 3. Compress bytes using gzip
-            compressed_data = gzip.compress(json_bytes)
-            # 4. Send compressed bytes
-            await websocket.send_bytes(compressed_data)
+            lock = self._send_locks.setdefault(player_id, asyncio.Lock())
+            async with lock:
+                if len(text) < settings.WS_OFFLOAD_MIN_CHARS:
+                    compressed_data = _compress(text)
+                else:
+                    # Large payloads: gzip on a worker thread (zlib releases the GIL)
+                    loop = asyncio.get_running_loop()
+                    compressed_data = await loop.run_in_executor(
+                        self._get_executor(), _compress, text
+                    )
+                await websocket.send_bytes(compressed_data)
         except (WebSocketDisconnect, RuntimeError) as e:
             logger.warning(f"WebSocket for player '{player_id}' disconnected before message could be sent: {e}")
             self.disconnect(player_id)
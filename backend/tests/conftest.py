@@ -0,0 +1,7 @@
+import os
+import sys
+from pathlib import Path
+
+# The app reads its settings at import time
+os.environ.setdefault("SECRET_KEY", "test-secret")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,51 @@
+import asyncio
+
+from app import game_logic, state_manager
+from app.action_tasks import ActionTaskRegistry, action_tasks
+from test_punishment import PLAYER, _session
+
+
+def test_mailbox_coalesces_and_is_bounded(monkeypatch):
+    monkeypatch.setattr(game_logic.settings, "ACTION_MAILBOX_SIZE", 2)
+    registry = ActionTaskRegistry()
+    registry.current_actions["p"] = "打坐"
+    assert registry.add_pending("p", "打坐") == "coalesced"
+    assert registry.add_pending("p", "前往山门") == "queued"
+    assert registry.add_pending("p", "前往山门") == "coalesced"
+    assert registry.add_pending("p", "拜师") == "queued"
+    assert registry.add_pending("p", "下山") == "full"
+    assert [registry.pop_pending("p"), registry.pop_pending("p"), registry.pop_pending("p")] == ["前往山门", "拜师", None]
+
+
+def test_actions_sent_during_a_turn_run_after_it_in_order(monkeypatch):
+    monkeypatch.setattr(game_logic.settings, "ACTION_MAILBOX_SIZE", 3)
+    monkeypatch.setattr(game_logic.settings, "ACTION_RATE_PER_MINUTE", 0)
+    session = _session()
+    monkeypatch.setitem(state_manager.SESSIONS, PLAYER, session)
+    ran = []
+
+    async def scenario():
+        release_first = asyncio.Event()
+
+        async def fake_turn(user_info, action):
+            ran.append(action)
+            if len(ran) == 1:
+                await release_first.wait()
+            session["is_processing"] = False
+
+        monkeypatch.setattr(game_logic, "_process_player_action_async", fake_turn)
+        user = {"username": PLAYER, "id": 1}
+        for action in ("打坐", "前往山门", "打坐", "拜师"):
+            await game_logic.process_player_action(user, action)
+            await asyncio.sleep(0)
+        assert ran == ["打坐"]
+        assert list(action_tasks.pending[PLAYER]) == ["前往山门", "拜师"]
+
+        release_first.set()
+        # Each queued action runs as a turn of its own
+        while action_tasks.is_running(PLAYER):
+            await action_tasks.tasks[PLAYER]
+
+    asyncio.run(scenario())
+    assert ran == ["打坐", "前往山门", "拜师"]
+    assert action_tasks.pending_count(PLAYER) == 0
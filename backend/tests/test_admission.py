@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from app import admission as admission_module
+from app.admission import AdmissionController
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(admission_module.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(admission_module.settings, "ACTION_RATE_PER_MINUTE", 60.0)
+    monkeypatch.setattr(admission_module.settings, "ACTION_BURST", 2)
+    monkeypatch.setattr(admission_module.settings, "ACTION_BUCKET_IDLE_SECONDS", 100.0)
+    monkeypatch.setattr(admission_module.settings, "ADMISSION_MAX_QUEUE", 0)
+    return now
+
+
+def test_rate_limit_refills(clock):
+    controller = AdmissionController()
+    assert controller.check("a") is None
+    assert controller.check("a") is None
+    assert controller.check("a") is not None
+    clock[0] += 1
+    assert controller.check("a") is None
+    assert controller.rejected_rate == 1
+
+
+def test_idle_buckets_are_evicted_once_refilled(clock):
+    controller = AdmissionController()
+    for player in ("a", "b"):
+        controller.check(player)
+        controller.check(player)
+    assert len(controller.buckets) == 2
+
+    # "b" is full again after 2s and then idle for the TTL; "a" acted meanwhile
+    clock[0] += 50
+    controller.check("a")
+    clock[0] += 53
+    assert controller.check("a") is None
+    assert set(controller.buckets) == {"a"}
+
+    # An evicted player starts with a full bucket, as before
+    assert controller.check("b") is None
+    assert controller.check("b") is None
+    assert controller.check("b") is not None
+
+
+def test_queue_admits_in_arrival_order(monkeypatch):
+    monkeypatch.setattr(admission_module.settings, "MAX_INFLIGHT_TURNS", 1)
+
+    async def scenario():
+        controller = AdmissionController()
+        admitted = []
+
+        async def turn(player):
+            await controller.acquire(player)
+            admitted.append(player)
+
+        await controller.acquire("first")
+        tasks = {p: asyncio.create_task(turn(p)) for p in ("second", "third", "fourth")}
+        await asyncio.sleep(0)
+        assert list(controller.waiting) == ["second", "third", "fourth"]
+
+        # A player leaving the queue does not hold up the ones behind it
+        tasks["third"].cancel()
+        await asyncio.sleep(0)
+        assert list(controller.waiting) == ["second", "fourth"]
+
+        controller.release("first")
+        await asyncio.sleep(0)
+        assert admitted == ["second"]
+        controller.release("second")
+        await asyncio.sleep(0)
+        assert admitted == ["second", "fourth"]
+        assert controller.active == {"fourth"}
+
+    asyncio.run(scenario())
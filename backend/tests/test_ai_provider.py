@@ -0,0 +1,158 @@
+import asyncio
+
+import pytest
+
+from app import ai_provider
+from app.ai_turn import TurnParseError
+from app.deadline import Deadline, DeadlineExceeded
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    """A fresh OpenAI breaker, half-open with one probe slot."""
+    b = ai_provider.CircuitBreaker("openai", 20, 4, 0.5, 30.0, 1)
+    b._trip()
+    b._opened_at -= 60
+    monkeypatch.setitem(ai_provider.breakers, "openai", b)
+    monkeypatch.setattr(ai_provider.settings, "AI_PROVIDER", "openai")
+    monkeypatch.setattr(ai_provider.openai_client, "client", object())
+    monkeypatch.setattr(ai_provider, "choose_model", lambda player_id, call_type, model, chars: model)
+    return b
+
+
+def _respond_with(monkeypatch, response):
+    async def fake(*args, **kwargs):
+        return await response()
+
+    monkeypatch.setattr(ai_provider.openai_client, "get_ai_response", fake)
+
+
+def test_cancelled_probe_returns_its_slot(breaker, monkeypatch):
+    async def hang():
+        await asyncio.sleep(60)
+
+    _respond_with(monkeypatch, hang)
+
+    async def cancel_probe():
+        task = asyncio.create_task(ai_provider.get_ai_response("hi", [], model="m"))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_probe())
+    assert breaker.state == breaker.HALF_OPEN
+    assert breaker.allow_request()
+
+
+def test_invalid_turn_is_not_a_provider_failure(breaker, monkeypatch):
+    async def invalid():
+        raise TurnParseError("no narrative")
+
+    _respond_with(monkeypatch, invalid)
+    with pytest.raises(TurnParseError):
+        asyncio.run(ai_provider.get_ai_response("hi", [], model="m", structured=True))
+    assert breaker.state == breaker.CLOSED
+
+
+def test_own_deadline_is_not_a_provider_failure(breaker, monkeypatch):
+    breaker.allow_request()
+    breaker.record_success()  # closed, counting failures
+    monkeypatch.setattr(ai_provider.settings, "AI_MIN_ATTEMPT_SECONDS", 0.01)
+
+    async def over_budget():
+        raise DeadlineExceeded("budget exhausted")
+
+    _respond_with(monkeypatch, over_budget)
+    for _ in range(breaker.min_calls):
+        with pytest.raises(DeadlineExceeded):
+            asyncio.run(ai_provider.get_ai_response("hi", [], model="m", structured=True, deadline=Deadline(1)))
+    assert breaker.state == breaker.CLOSED
+    assert breaker.failure_rate() == 0
+
+
+def test_gemini_timeout_at_the_callers_deadline_is_not_a_failure(monkeypatch):
+    gemini = ai_provider.CircuitBreaker("gemini", 20, 1, 0.5, 30.0, 1)
+    monkeypatch.setitem(ai_provider.breakers, "gemini", gemini)
+    monkeypatch.setattr(ai_provider, "_gemini_configured", lambda: True)
+    monkeypatch.setattr(ai_provider.settings, "AI_MIN_ATTEMPT_SECONDS", 0.05)
+
+    async def slow(**kwargs):
+        await asyncio.sleep(5)
+
+    monkeypatch.setattr(ai_provider.gemini_client, "get_ai_response", slow)
+    assert asyncio.run(ai_provider._call_gemini("hi", [], False, deadline=Deadline(0.1))) is None
+    assert gemini.state == gemini.CLOSED
+    assert gemini.failure_rate() == 0
+
+
+@pytest.mark.parametrize("blocked, tried", [(True, False), (False, True)])
+def test_gemini_without_key_is_skipped_only_when_blocked(monkeypatch, blocked, tried):
+    monkeypatch.setattr(ai_provider.settings, "GEMINI_API_KEY", None)
+    monkeypatch.setattr(ai_provider.settings, "BLOCK_GEMINI_IN_MAINLAND", blocked)
+    monkeypatch.setitem(ai_provider.breakers, "gemini", ai_provider.CircuitBreaker("gemini", 20, 4, 0.5, 30.0, 1))
+    calls = []
+
+    async def answer(**kwargs):
+        calls.append(kwargs)
+        return "gemini"
+
+    monkeypatch.setattr(ai_provider.gemini_client, "get_ai_response", answer)
+    result = asyncio.run(ai_provider._call_gemini("hi", [], False))
+    assert (result == "gemini") is tried
+    assert bool(calls) is tried
+
+
+def test_breaker_opens_probes_and_closes(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(ai_provider.time, "monotonic", lambda: now[0])
+    b = ai_provider.CircuitBreaker("test", 20, 4, 0.5, 30.0, 1)
+
+    # Closed: failures below the minimum number of calls don't open it
+    for _ in range(3):
+        assert b.allow_request()
+        b.record_failure("boom")
+    assert b.state == b.CLOSED
+    b.record_failure("boom")
+    assert b.state == b.OPEN
+
+    # Open: rejected until the cooldown is over
+    assert not b.allow_request()
+    now[0] += 31
+    # Half-open: one probe at a time; its failure re-opens the breaker
+    assert b.allow_request()
+    assert b.state == b.HALF_OPEN
+    assert not b.allow_request()
+    b.record_failure("still down")
+    assert b.state == b.OPEN
+    assert b.snapshot()["rejected_total"] == 2
+
+    now[0] += 31
+    assert b.allow_request()
+    b.record_success()
+    assert b.state == b.CLOSED
+    assert b.failure_rate() == 0
+
+
+def test_open_gemini_breaker_routes_to_openai_without_a_call(monkeypatch):
+    gemini = ai_provider.CircuitBreaker("gemini", 20, 1, 0.5, 30.0, 1)
+    gemini._trip()
+    monkeypatch.setitem(ai_provider.breakers, "gemini", gemini)
+    monkeypatch.setitem(ai_provider.breakers, "openai", ai_provider.CircuitBreaker("openai", 20, 4, 0.5, 30.0, 1))
+    monkeypatch.setattr(ai_provider.settings, "AI_PROVIDER", "auto")
+    monkeypatch.setattr(ai_provider, "_gemini_configured", lambda: True)
+    monkeypatch.setattr(ai_provider, "choose_model", lambda player_id, call_type, model, chars: model)
+    called = []
+
+    async def gemini_answer(**kwargs):
+        called.append("gemini")
+        return "gemini"
+
+    async def openai_answer(*args, **kwargs):
+        called.append("openai")
+        return "openai"
+
+    monkeypatch.setattr(ai_provider.gemini_client, "get_ai_response", gemini_answer)
+    monkeypatch.setattr(ai_provider.openai_client, "get_ai_response", openai_answer)
+    assert asyncio.run(ai_provider.get_ai_response("hi", [], model="m", force_json=False)) == "openai"
+    assert called == ["openai"]
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from app.ai_turn import TurnParseError, decode_json_object, extract_json, parse_turn
+
+
+def test_clean_turn_is_not_marked_repaired():
+    turn = parse_turn('{"narrative": "你醒了。", "state_update": {"is_in_trial": true}}')
+    assert turn.narrative == "你醒了。"
+    assert turn.state_update == {"is_in_trial": True}
+    assert turn.roll_request is None
+    assert not turn.repaired
+
+
+@pytest.mark.parametrize(
+    "response",
+    [
+        # Trailing commas
+        '{"narrative": "你醒了。", "state_update": {"is_in_trial": true,},}',
+        # Truncated mid-string, inside a fence
+        '```json\n{"narrative": "你醒了。", "state_update": {"current_life.状态": "昏',
+        # Truncated after a complete inner object
+        '{"narrative": "你醒了。", "state_update": {"is_in_trial": true}',
+    ],
+)
+def test_broken_turn_is_repaired_locally(response):
+    turn = parse_turn(response)
+    assert turn.narrative == "你醒了。"
+    assert turn.repaired
+
+
+@pytest.mark.parametrize(
+    "response",
+    [
+        "天机不可泄露。",
+        '{"state_update": {"is_in_trial": true}}',
+        '{"narrative": ["not", "a", "string"]}',
+    ],
+)
+def test_unusable_turn_raises(response):
+    with pytest.raises(TurnParseError):
+        parse_turn(response)
+
+
+def test_empty_roll_request_and_null_state_update_are_ignored():
+    turn = parse_turn('{"narrative": "...", "roll_request": null, "state_update": null}')
+    assert turn.roll_request is None
+    assert turn.state_update == {}
+
+
+@pytest.mark.parametrize(
+    "response, expected",
+    [
+        ('前言 {"a": 1} 后记 {"b": 2}', '{"a": 1}'),
+        # Braces inside strings don't end the object
+        ('{"narrative": "他说：}{ 不可能"}', '{"narrative": "他说：}{ 不可能"}'),
+        # A fenced object wins over stray braces before the fence
+        ('示例{x}\n```json\n{"a": {"b": [1, 2]}}\n```', '{"a": {"b": [1, 2]}}'),
+        # Reasoning is skipped
+        ('<think>{"draft": 1}</think>{"final": 2}', '{"final": 2}'),
+        # Raw newlines inside strings are accepted
+        ('{"narrative": "第一行\n第二行"}', '{"narrative": "第一行\n第二行"}'),
+        ("没有JSON", None),
+        ('{"unterminated": "x', None),
+    ],
+)
+def test_extract_json(response, expected):
+    assert extract_json(response) == expected
+    if expected is not None:
+        assert decode_json_object(response) == json.loads(expected, strict=False)
+
+
+def test_first_decodable_object_skips_broken_ones():
+    assert decode_json_object('{broken {"ok": true}') == {"ok": True}
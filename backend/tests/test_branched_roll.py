@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+from app import game_logic
+from app.ai_turn import parse_turn
+
+PRE_ROLL = {
+    "narrative": "你纵身一跃。",
+    "roll_request": {"type": "轻功", "target": 60, "sides": 100},
+    "roll_branches": {
+        "成功": {"narrative": "你稳稳落在对岸。", "state_update": {"current_life.状态": "安然"}},
+        "失败": {"narrative": "你跌入溪中。"},
+    },
+}
+
+
+def test_missing_critical_branch_falls_back_to_its_tier():
+    turn = parse_turn(json.dumps(PRE_ROLL, ensure_ascii=False))
+    assert turn.branch_for("大成功").narrative == "你稳稳落在对岸。"
+    assert turn.branch_for("大失败").narrative == "你跌入溪中。"
+    # Branches are not part of the recorded turn
+    assert "roll_branches" not in turn.to_history()
+
+
+def test_malformed_branches_only_cost_the_shortcut():
+    data = dict(PRE_ROLL, roll_branches={"成功": {"state_update": {}}})
+    turn = parse_turn(json.dumps(data, ensure_ascii=False))
+    assert turn.roll_request is not None
+    assert turn.branch_for("成功") is None
+
+
+def _roll(monkeypatch, result, pre_roll_turn):
+    calls = []
+
+    async def follow_up(**kwargs):
+        calls.append(kwargs)
+        return parse_turn('{"narrative": "模型续写。"}')
+
+    async def send(player_id, message):
+        pass
+
+    monkeypatch.setattr(game_logic.random, "randint", lambda low, high: result)
+    monkeypatch.setattr(game_logic.openai_client, "get_ai_response", follow_up)
+    monkeypatch.setattr(game_logic.websocket_manager, "send_json_to_player", send)
+    turn, roll_event = asyncio.run(
+        game_logic._handle_roll_request(
+            "p", "{}", PRE_ROLL["roll_request"], "跳过小溪", "你纵身一跃。", [], pre_roll_turn=pre_roll_turn
+        )
+    )
+    return turn, roll_event, calls
+
+
+def test_branched_roll_needs_no_second_call(monkeypatch):
+    turn, roll_event, calls = _roll(monkeypatch, 30, parse_turn(json.dumps(PRE_ROLL, ensure_ascii=False)))
+    assert roll_event["outcome"] == "成功"
+    assert turn.narrative == "你稳稳落在对岸。"
+    assert turn.state_update == {"current_life.状态": "安然"}
+    assert calls == []
+
+
+def test_two_phase_roll_asks_the_model(monkeypatch):
+    turn, roll_event, calls = _roll(monkeypatch, 80, None)
+    assert roll_event["outcome"] == "失败"
+    assert turn.narrative == "模型续写。"
+    assert "最终结果: 失败" in calls[0]["prompt"]
@@ -0,0 +1,41 @@
+import json
+
+from app.client_view import CLIENT_FIELDS, client_view, live_view
+from test_punishment import _session
+
+
+def test_client_view_carries_only_what_the_ui_renders():
+    session = _session(redemption_code="ABCDEF", unchecked_rounds_count=4)
+    view = json.loads(client_view(session))
+    assert set(view) == set(CLIENT_FIELDS) | {
+        "version",
+        "display_history",
+        "display_history_start",
+        "display_history_total",
+        "display_history_epoch",
+    }
+    assert view["version"] == session.version
+    assert view["display_history"] == session["display_history"]
+
+
+def test_projection_is_refreshed_with_each_version():
+    session = _session()
+    first = json.loads(client_view(session))
+    session["opportunities_remaining"] = 7
+    session.touch()  # as save_session does
+    second = json.loads(client_view(session))
+    assert second["opportunities_remaining"] == 7
+    assert second["version"] > first["version"]
+
+
+def test_live_view_hides_inputs_and_masks_the_code():
+    session = _session(
+        display_history=["> 我的秘密输入", "兑换码: ABCDEF"],
+        redemption_code="ABCDEF",
+    )
+    view = json.loads(live_view(session))
+    assert set(view) - {"display_history", "display_history_start", "display_history_total", "display_history_epoch"} == {
+        "current_life",
+        "version",
+    }
+    assert view["display_history"] == [None, "兑换码: A...F"]
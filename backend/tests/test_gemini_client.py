@@ -0,0 +1,71 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app import gemini_client
+
+
+class FakeModel:
+    def __init__(self, name, system_instruction=None):
+        self.name = name
+        self.system_instruction = system_instruction
+        self.requests = []
+
+    async def generate_content_async(self, contents, generation_config=None, stream=False):
+        self.requests.append((contents, generation_config))
+
+        async def chunks():
+            yield SimpleNamespace(text='{"narrative": ', usage_metadata=None)
+            yield SimpleNamespace(text='"..."}', usage_metadata=None)
+
+        return chunks()
+
+
+@pytest.fixture
+def genai(monkeypatch):
+    fake = SimpleNamespace(configured=[], models=[])
+    fake.configure = lambda **kwargs: fake.configured.append(kwargs)
+
+    def model(name, system_instruction=None):
+        fake.models.append(FakeModel(name, system_instruction))
+        return fake.models[-1]
+
+    fake.GenerativeModel = model
+    monkeypatch.setattr(gemini_client, "genai", fake)
+    monkeypatch.setattr(gemini_client, "_configured", False)
+    monkeypatch.setattr(gemini_client, "_models", type(gemini_client._models)())
+    monkeypatch.setattr(gemini_client.settings, "GEMINI_API_KEY", "key")
+    return fake
+
+
+def test_client_is_configured_once_and_models_are_reused(genai):
+    history = [{"role": "system", "content": "你是司命星君"}]
+
+    async def two_calls():
+        return [
+            await gemini_client.get_ai_response("开始试炼", history, model="gemini-x"),
+            await gemini_client.get_ai_response("继续", history, model="gemini-x"),
+        ]
+
+    assert asyncio.run(two_calls()) == ['{"narrative": "..."}'] * 2
+    assert len(genai.configured) == 1
+    [model] = genai.models
+    assert model.system_instruction == "你是司命星君"
+    assert len(model.requests) == 2
+    assert model.requests[0][1] == {"response_mime_type": "application/json"}
+
+
+def test_mid_conversation_system_messages_become_user_turns():
+    system, contents = gemini_client._build_contents(
+        "继续",
+        [
+            {"role": "system", "content": "规则"},
+            {"role": "user", "content": "开始试炼"},
+            {"role": "assistant", "content": "{}"},
+            {"role": "system", "content": "判定结果：成功"},
+        ],
+    )
+    assert system == "规则"
+    assert [c["role"] for c in contents] == ["user", "model", "user"]
+    assert contents[-1]["parts"] == ["[系统指令]\n判定结果：成功", "继续"]
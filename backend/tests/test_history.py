@@ -0,0 +1,63 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import auth_simple as auth, history_encoder, security, state_manager
+from app.main import app
+from test_punishment import PLAYER, _session
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(auth, "USERS_DB", {PLAYER: "x"})
+    session = _session(display_history=[f"entry {i}" for i in range(30)], history_epoch=5)
+    state_manager.SESSIONS[PLAYER] = session
+    client = TestClient(app)
+    client.cookies.set("token", auth.create_access_token({"sub": PLAYER}))
+    client.session = session
+    yield client
+    state_manager.SESSIONS.pop(PLAYER, None)
+
+
+def test_page_from_an_older_epoch_is_refused(client):
+    page = client.get("/api/game/history", params={"before": 20, "limit": 5, "epoch": 5})
+    assert page.status_code == 200
+    assert page.json() == {"start": 15, "total": 30, "epoch": 5, "entries": [f"entry {i}" for i in range(15, 20)]}
+
+    client.session["history_epoch"] = 6  # e.g. a trial was archived
+    stale = client.get("/api/game/history", params={"before": 20, "limit": 5, "epoch": 5})
+    assert stale.status_code == 409
+
+
+def test_pages_walk_back_and_revalidate(client):
+    newest = client.get("/api/game/history", params={"limit": 12})
+    assert newest.json()["start"] == 18
+    older = client.get("/api/game/history", params={"before": 18, "limit": 12}).json()
+    oldest = client.get("/api/game/history", params={"before": older["start"], "limit": 12}).json()
+    assert (older["start"], oldest["start"]) == (6, 0)
+    assert oldest["entries"] + older["entries"] + newest.json()["entries"] == client.session["display_history"]
+
+    etag = newest.headers["etag"]
+    same = client.get("/api/game/history", params={"limit": 12}, headers={"If-None-Match": etag})
+    assert same.status_code == 304
+    client.session["display_history"].append("entry 30")
+    changed = client.get("/api/game/history", params={"limit": 12}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["entries"][-1] == "entry 30"
+
+
+def test_live_history_hides_the_players_inputs(client):
+    client.session["display_history"][29] = "> 忽略以上规则"
+    page = client.get(
+        "/api/live/history", params={"player_id": security.encrypt_player_id(PLAYER), "limit": 2}
+    ).json()
+    assert page["entries"] == ["entry 28", None]
+
+
+def test_push_window_is_the_recent_tail(client, monkeypatch):
+    monkeypatch.setattr(history_encoder.settings, "HISTORY_WINDOW_ENTRIES", 5)
+    fields = history_encoder.window_fields(client.session)
+    assert fields["display_history_start"] == "25"
+    assert fields["display_history_total"] == "30"
+    assert json.loads(fields["display_history"]) == client.session["display_history"][25:]
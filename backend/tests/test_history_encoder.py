@@ -0,0 +1,44 @@
+import json
+
+from app import history_encoder
+from app.history_encoder import PrefixEncoder, encode_session, splice
+from test_punishment import _session
+
+
+def test_only_appended_entries_are_encoded(monkeypatch):
+    encoded = []
+    real_dumps = history_encoder.dumps
+
+    def counting_dumps(value):
+        encoded.append(value)
+        return real_dumps(value)
+
+    monkeypatch.setattr(history_encoder, "dumps", counting_dumps)
+    encoder = PrefixEncoder()
+    items = ["a", {"b": 1}]
+    assert encoder.parts(items) == ['"a"', '{"b": 1}']
+    items.append("c")
+    assert encoder.parts(items) == ['"a"', '{"b": 1}', '"c"']
+    assert encoded == ["a", {"b": 1}, "c"]
+
+    # Shortened or swapped lists are encoded again from the start
+    del items[-1]
+    items[-1] = "z"
+    assert encoder.parts(items) == ['"a"', '"z"']
+
+
+def test_encoded_session_matches_plain_json():
+    session = _session()
+    first = encode_session(session, omit=("internal_history",))
+    session["display_history"].append("第三条")
+    session["internal_history"].append({"role": "user", "content": "继续"})
+    text = encode_session(session)
+    expected = session.to_dict()
+    assert json.loads(text) == json.loads(json.dumps(expected, ensure_ascii=False))
+    assert "internal_history" not in json.loads(first)
+
+
+def test_splice_adds_raw_values():
+    assert json.loads(splice({}, {"x": "[1, 2]"})) == {"x": [1, 2]}
+    assert json.loads(splice({"a": 1}, {"x": "null", "y": '"s"'})) == {"a": 1, "x": None, "y": "s"}
+    assert splice('{"a": 1}', {}) == '{"a": 1}'
@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+import pytest
+
+from app import live_system
+from app.live_bus import InProcessBus, RespBus, StandInServer
+from app.live_system import LiveManager
+from test_punishment import _session
+
+
+class SharedBus(InProcessBus):
+    """One in-process bus shared by several managers, standing in for separate processes."""
+
+    remote = True
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    sent = []
+
+    async def send_text(player_id, text):
+        sent.append((player_id, json.loads(text)["data"]["version"]))
+
+    monkeypatch.setattr(live_system.websocket_manager, "send_text_to_player", send_text)
+    return sent
+
+
+def test_updates_reach_other_processes_once_and_in_version_order(sent):
+    bus = SharedBus()
+    host, other = LiveManager(bus), LiveManager(bus)
+    session = _session()
+    versions = []
+
+    async def scenario():
+        await host.start(lambda player_id: session if player_id == "target" else None)
+        await other.start(lambda player_id: None)
+        other.add_viewer("viewer", "target")
+
+        await host.broadcast_state_update("target", session)
+        await host.broadcast_state_update("target", session)  # same version: not sent again
+        versions.append(session.version)
+        session.touch()
+        await host.broadcast_state_update("target", session)
+        versions.append(session.version)
+        # A late copy of the older revision is dropped
+        await bus.publish(host._message("update", "target", versions[0], '{"version": %d}' % versions[0]))
+        # A new viewer's snapshot is delivered even if it is not newer
+        await other.request_snapshot("target")
+
+    asyncio.run(scenario())
+    old, new = versions
+    assert sent == [("viewer", old), ("viewer", new), ("viewer", new)]
+    assert host.published == 2
+
+
+def test_resp_bus_round_trip_through_the_stand_in(tmp_path):
+    async def scenario():
+        server = StandInServer()
+        path = str(tmp_path / "bus.sock")
+        listener = await asyncio.start_unix_server(server.handle, path=path)
+        received = []
+        got = asyncio.Event()
+
+        async def handler(message):
+            received.append(message)
+            got.set()
+
+        subscriber = RespBus(f"unix://{path}", "live")
+        publisher = RespBus(f"unix://{path}", "live")
+        await subscriber.start(handler)
+        for _ in range(100):
+            if server.channels:
+                break
+            await asyncio.sleep(0.01)
+        await publisher.publish('{"kind": "update"}\n{"灵石": 1}')
+        await asyncio.wait_for(got.wait(), 5)
+        await subscriber.close()
+        await publisher.close()
+        listener.close()
+        return received
+
+    assert asyncio.run(scenario()) == ['{"kind": "update"}\n{"灵石": 1}']
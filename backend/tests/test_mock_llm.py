@@ -0,0 +1,36 @@
+import json
+import random
+
+from fastapi.testclient import TestClient
+
+from app import game_logic
+from app.mock_llm import MockLLMConfig, _canned_reply, create_app, request_key
+from app.session_model import filter_state_update
+from test_punishment import _session
+
+
+def _opening(opportunities_remaining: int) -> dict:
+    messages = [{"role": "user", "content": game_logic._opening_prompt(opportunities_remaining)}]
+    return json.loads(_canned_reply(messages, MockLLMConfig(), random.Random(1)))["state_update"]
+
+
+def test_canned_opening_follows_the_prompt():
+    first = _opening(10)
+    assert first["opportunities_remaining"] == 9
+    assert first["current_life"]["灵石"] == 1
+
+    later = _opening(4)
+    assert later["opportunities_remaining"] == 3
+    session = _session(opportunities_remaining=4, is_in_trial=False, current_life=None)
+    assert filter_state_update(session, later) == later
+
+
+def test_replay_answers_what_was_recorded(tmp_path):
+    path = tmp_path / "recording.jsonl"
+    body = {"model": "m", "messages": [{"role": "user", "content": "开始试炼"}]}
+    path.write_text(json.dumps({"key": request_key(body), "content": "recorded"}) + "\n", encoding="utf-8")
+    client = TestClient(create_app(MockLLMConfig(mode="replay", recording_path=str(path))))
+    reply = client.post("/v1/chat/completions", json={**body, "model": "other"})
+    assert reply.json()["choices"][0]["message"]["content"] == "recorded"
+    missing = client.post("/v1/chat/completions", json={"messages": [{"role": "user", "content": "x"}]})
+    assert missing.status_code == 404
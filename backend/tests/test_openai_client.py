@@ -0,0 +1,61 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from app import openai_client
+from app.ai_turn import AITurn
+
+
+def _bad_request():
+    request = httpx.Request("POST", "http://model.test/v1/chat/completions")
+    return openai.BadRequestError(
+        "response_format is not supported", response=httpx.Response(400, request=request), body=None
+    )
+
+
+def _reply(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """A backend without structured output support; `answers` are used after it rejects response_format."""
+    state = {"calls": [], "answers": []}
+
+    async def create(model, messages, **kwargs):
+        state["calls"].append(kwargs)
+        if "response_format" in kwargs:
+            raise _bad_request()
+        answer = state["answers"].pop(0) if state["answers"] else ValueError("garbled")
+        if isinstance(answer, Exception):
+            raise answer
+        return _reply(answer)
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(openai_client, "client", client)
+    monkeypatch.setattr(openai_client, "_no_structured_output", set())
+    monkeypatch.setattr(openai_client, "_backoff_delay", lambda e, attempt: 0)
+    monkeypatch.setattr(openai_client.settings, "OPENAI_STRUCTURED_OUTPUT", "json_schema")
+    return state
+
+
+def test_structured_output_is_off_by_default():
+    assert type(openai_client.settings).model_fields["OPENAI_STRUCTURED_OUTPUT"].default == "off"
+
+
+def test_downgrade_does_not_use_up_a_retry(backend):
+    with pytest.raises(ValueError):
+        asyncio.run(openai_client.get_ai_response("act", [], "m", structured=True))
+    # One rejected structured request, then the full retry budget without it
+    assert len(backend["calls"]) == 1 + 7
+    assert all("response_format" not in kwargs for kwargs in backend["calls"][1:])
+
+
+def test_downgraded_model_answers_on_the_next_request(backend):
+    backend["answers"] = ['{"narrative": "你推开山门。", "state_update": {}}']
+    turn = asyncio.run(openai_client.get_ai_response("act", [], "m", structured=True))
+    assert isinstance(turn, AITurn) and turn.narrative == "你推开山门。"
+    assert len(backend["calls"]) == 2
@@ -0,0 +1,65 @@
+import pytest
+
+from app import opening_pool as opening_pool_module
+from app.ai_turn import AITurn, RollRequest
+from app.opening_pool import OpeningPool
+
+
+def _opening(opportunities=99) -> AITurn:
+    return AITurn(
+        narrative="你睁开双眼。",
+        state_update={
+            "is_in_trial": True,
+            "current_life": {"姓名": "林一"},
+            "opportunities_remaining": opportunities,
+        },
+    )
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(opening_pool_module.time, "time", lambda: now[0])
+    monkeypatch.setattr(opening_pool_module.settings, "OPENING_POOL_SIZE", 2)
+    monkeypatch.setattr(opening_pool_module.settings, "OPENING_POOL_TTL_SECONDS", 60)
+    p = OpeningPool()
+    p.now = now
+    return p
+
+
+def test_opening_is_served_once_for_its_key(pool):
+    inheritance = {"key": "sword"}
+    assert pool.put(10, None, _opening())
+    assert pool.take(10, inheritance) is None
+    turn = pool.take(10)
+    # The key's opportunities win over whatever the model wrote
+    assert turn.state_update["opportunities_remaining"] == 9
+    assert pool.take(10) is None
+    assert (pool.hits, pool.misses) == (1, 2)
+
+
+def test_invalid_openings_are_not_stocked(pool):
+    rolled = _opening()
+    rolled.roll_request = RollRequest()
+    assert not pool.put(10, None, rolled)
+    assert not pool.put(10, None, AITurn(narrative="...", state_update={"is_in_trial": True}))
+    assert pool.stats()["size"] == 0
+
+
+def test_stock_is_capped_and_expires(pool):
+    for _ in range(3):
+        pool.put(10, None, _opening())
+    assert pool.stats()["keys"] == {"10:": 2}
+    pool.now[0] += 61
+    assert pool.take(10) is None
+    assert pool.stats()["size"] == 0
+
+
+def test_refill_targets_the_latest_wanted_key(pool):
+    pool.want(10)
+    pool.now[0] += 1
+    pool.want(7, {"key": "sword"})
+    assert pool._next_to_fill() == (7, {"key": "sword"})
+    pool.put(7, {"key": "sword"}, _opening())
+    pool.put(7, {"key": "sword"}, _opening())
+    assert pool._next_to_fill() == (10, None)
@@ -0,0 +1,65 @@
+import asyncio
+
+from app import game_logic, state_manager
+from app.session_model import Session
+
+PLAYER = "punished-player"
+
+
+def _session(**fields) -> Session:
+    data = {
+        "player_id": PLAYER,
+        "session_date": "2026-10-19",
+        "opportunities_remaining": 8,
+        "daily_success_achieved": False,
+        "is_in_trial": True,
+        "is_processing": False,
+        "pending_punishment": None,
+        "unchecked_rounds_count": 0,
+        "current_life": {"姓名": "林一", "境界": "炼气"},
+        "internal_history": [
+            {"role": "system", "content": "system prompt"},
+            {"role": "user", "content": "开始试炼"},
+            {"role": "assistant", "content": '{"narrative": "..."}'},
+        ],
+        "display_history": ["> 开始试炼", "..."],
+        "roll_event": None,
+        "redemption_code": None,
+        "trial_start": None,
+        "last_modified": 0.0,
+    }
+    data.update(fields)
+    return Session(data)
+
+
+async def _act(action: str):
+    await game_logic.process_player_action({"username": PLAYER, "id": 1}, action)
+    await asyncio.sleep(0)  # let the scheduled pushes run
+
+
+def test_session_copy_is_a_shallow_session():
+    session = _session()
+    copied = session.copy()
+    assert isinstance(copied, Session)
+    assert copied is not session
+    assert copied.to_dict() == session.to_dict()
+    copied["is_in_trial"] = False
+    assert session["is_in_trial"] is True
+
+
+def test_action_with_pending_light_punishment_applies_it():
+    session = _session(pending_punishment={"level": "轻度亵渎", "reason": "test"})
+    state_manager.SESSIONS[PLAYER] = session
+    try:
+        asyncio.run(_act("继续修炼"))
+        punished = state_manager.SESSIONS[PLAYER]
+        assert punished["pending_punishment"] is None
+        assert punished["is_in_trial"] is False
+        assert punished["current_life"] is None
+        assert punished["internal_history"] == [
+            {"role": "system", "content": game_logic.GAME_MASTER_SYSTEM_PROMPT}
+        ]
+        assert punished["display_history"][-1].startswith("【天机示警】")
+        assert not punished["is_processing"]
+    finally:
+        state_manager.SESSIONS.pop(PLAYER, None)
@@ -0,0 +1,24 @@
+import logging
+
+from app.session_model import filter_state_update
+from test_punishment import _session
+
+
+def test_keys_outside_the_allow_list_are_dropped_with_one_warning(caplog):
+    session = _session()
+    update = {
+        "daily_success_achieved": True,
+        "redemption_code": "FREE",
+        "current_life.灵石": 10,
+        "opportunities_remaining": 9,  # may only decrease
+        "trigger_program": {"name": "spiritStoneConverter", "spirit_stones": 10},
+    }
+    with caplog.at_level(logging.WARNING, logger="app.session_model"):
+        accepted = filter_state_update(session, update)
+    assert accepted == {"current_life.灵石": 10}
+
+    warnings = [r.getMessage() for r in caplog.records if r.levelno == logging.WARNING]
+    [dropped] = [m for m in warnings if "MODEL_WRITABLE_FIELDS" in m]
+    assert "daily_success_achieved, redemption_code" in dropped
+    assert any("'opportunities_remaining'" in m and "only decrease" in m for m in warnings)
+    assert not any("trigger_program" in m for m in warnings)
@@ -0,0 +1,42 @@
+import asyncio
+
+from app import ai_provider, cheat_check, game_logic, state_manager
+from test_punishment import PLAYER, _act, _session
+
+ROUNDS = [("2026-10-19#1", "前往山门"), ("2026-10-19#2", "破碎虚空")]
+
+
+def test_settlement_without_verdict_is_held_then_retried(monkeypatch):
+    replies = ["错误：AI服务响应超时"]
+
+    async def fake_response(prompt, history=None, model=None, force_json=True, **kwargs):
+        return replies[0]
+
+    monkeypatch.setattr(ai_provider, "get_ai_response", fake_response)
+    monkeypatch.setattr(cheat_check.settings, "CHEAT_CHECK_SETTLEMENT_ATTEMPTS", 1)
+    monkeypatch.setattr(cheat_check.settings, "CHEAT_CHECK_SETTLEMENT_RETRY_SECONDS", 0)
+    monkeypatch.setattr(cheat_check.settings, "REDEMPTION_ENABLED", False)
+    cheat_check.cheat_queue.forget(PLAYER)
+    session = _session(is_in_trial=False)
+    monkeypatch.setitem(state_manager.SESSIONS, PLAYER, session)
+
+    async def scenario():
+        await game_logic._settle(session, 1, PLAYER, 100, ROUNDS)
+        assert session["pending_settlement"]["spirit_stones"] == 100
+        assert session["display_history"][-1] == game_logic.SETTLEMENT_HELD_MESSAGE
+        assert not session["daily_success_achieved"]
+        retry = game_logic._settlement_retries[PLAYER]
+
+        # No new trial while the settlement is held
+        history_len = len(session["display_history"])
+        await _act("开始试炼")
+        assert len(session["display_history"]) == history_len
+
+        replies[0] = "【正常】"
+        await retry
+
+    asyncio.run(scenario())
+    assert "pending_settlement" not in session
+    assert session["daily_success_achieved"] is True
+    assert "【天道静默】" in session["display_history"][-1]
+    assert PLAYER not in game_logic._settlement_retries
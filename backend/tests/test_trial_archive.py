@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from app import game_logic, state_manager
+from app.ai_turn import AITurn
+from app.trial_archive import TrialArchive
+from test_punishment import PLAYER, _session
+
+
+def _in_trial(**fields):
+    return _session(
+        trial_start={"internal_history": 1, "display_history": 1, "life": 2, "started_at": 1000.0},
+        history_epoch=7,
+        **fields,
+    )
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    archive = TrialArchive(str(tmp_path))
+    monkeypatch.setattr(game_logic, "trial_archive", archive)
+    return archive
+
+
+def test_finished_trial_round_trips_through_the_archive(archive):
+    session = _in_trial(is_in_trial=False)
+    trial_display = session["display_history"][1:]
+    trial_internal = session["internal_history"][1:]
+
+    assert asyncio.run(archive.archive_trial(session))
+    [listed] = asyncio.run(archive.list_trials(PLAYER))
+    assert listed["life"] == 2 and listed["rounds"] == 0
+    assert "display_history" not in listed
+    record = asyncio.run(archive.get_trial(PLAYER, listed["id"]))
+    assert record["display_history"] == trial_display
+    assert record["internal_history"] == trial_internal
+
+    # The hot session keeps one summary line, under a new epoch
+    assert len(session["display_history"]) == 2
+    assert session["display_history"][1].startswith("【前尘往事】第2世")
+    assert session["history_epoch"] != 7
+    assert session["trial_start"] is None
+
+
+def test_trial_in_progress_is_not_archived(archive):
+    session = _in_trial()
+    assert not asyncio.run(archive.archive_trial(session))
+    assert asyncio.run(archive.list_trials(PLAYER)) == []
+
+
+def test_trial_is_archived_on_the_turn_it_ends(archive, monkeypatch):
+    async def death(*args):
+        return AITurn(narrative="你寿元已尽。", state_update={"is_in_trial": False, "current_life": None}), None
+
+    monkeypatch.setattr(game_logic.turn_slo, "call", death)
+    session = _in_trial()
+    state_manager.SESSIONS[PLAYER] = session
+    try:
+        asyncio.run(game_logic._process_player_action_async({"username": PLAYER, "id": 1}, "闭关"))
+        [listed] = asyncio.run(archive.list_trials(PLAYER))
+        assert listed["summary"] == "你寿元已尽。"
+        assert session["trial_start"] is None
+        assert session["display_history"][-1].startswith("【前尘往事】")
+    finally:
+        state_manager.SESSIONS.pop(PLAYER, None)
@@ -0,0 +1,67 @@
+import asyncio
+
+from app import game_logic, state_manager
+from app.ai_turn import AITurn, RollRequest
+from app.deadline import DeadlineExceeded
+from test_punishment import PLAYER, _session
+
+
+def _cancel_mid_roll(monkeypatch, session):
+    """Runs an action whose roll follow-up never answers, and cancels it after the pre-roll narrative."""
+
+    async def roll_turn(player_id, key, prompt, history, *deadlines):
+        return AITurn(narrative="你屏息凝神……", roll_request=RollRequest(type="悟性", target=70)), None
+
+    async def slow_followup(*args, **kwargs):
+        await asyncio.sleep(60)
+
+    monkeypatch.setattr(game_logic.turn_slo, "call", roll_turn)
+    monkeypatch.setattr(game_logic, "_handle_roll_request", slow_followup)
+    state_manager.SESSIONS[PLAYER] = session
+
+    async def run():
+        task = asyncio.create_task(
+            game_logic._process_player_action_async({"username": PLAYER, "id": 1}, "参悟功法")
+        )
+        await asyncio.sleep(0.1)  # past the pre-roll narrative, waiting for the follow-up
+        assert session["internal_history"][-1]["role"] == "assistant"
+        assert session["display_history"][-2:] == ["> 参悟功法", "你屏息凝神……"]
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    try:
+        asyncio.run(run())
+    finally:
+        state_manager.SESSIONS.pop(PLAYER, None)
+
+
+def test_cancelled_roll_turn_leaves_no_history(monkeypatch):
+    session = _session()
+    before = list(session["internal_history"])
+    _cancel_mid_roll(monkeypatch, session)
+    assert session["internal_history"] == before
+
+
+def test_cancelled_roll_turn_leaves_no_display_history(monkeypatch):
+    session = _session(input_rounds=3)
+    before = list(session["display_history"])
+    _cancel_mid_roll(monkeypatch, session)
+    # The player's view matches the model's context again
+    assert session["display_history"] == before
+    assert session["input_rounds"] == 3
+
+
+def test_turn_out_of_time_leaves_no_unanswered_action(monkeypatch):
+    async def out_of_time(*args):
+        raise DeadlineExceeded("budget exhausted")
+
+    monkeypatch.setattr(game_logic.turn_slo, "call", out_of_time)
+    session = _session()
+    before = list(session["internal_history"])
+    state_manager.SESSIONS[PLAYER] = session
+    try:
+        asyncio.run(game_logic._process_player_action_async({"username": PLAYER, "id": 1}, "参悟功法"))
+        assert session["internal_history"] == before
+        assert session["display_history"][-1].startswith("【天机紊乱】")
+    finally:
+        state_manager.SESSIONS.pop(PLAYER, None)
@@ -0,0 +1,24 @@
+import json
+
+import pytest
+
+from app.turn_context import display_tail, state_view_json
+from test_punishment import _session
+
+
+@pytest.mark.parametrize("limit", [1, 5, 11, 12, 100])
+def test_display_tail_matches_joining_everything(limit):
+    history = ["> 开始试炼", "", "你醒了。", "x" * 7]
+    assert display_tail(history, limit) == "\n".join(history)[-limit:]
+    assert display_tail([], limit) == ""
+
+
+def test_state_view_hides_bookkeeping_and_leaves_the_session_alone():
+    session = _session(display_history=["a" * 600, "b" * 600], trial_start=3)
+    before = session.to_dict()
+    view = json.loads(state_view_json(session))
+    assert "internal_history" not in view
+    assert "trial_start" not in view
+    assert view["display_history"] == ("a" * 600 + "\n" + "b" * 600)[-1000:]
+    assert view["current_life"] == session["current_life"]
+    assert session.to_dict() == before
@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+import pytest
+
+from app import ai_provider
+from app.ai_turn import AITurn
+from app.deadline import Deadline
+from app.turn_slo import TurnSLO
+
+
+@pytest.fixture
+def slo(monkeypatch):
+    """A fresh guard with a 0.1s soft / 0.3s hard SLO and a fake model."""
+    monkeypatch.setattr(ai_provider.settings, "TURN_SLO_SOFT_SECONDS", 0.1)
+    monkeypatch.setattr(ai_provider.settings, "TURN_SLO_HARD_SECONDS", 0.3)
+    monkeypatch.setattr(ai_provider.settings, "TURN_SLO_FAST_MODEL", None)
+    delays = {}
+
+    async def fake_response(prompt, history=None, model=None, **kwargs):
+        await asyncio.sleep(delays.get(model or "primary", 0))
+        return AITurn(narrative=model or "primary")
+
+    monkeypatch.setattr(ai_provider, "get_ai_response", fake_response)
+    guard = TurnSLO()
+    guard.delays = delays
+    return guard
+
+
+def test_slo_is_off_by_default():
+    assert type(ai_provider.settings).model_fields["TURN_SLO_SOFT_SECONDS"].default == 0
+
+
+def test_slow_turn_gets_a_holding_narrative_by_the_hard_deadline(slo):
+    slo.delays["primary"] = 5
+
+    async def turn():
+        started = time.monotonic()
+        result = await slo.call("p", "k", "act", [], Deadline(10))
+        return result, time.monotonic() - started
+
+    (turn, outcome), waited = asyncio.run(turn())
+    assert outcome == "holding"
+    assert waited < 0.5
+
+
+def test_fast_model_answers_after_the_soft_deadline(slo, monkeypatch):
+    monkeypatch.setattr(ai_provider.settings, "TURN_SLO_FAST_MODEL", "fast")
+    slo.delays.update(primary=5, fast=0.05)
+    turn, outcome = asyncio.run(slo.call("p", "k", "act", [], Deadline(10)))
+    assert (turn.narrative, outcome) == ("fast", "fast_model")
+
+
+def test_follow_up_budget_counts_from_the_start_of_the_turn(slo):
+    async def turn():
+        hard = slo.turn_deadline(Deadline(10))
+        slo.delays["primary"] = 0.2  # past the soft deadline, answered late
+        await slo.call("p", "k", "act", [], Deadline(10), hard)
+        return hard.remaining()
+
+    # The roll follow-up gets what is left of the 0.3s, not a fresh 0.3s
+    assert asyncio.run(turn()) < 0.15
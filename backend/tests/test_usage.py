@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app import usage
+from app.usage import UsageTracker, _parse_prices
+
+
+def test_prices_default_cached_to_half_the_input_price():
+    assert _parse_prices("big:2/8, small:0.5/1/0.1, bad:x, flat:3") == {
+        "big": (2.0, 8.0, 1.0),
+        "small": (0.5, 1.0, 0.1),
+        "flat": (3.0, 3.0, 1.5),
+    }
+
+
+def test_usage_is_costed_and_aggregated():
+    tracker = UsageTracker()
+    tracker.prices = {"big": (2.0, 8.0, 1.0)}
+    response_usage = SimpleNamespace(
+        prompt_tokens=1_000_000, completion_tokens=500_000, prompt_tokens_details=SimpleNamespace(cached_tokens=400_000)
+    )
+    tracker.record_openai("alice", usage.CALL_TURN, "big", response_usage)
+    tracker.record_openai("alice", usage.CALL_CHEAT_CHECK, "big", None)  # no usage reported
+    tracker.record("bob", usage.CALL_CHEAT_CHECK, "unpriced", 100, 10)
+
+    # 600k uncached * 2 + 400k cached * 1 + 500k out * 8, per 1M tokens
+    assert tracker.player_cost_today("alice") == pytest.approx(5.6)
+    summary = tracker.summary()
+    assert summary["call_types"]["turn"]["calls"] == 1
+    assert summary["call_types"]["cheat_check"]["calls"] == 1
+    assert summary["players"] == 2
+    assert list(summary["top_players"]) == ["alice", "bob"]
+
+
+@pytest.fixture
+def routing(monkeypatch):
+    tracker = UsageTracker()
+    tracker.prices = {"big": (2.0, 8.0, 1.0), "small": (0.2, 0.8, 0.1)}
+    monkeypatch.setattr(usage, "usage_tracker", tracker)
+    monkeypatch.setattr(usage.settings, "ROUTING_LONG_CONTEXT_TOKENS", 1000)
+    monkeypatch.setattr(usage.settings, "ROUTING_PLAYER_DAILY_BUDGET", 1.0)
+    return tracker
+
+
+def test_routing_keeps_the_configured_list_by_default(routing):
+    assert usage.choose_model("alice", usage.CALL_TURN, "big,small", 100) == "big,small"
+    assert usage.choose_model("alice", usage.CALL_TURN, "big", 10_000) == "big"
+
+
+def test_long_contexts_and_spent_budgets_go_to_the_cheapest_model(routing):
+    assert usage.choose_model("alice", usage.CALL_TURN, "big,small", 10_000) == "small"
+    routing.record("alice", usage.CALL_TURN, "big", 1_000_000, 0)
+    assert usage.choose_model("alice", usage.CALL_TURN, "big, small", 100) == "small"
+    assert usage.choose_model("bob", usage.CALL_TURN, "big, small", 100) == "big, small"
@@ -0,0 +1,22 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import auth_simple as auth
+from app.main import app
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(auth.settings, "ADMIN_USERS", "admin")
+    monkeypatch.setattr(auth, "USERS_DB", {"admin": "x", "demo": "x"})
+    return TestClient(app)
+
+
+def _get_summary(client, username):
+    client.cookies.set("token", auth.create_access_token({"sub": username}))
+    return client.get("/api/usage/summary")
+
+
+def test_usage_summary_is_admin_only(client):
+    assert _get_summary(client, "demo").status_code == 403
+    assert _get_summary(client, "admin").status_code == 200
@@ -0,0 +1,44 @@
+import asyncio
+import gzip
+import json
+
+from app import websocket_manager as websocket_module
+from app.websocket_manager import ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_bytes(self, data: bytes):
+        self.sent.append(json.loads(gzip.decompress(data).decode("utf-8")))
+
+
+def test_large_and_small_messages_arrive_in_call_order(monkeypatch):
+    monkeypatch.setattr(websocket_module.settings, "WS_OFFLOAD_MIN_CHARS", 1000)
+    manager = ConnectionManager()
+    socket = FakeWebSocket()
+    manager.active_connections["p"] = socket
+    big = {"type": "big", "data": "灵" * 50_000}
+
+    async def send_all():
+        await asyncio.gather(
+            manager.send_json_to_player("p", big),
+            manager.send_json_to_player("p", {"type": "small", "n": 1}),
+            manager.send_json_to_player("p", {"type": "small", "n": 2}),
+        )
+
+    asyncio.run(send_all())
+    assert socket.sent == [big, {"type": "small", "n": 1}, {"type": "small", "n": 2}]
+    assert manager._executor is not None  # the large one went to the worker pool
+
+
+def test_failed_send_drops_the_connection():
+    class ClosedWebSocket:
+        async def send_bytes(self, data):
+            raise RuntimeError("closed")
+
+    manager = ConnectionManager()
+    manager.active_connections["p"] = ClosedWebSocket()
+    asyncio.run(manager.send_json_to_player("p", {"type": "ping"}))
+    assert "p" not in manager.active_connections
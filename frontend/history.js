@@ -0,0 +1,122 @@
+// --- History View ---
+// Renders a display history that arrives over WebSocket as a recent window.
+// Entries are addressed by their index in the full history; older ones are
+// fetched page by page when the reader scrolls to the top. Only entries that
+// changed are re-rendered. null entries are hidden (e.g. a watched player's
+// own inputs in the live view). Indices only hold within one history epoch;
+// when the server rewrites the history (a trial archived) the epoch changes
+// and the view starts over.
+
+const LOAD_OLDER_THRESHOLD_PX = 80;
+
+function renderEntry(text) {
+  if (text === null) return document.createComment("");
+  const p = document.createElement("div");
+  p.innerHTML = marked.parse(text);
+  if (text.startsWith("> ")) p.classList.add("user-input-message");
+  else if (text.startsWith("【")) p.classList.add("system-message");
+  return p;
+}
+
+export class HistoryView {
+  // fetchPage(before, epoch) resolves to { start, entries, total, epoch },
+  // or null if the history has moved on to another epoch
+  constructor(container, fetchPage) {
+    this.container = container;
+    this.fetchPage = fetchPage;
+    this.generation = 0;
+    this.epoch = 0;
+    this.reset();
+    container.addEventListener("scroll", () => {
+      if (container.scrollTop < LOAD_OLDER_THRESHOLD_PX) this.loadOlder();
+    });
+  }
+
+  reset() {
+    this.start = 0; // index of entries[0] in the full history
+    this.entries = [];
+    this.nodes = [];
+    this.loading = false;
+    this.generation += 1; // drops pages requested for the previous history
+    this.container.innerHTML = "";
+  }
+
+  // Merges a window (entries[i] is the entry at index start + i)
+  applyWindow(start, entries, epoch = 0) {
+    const offset = start - this.start;
+    const known = this.entries.length;
+    const continues =
+      epoch === this.epoch &&
+      known > 0 &&
+      offset >= 0 &&
+      offset <= known &&
+      (offset === known || this.entries[offset] === entries[0]);
+    if (!continues) {
+      // A different history (new epoch, new day): start over
+      this.reset();
+      this.start = start;
+      this.epoch = epoch;
+    }
+    const base = continues ? offset : 0;
+
+    let same = 0;
+    while (
+      same < entries.length &&
+      base + same < this.entries.length &&
+      this.entries[base + same] === entries[same]
+    ) {
+      same += 1;
+    }
+    if (same === entries.length && base + same === this.entries.length) return;
+
+    for (const node of this.nodes.splice(base + same)) node.remove();
+    this.entries.length = base + same;
+    const fragment = document.createDocumentFragment();
+    for (const text of entries.slice(same)) {
+      const node = renderEntry(text);
+      this.entries.push(text);
+      this.nodes.push(node);
+      fragment.appendChild(node);
+    }
+    this.container.appendChild(fragment);
+    this.container.scrollTop = this.container.scrollHeight;
+    this.fillViewport();
+  }
+
+  // Short windows leave nothing to scroll, so keep loading until there is
+  fillViewport() {
+    if (this.container.scrollHeight <= this.container.clientHeight) {
+      this.loadOlder();
+    }
+  }
+
+  async loadOlder() {
+    if (this.loading || this.start <= 0 || this.entries.length === 0) return;
+    this.loading = true;
+    const generation = this.generation;
+    let loaded = false;
+    try {
+      const page = await this.fetchPage(this.start, this.epoch);
+      if (!page || generation !== this.generation || page.start >= this.start) return;
+      const entries = page.entries.slice(0, this.start - page.start);
+      const nodes = entries.map(renderEntry);
+      const fragment = document.createDocumentFragment();
+      nodes.forEach((node) => fragment.appendChild(node));
+
+      // Keep what the reader is looking at in place
+      const previousHeight = this.container.scrollHeight;
+      this.container.prepend(fragment);
+      this.container.scrollTop += this.container.scrollHeight - previousHeight;
+
+      this.entries.unshift(...entries);
+      this.nodes.unshift(...nodes);
+      this.start = page.start;
+      loaded = true;
+    } catch (err) {
+      console.error("Failed to load older history:", err);
+    } finally {
+      if (generation === this.generation) this.loading = false;
+    }
+    if (loaded) this.fillViewport();
+  }
+}
@@ -1,3 +1,5 @@
+import { HistoryView } from "./history.js";
+
 // --- Constants ---
 const API_BASE_URL = "/api";
 
@@ -24,6 +26,7 @@ const DOMElements = {
   startTrialButton: document.getElementById("start-trial-button"),
   refreshAttemptsButton: document.getElementById("refresh-attempts-button"),
   loadingSpinner: document.getElementById("loading-spinner"),
+  queueStatus: document.getElementById("queue-status"),
   rollOverlay: document.getElementById("roll-overlay"),
   rollPanel: document.getElementById("roll-panel"),
   rollType: document.getElementById("roll-type"),
@@ -83,8 +86,21 @@ const api = {
     if (!response.ok) throw new Error("Failed to refresh attempts");
     return response.json();
   },
+  async getHistory(before, epoch) {
+    const response = await fetch(
+      `${API_BASE_URL}/game/history?before=${before}&epoch=${epoch}`
+    );
+    // Rewritten meanwhile; the next push brings the new window
+    if (response.status === 409) return null;
+    if (!response.ok) throw new Error("Failed to load history");
+    return response.json();
+  },
 };
 
+const historyView = new HistoryView(DOMElements.narrativeWindow, (before, epoch) =>
+  api.getHistory(before, epoch)
+);
+
 // --- WebSocket Manager ---
 const socketManager = {
   socket: null,
@@ -126,8 +142,13 @@ const socketManager = {
 
         switch (message.type) {
           case "full_state":
-            appState.gameState = message.data;
-            render();
+            setGameState(message.data);
+            break;
+          case "queue_status": // Waiting for a free turn slot on the server
+            renderQueueStatus(message.data);
+            break;
+          case "action_ack": // Sent during a turn; runs right after it
+            renderActionAck(message.data);
             break;
           case "roll_event": // Listen for the separate, immediate roll event
             renderRollEvent(message.data);
@@ -347,28 +368,34 @@ function showLoading(isLoading) {
   DOMElements.startTrialButton.disabled = buttonsDisabled;
 }
 
+// Versions are unique per saved state, so an equal version means nothing changed
+function setGameState(gameState) {
+  if (appState.gameState && appState.gameState.version === gameState.version) {
+    return;
+  }
+  appState.gameState = gameState;
+  render();
+}
+
 function render() {
   if (!appState.gameState) {
     showLoading(true);
     return;
   }
   showLoading(appState.gameState.is_processing);
+  if (!appState.gameState.is_processing) {
+    DOMElements.queueStatus.classList.add("hidden");
+  }
   DOMElements.opportunitiesSpan.textContent =
     appState.gameState.opportunities_remaining;
   renderCharacterStatus();
 
-  const historyContainer = document.createDocumentFragment();
-  (appState.gameState.display_history || []).forEach((text) => {
-    const p = document.createElement("div");
-    p.innerHTML = marked.parse(text);
-    if (text.startsWith("> ")) p.classList.add("user-input-message");
-    else if (text.startsWith("【")) p.classList.add("system-message");
-    historyContainer.appendChild(p);
-  });
-  DOMElements.narrativeWindow.innerHTML = "";
-  DOMElements.narrativeWindow.appendChild(historyContainer);
-  DOMElements.narrativeWindow.scrollTop =
-    DOMElements.narrativeWindow.scrollHeight;
+  // Pushes carry only the recent window; older entries load on scroll
+  historyView.applyWindow(
+    appState.gameState.display_history_start || 0,
+    appState.gameState.display_history || [],
+    appState.gameState.display_history_epoch || 0
+  );
 
   const { is_in_trial, daily_success_achieved, opportunities_remaining } =
     appState.gameState;
@@ -456,6 +483,27 @@ function renderCharacterStatus() {
   });
 }
 
+function renderQueueStatus({ position, eta_seconds }) {
+  const queueStatus = DOMElements.queueStatus;
+  queueStatus.classList.toggle("hidden", !position);
+  if (position) {
+    queueStatus.textContent =
+      position > 1
+        ? `求道者众，前方尚有 ${position - 1} 位道友，约需等待 ${eta_seconds} 秒`
+        : `即将轮到汝，约需等待 ${eta_seconds} 秒`;
+  }
+}
+
+function renderActionAck({ action, status }) {
+  const messages = {
+    queued: `已记下「${action}」，本回合结束后即刻施行`,
+    coalesced: `「${action}」已在处理中`,
+    full: "待行之事过多，请稍候再试",
+  };
+  DOMElements.queueStatus.textContent = messages[status] || "";
+  DOMElements.queueStatus.classList.remove("hidden");
+}
+
 function renderRollEvent(rollEvent) {
   DOMElements.rollType.textContent = `判定: ${rollEvent.type}`;
   DOMElements.rollTarget.textContent = `(<= ${rollEvent.target})`;
@@ -521,8 +569,7 @@ async function handleRefreshAttempts() {
   try {
     showLoading(true);
     const gameState = await api.refreshAttempts();
-    appState.gameState = gameState;
-    render();
+    setGameState(gameState);
   } catch (error) {
     console.error("Refresh attempts error:", error);
     alert("重新开始失败: " + (error.message || "未知错误"));
@@ -692,10 +739,9 @@ function handleAction(actionOverride = null) {
         );
       });
     }
-  } else {
-    // For all other actions, prevent sending if another action is in flight.
-    if (appState.gameState && appState.gameState.is_processing) return;
   }
+  // While a turn is in flight the server keeps the action in the player's
+  // mailbox and acknowledges it (action_ack), so nothing is dropped here.
 
   DOMElements.actionInput.value = "";
   socketManager.sendAction(action);
@@ -706,8 +752,7 @@ async function initializeGame() {
   showLoading(true);
   try {
     const initialState = await api.initGame();
-    appState.gameState = initialState;
-    render();
+    setGameState(initialState);
     showView("game-view");
     await socketManager.connect();
     console.log("Initialization complete and WebSocket is ready.");
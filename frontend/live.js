@@ -1,3 +1,5 @@
+import { HistoryView } from './history.js';
+
 // --- Constants ---
 const API_BASE_URL = "/api";
 
@@ -22,9 +24,21 @@ const api = {
         const response = await fetch(`${API_BASE_URL}/live/players`);
         if (!response.ok) throw new Error('Failed to fetch live players');
         return response.json();
+    },
+    async getLiveHistory(playerId, before, epoch) {
+        const params = new URLSearchParams({ player_id: playerId, before, epoch });
+        const response = await fetch(`${API_BASE_URL}/live/history?${params}`);
+        // Rewritten meanwhile; the next push brings the new window
+        if (response.status === 409) return null;
+        if (!response.ok) throw new Error('Failed to load history');
+        return response.json();
     }
 };
 
+const historyView = new HistoryView(DOMElements.narrativeWindow, (before, epoch) =>
+    api.getLiveHistory(liveState.watchingPlayerId, before, epoch)
+);
+
 // --- WebSocket Manager ---
 const socketManager = {
     socket: null,
@@ -57,6 +71,8 @@ const socketManager = {
 
                 switch (message.type) {
                     case 'live_update':
+                        // Versions are unique per saved state: same version, nothing to redraw
+                        if (liveState.liveGameState && liveState.liveGameState.version === message.data.version) break;
                         liveState.liveGameState = message.data;
                         render();
                         break;
@@ -118,6 +134,7 @@ function renderPlayerList() {
 
 function renderNarrative() {
     if (!liveState.liveGameState) {
+        historyView.reset();
         if (!liveState.watchingPlayerId) {
             DOMElements.narrativeWindow.innerHTML = '<div class="system-message"><p>请从左侧【天机榜】选择一位道友进行观摩。</p></div>';
         } else {
@@ -126,17 +143,12 @@ function renderNarrative() {
         return;
     }
 
-    const historyContainer = document.createDocumentFragment();
-    (liveState.liveGameState.display_history || []).forEach(text => {
-        const p = document.createElement('div');
-        p.innerHTML = marked.parse(text);
-        if (text.startsWith('> ')) p.classList.add('user-input-message');
-        else if (text.startsWith('【')) p.classList.add('system-message');
-        historyContainer.appendChild(p);
-    });
-    DOMElements.narrativeWindow.innerHTML = '';
-    DOMElements.narrativeWindow.appendChild(historyContainer);
-    DOMElements.narrativeWindow.scrollTop = DOMElements.narrativeWindow.scrollHeight;
+    // Pushes carry only the recent window; older entries load on scroll
+    historyView.applyWindow(
+        liveState.liveGameState.display_history_start || 0,
+        liveState.liveGameState.display_history || [],
+        liveState.liveGameState.display_history_epoch || 0
+    );
 }
 
 function renderValue(container, value, level = 0) {
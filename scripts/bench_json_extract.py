@@ -0,0 +1,101 @@
+"""
+Benchmark for the shared model-output JSON extractor.
+
+Compares ai_turn.decode_json_object (raw_decode based) with the previous
+character-by-character brace counter followed by json.loads.
+
+Usage (from the project root):
+    python scripts/bench_json_extract.py
+    python scripts/bench_json_extract.py mock_llm_recording.jsonl   # recorded real responses
+"""
+import json
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.app.ai_turn import decode_json_object
+
+
+def legacy_extract(response_str: str) -> str | None:
+    """The extractor game_logic used before, kept here for comparison."""
+    if "```json" in response_str:
+        start_pos = response_str.find("```json") + 7
+        end_pos = response_str.find("```", start_pos)
+        if end_pos != -1:
+            return response_str[start_pos:end_pos].strip()
+    start_pos = response_str.find("{")
+    if start_pos != -1:
+        brace_level = 0
+        for i in range(start_pos, len(response_str)):
+            if response_str[i] == "{":
+                brace_level += 1
+            elif response_str[i] == "}":
+                brace_level -= 1
+                if brace_level == 0:
+                    return response_str[start_pos : i + 1]
+    return None
+
+
+def legacy_decode(response_str: str):
+    if "</think>" in response_str:
+        response_str = response_str[response_str.rfind("</think>") + 8 :]
+    json_str = legacy_extract(response_str)
+    return json.loads(json_str, strict=False) if json_str else None
+
+
+def synthetic_responses() -> dict[str, str]:
+    paragraph = "你踏入山门，只见云雾缭绕，古松苍劲。长老抚须而笑，道：“此子根骨尚可。” " * 20
+    life = {
+        "姓名": "林逸",
+        "境界": "筑基初期",
+        "灵石": 1234,
+        "功法": [f"功法{i}：{paragraph[:60]}" for i in range(30)],
+        "人际": {f"道友{i}": {"好感": i, "备注": paragraph[:80]} for i in range(40)},
+    }
+    turn = {
+        "narrative": paragraph * 4,
+        "state_update": {"current_life": life},
+    }
+    turn_json = json.dumps(turn, ensure_ascii=False, indent=2)
+    braces = dict(turn, narrative=turn["narrative"] + "他在石壁上刻下 {天机} 二字，又补了一个 } 。")
+    return {
+        "plain": turn_json,
+        "think+fence": f"<think>{paragraph * 10}</think>\n```json\n{turn_json}\n```",
+        "prose+trailing": f"好的，以下是回应：\n{turn_json}\n\n以上为本回合内容。",
+        "braces-in-string": json.dumps(braces, ensure_ascii=False),
+    }
+
+
+def recorded_responses(path: str) -> dict[str, str]:
+    responses = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f):
+            if line.strip():
+                content = json.loads(line)["content"]
+                if "{" in content:
+                    responses[f"recorded#{n}"] = content
+    return responses
+
+
+def main():
+    responses = recorded_responses(sys.argv[1]) if len(sys.argv) > 1 else synthetic_responses()
+    print(f"{'case':<20}{'bytes':>9}{'legacy µs':>12}{'new µs':>10}{'speedup':>9}  same")
+    for name, text in responses.items():
+        number = 200
+        try:
+            legacy_result = legacy_decode(text)
+            t_legacy = timeit.timeit(lambda: legacy_decode(text), number=number) / number
+        except json.JSONDecodeError:
+            legacy_result, t_legacy = "<error>", float("nan")
+        new_result = decode_json_object(text)
+        t_new = timeit.timeit(lambda: decode_json_object(text), number=number) / number
+        print(
+            f"{name:<20}{len(text.encode('utf-8')):>9}{t_legacy * 1e6:>12.1f}{t_new * 1e6:>10.1f}"
+            f"{t_legacy / t_new:>8.1f}x  {legacy_result == new_result}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark for building the per-turn game state prompt.
+
+Compares turn_context.state_view_json with the previous approach (deep copy
+of the whole session, join of the full display history, then json.dumps) on
+a synthetic session of 200 turns.
+
+Usage (from the project root):
+    python scripts/bench_turn_context.py
+    python scripts/bench_turn_context.py 500   # number of turns
+"""
+import json
+import os
+import sys
+import timeit
+from copy import deepcopy
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.app.turn_context import state_view_json
+
+
+def legacy_state_json(session: dict) -> str:
+    """What _process_player_action_async did before, kept here for comparison."""
+    session_copy = deepcopy(session)
+    session_copy.pop("internal_history", 0)
+    session_copy["display_history"] = (
+        "\n".join(session_copy.get("display_history", []))
+    )[-1000:]
+    return json.dumps(session_copy, ensure_ascii=False)
+
+
+def synthetic_session(turns: int) -> dict:
+    narrative = "你踏入山门，只见云雾缭绕，古松苍劲。长老抚须而笑，道：“此子根骨尚可。” " * 6
+    life = {
+        "姓名": "林逸",
+        "境界": "筑基初期",
+        "灵石": 1234,
+        "属性": {"筋骨": 7, "心境": 5, "机缘": 6, "慧根": 8},
+        "物品": [f"丹药{i}" for i in range(20)],
+        "故事事件": [f"第{i}年：{narrative[:40]}" for i in range(15)],
+    }
+    internal = [{"role": "system", "content": "系统提示" * 2000}]
+    display = ["欢迎" * 500]
+    for i in range(turns):
+        action = f"第{i}回合，我继续修炼，顺便去坊市看看"
+        reply = json.dumps({"narrative": narrative, "state_update": {"current_life.灵石": i}}, ensure_ascii=False)
+        internal += [{"role": "user", "content": action}, {"role": "assistant", "content": reply}]
+        display += [f"> {action}", narrative]
+    return {
+        "player_id": "bench",
+        "session_date": "2025-01-01",
+        "opportunities_remaining": 7,
+        "daily_success_achieved": False,
+        "is_in_trial": True,
+        "is_processing": False,
+        "pending_punishment": None,
+        "unchecked_rounds_count": 3,
+        "current_life": life,
+        "internal_history": internal,
+        "display_history": display,
+        "roll_event": None,
+        "redemption_code": None,
+    }
+
+
+def main():
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    session = synthetic_session(turns)
+    size = len(json.dumps(session, ensure_ascii=False).encode("utf-8"))
+    number = 200
+    t_legacy = timeit.timeit(lambda: legacy_state_json(session), number=number) / number
+    t_new = timeit.timeit(lambda: state_view_json(session), number=number) / number
+    same = legacy_state_json(session) == state_view_json(session)
+    print(f"session: {turns} turns, {size / 1024:.0f} KiB serialized")
+    print(f"legacy: {t_legacy * 1e6:10.1f} µs")
+    print(f"new:    {t_new * 1e6:10.1f} µs  ({t_legacy / t_new:.0f}x faster, same output: {same})")
+
+
+if __name__ == "__main__":
+    main()